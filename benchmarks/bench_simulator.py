@@ -0,0 +1,353 @@
+"""
+Author : Laurent Cesaro
+Topic : Benchmark suite of the simulator hot path, results in JSON
+
+Runs without MySQL nor network: the oil price is fixed and the database is an in-memory SQLite
+seeded with the JSON files of data_loader. Each stage of functions.py is timed separately
+(legacy version and its replacement when there is one, FuelEngine on a batch of 1M flights), then the whole per-flight pipeline of
+simulator_flight_data.py with the database sink (run_batch_mode), the async database sink on aiosqlite
+(run_async_mode), the Parquet sink, and the staged pipeline (run_pipeline_mode) with the Parquet sink.
+The flight completion rate of the one-flight-at-a-time loop and of batch mode (--batch_size) is measured
+by running simulator_flight_data.py on the same SQLite database file.
+
+Run from the repository root:
+    python benchmarks/bench_simulator.py --output bench.json
+    python benchmarks/bench_simulator.py --compare bench.json  # Ratio against a previous result
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SIMULATOR_DIR = os.path.join(ROOT_DIR, 'simulator')
+sys.path.insert(0, SIMULATOR_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'data_loader'))
+
+from faker import Faker
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.pool import StaticPool
+from functions import *
+from database import metadata, load_settings, create_async_db_engine, UnitOfWork
+from sinks import DatabaseSink, AsyncDatabaseSink, ParquetSink
+from load_data_in_db import load_json, bulk_seed
+from simulator_flight_data import run_batch_mode, run_async_mode, run_pipeline_mode, load_code_allocator
+
+OIL_PRICE_PER_BARREL = 80
+DEPARTURE_TIME = "2024/06/15 14:30:00"
+
+
+def bench(function, calls=1, repeat=5):
+    """
+    Best time of repeat runs of function, which makes calls calls of the stage, with the time per call.
+    """
+    best = min(timeit.repeat(function, number=1, repeat=repeat))
+    return {'calls': calls, 'best_s': best, 'per_call_us': best / calls * 1e6}
+
+def create_memory_db(nb_flights, seed=0, url=None):
+    """
+    In-memory SQLite (or the database of url) with the tables of database.py, the JSON start data and nb_flights pending flights.
+    """
+    random.seed(seed)
+    if url is not None:
+        engine = create_engine(url)
+    else:
+        # One connection shared by the whole process, otherwise each connection gets its own empty database
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    metadata.create_all(engine)
+    bulk_seed(engine, metadata.tables['Airport'], metadata.tables['Company'], metadata.tables['Plane'], metadata.tables['Plane_Status'],
+              load_json(os.path.join(DATA_DIR, 'airport_coordinates.json')),
+              load_json(os.path.join(DATA_DIR, 'airline_companies.json')),
+              load_json(os.path.join(DATA_DIR, 'plane_data.json')),
+              load_json(os.path.join(DATA_DIR, 'airline_plane_data.json')))
+
+    with UnitOfWork(engine) as uow:
+        airport_sampler = AirportSampler.load(uow, metadata.tables['Airport'])
+    with engine.begin() as connection:
+        for flights in iter_generated_flights(airport_sampler, nb_flights, 10000, np.random.default_rng(seed)):
+            connection.execute(insert(metadata.tables['Flight']),
+                               [{'FlightStatus': False, 'AirportDeparture': flight_.AirportDeparture, 'AirportArrival': flight_.AirportArrival, 'Distance': flight_.Distance}
+                                for flight_ in flights])
+    return engine
+
+def bench_haversine(engine, size):
+    """
+    Distance of size airport pairs: scalar haversine, vectorized haversine_np and DistanceMatrix lookup.
+    """
+    with UnitOfWork(engine) as uow:
+        airports = AirportSampler.load(uow, metadata.tables['Airport']).airports
+    rng = np.random.default_rng(0)
+    departures = rng.integers(0, len(airports), size=size)
+    arrivals = rng.integers(0, len(airports), size=size)
+    latitudes = np.array([airport.Latitude for airport in airports])
+    longitudes = np.array([airport.Longitude for airport in airports])
+    with tempfile.TemporaryDirectory() as cache_dir:
+        distance_matrix = DistanceMatrix.build([airport.AirportID for airport in airports], latitudes, longitudes, cache_dir)
+
+        return {
+            'haversine': bench(lambda: [haversine(latitudes[i], longitudes[i], latitudes[j], longitudes[j])
+                                        for i, j in zip(departures, arrivals)], calls=size, repeat=3),
+            'haversine_np': bench(lambda: haversine_np(latitudes[departures], longitudes[departures],
+                                                       latitudes[arrivals], longitudes[arrivals]), calls=size),
+            'distance_matrix': bench(lambda: distance_matrix.distances(departures, arrivals), calls=size),
+        }
+
+def bench_plane_selection(engine, size):
+    """
+    size plane selections: select_plane_with_sufficient_range (one query each) and FleetIndex.take/release.
+    """
+    plane_table = metadata.tables['Plane']
+    plane_status_table = metadata.tables['Plane_Status']
+    rng = np.random.default_rng(0)
+    with UnitOfWork(engine) as uow:
+        airports = AirportSampler.load(uow, metadata.tables['Airport']).airports
+        fleet_index = FleetIndex.load(uow, plane_table, plane_status_table)
+        airportIDs = rng.choice([airport.AirportID for airport in airports], size=size).tolist()
+        distances = rng.integers(200, 12000, size=size).tolist()
+
+        def take_release():
+            for airportID, distance in zip(airportIDs, distances):
+                plane = fleet_index.take(airportID, distance, rng)
+                if not isinstance(plane, str):
+                    fleet_index.release(plane, airportID)
+
+        return {
+            'select_plane_with_sufficient_range': bench(lambda: [select_plane_with_sufficient_range(uow, plane_table, plane_status_table, airportID, distance, rng)
+                                                                 for airportID, distance in zip(airportIDs, distances)], calls=size, repeat=3),
+            'fleet_index_take_release': bench(take_release, calls=size),
+        }
+
+def bench_passengers(num_passengers):
+    """
+    One manifest of num_passengers: Faker per passenger and PassengerGenerator.
+    """
+    fake = Faker()
+    Faker.seed(0)
+    passenger_generator = PassengerGenerator.from_faker(fake)
+    rng = np.random.default_rng(0)
+    return {
+        'generate_passengers_information': bench(lambda: generate_passengers_information(fake, num_passengers, rng), repeat=3),
+        'passenger_generator': bench(lambda: passenger_generator.generate(rng, num_passengers)),
+    }
+
+def bench_ticket_price(num_passengers, distance_km):
+    """
+    Pricing of one manifest of num_passengers: iterrows and vectorized.
+    """
+    Faker.seed(0)
+    rng = np.random.default_rng(0)
+    passenger_df = generate_passengers_information(Faker(), num_passengers, rng)
+    return {
+        'compute_ticket_price': bench(lambda: compute_ticket_price(num_passengers, distance_km, DEPARTURE_TIME, passenger_df.copy(), rng), repeat=3),
+        'compute_ticket_price_vectorized': bench(lambda: compute_ticket_price_vectorized(num_passengers, distance_km, DEPARTURE_TIME, passenger_df.copy(), rng)),
+    }
+
+def bench_fuel_cost(size):
+    """
+    size calls of compute_fuel_cost.
+    """
+    rng = np.random.default_rng(0)
+    weights = rng.integers(20000, 560000, size=size).tolist()
+    distances = rng.integers(200, 12000, size=size).tolist()
+    passengers = rng.integers(3, 555, size=size).tolist()
+    return {
+        'compute_fuel_cost': bench(lambda: [compute_fuel_cost(weight, OIL_PRICE_PER_BARREL / 42, distance, nb_passengers, 75, 15)
+                                            for weight, distance, nb_passengers in zip(weights, distances, passengers)], calls=size),
+    }
+
+def bench_fuel_engine(batch_size):
+    """
+    Fuel cost of one batch of batch_size flights with FuelEngine, from Plane records and from arrays.
+    """
+    rng = np.random.default_rng(0)
+    fuel_engine = FuelEngine.load()
+    planes = [Plane(planeID, model['model'], model['manufacturer'], model['range_km'], model['passenger_capacity'],
+                    model['cruising_speed_kph'], model['weight_kg'], model['tank_capacity_in_gallon'], 1)
+              for planeID, model in enumerate(load_json(os.path.join(DATA_DIR, 'plane_data.json')).values(), start=1)]
+    flight_planes = [planes[i] for i in rng.integers(0, len(planes), size=batch_size)]
+    weights = np.array([plane.WeightKG for plane in flight_planes], dtype=np.float64)
+    efficiencies = np.array([fuel_engine.efficiency(plane) for plane in flight_planes], dtype=np.float64)
+    tanks = np.array([plane.TankCapacityInGallon for plane in flight_planes], dtype=np.float64)
+    distances = rng.integers(200, 12000, size=batch_size)
+    passengers = rng.integers(3, 555, size=batch_size)
+    prices = np.full(batch_size, OIL_PRICE_PER_BARREL / 42)
+    return {
+        'fuel_engine_planes': bench(lambda: fuel_engine.compute_flights(flight_planes, distances, passengers, prices), calls=batch_size),
+        'fuel_engine_arrays': bench(lambda: fuel_engine.compute(weights, efficiencies, tanks, distances, passengers, prices), calls=batch_size),
+    }
+
+def bench_timestamps(size, batch_size):
+    """
+    Departure and arrival times: size scalar draws (datetime64 and the old yyyy/mm/dd hh:mm:ss strings)
+    and one batch of batch_size flights as datetime64 arrays, with their conversion to datetimes for the DB.
+    """
+    from sinks import to_db_datetimes
+    rng = np.random.default_rng(0)
+    flight_times = rng.integers(20, 900, size=batch_size)
+    departures = random_departure_times(rng, batch_size)
+    return {
+        'departure_time_datetime64': bench(lambda: [random_departure_times(rng) for _ in range(size)], calls=size),
+        'departure_time_string': bench(lambda: [get_random_departure_time(rng) for _ in range(size)], calls=size),
+        'timestamps_batch': bench(lambda: calculate_arrival_times(random_departure_times(rng, batch_size), flight_times), calls=batch_size),
+        'timestamps_to_db': bench(lambda: to_db_datetimes(departures), calls=batch_size),
+    }
+
+def bench_pipeline(nb_flights, batch_size):
+    """
+    End-to-end run_batch_mode on nb_flights pending flights (a new database for each run),
+    writing in the SQLite database, then in Parquet files (no database).
+    """
+    oil_price_provider = FixedOilPriceProvider(OIL_PRICE_PER_BARREL)
+    results = {}
+
+    engine = create_memory_db(nb_flights)
+    with UnitOfWork(engine) as uow, contextlib.redirect_stdout(sys.stderr):
+        code_allocator = load_code_allocator(uow, metadata)
+        fleet_index = FleetIndex.load(uow, metadata.tables['Plane'], metadata.tables['Plane_Status'])
+        start = time.perf_counter()
+        with DatabaseSink(uow, metadata, fleet_index) as sink:
+            done, _ = run_batch_mode(iter_pending_flights(uow, metadata.tables['Flight'], batch_size),
+                                     fleet_index, code_allocator, oil_price_provider, sink)
+        elapsed = time.perf_counter() - start
+    results['pipeline_sqlite'] = {'calls': done, 'best_s': elapsed, 'per_call_us': elapsed / max(done, 1) * 1e6}
+
+    with tempfile.TemporaryDirectory() as db_dir, contextlib.redirect_stdout(sys.stderr):
+        # aiosqlite needs a database file, shared by the async engine and the engine of the start data
+        url = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+        engine = create_memory_db(nb_flights, url=url)
+        async_engine = create_async_db_engine(dict(load_settings(), url=url))
+        code_allocator = load_code_allocator(engine, metadata)
+        fleet_index = FleetIndex.load(engine, metadata.tables['Plane'], metadata.tables['Plane_Status'])
+        sink = AsyncDatabaseSink(async_engine, metadata, fleet_index)
+        start = time.perf_counter()
+        done, _ = asyncio.run(run_async_mode(iter_pending_flights_async(async_engine, metadata.tables['Flight'], batch_size),
+                                             fleet_index, code_allocator, oil_price_provider, sink))
+        elapsed = time.perf_counter() - start
+        asyncio.run(async_engine.dispose())
+        engine.dispose()
+    results['pipeline_async_sqlite'] = {'calls': done, 'best_s': elapsed, 'per_call_us': elapsed / max(done, 1) * 1e6}
+
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(sys.stderr):
+        airports, company_codes, fleet_index = load_json_data(rng=np.random.default_rng(0))
+        code_allocator = FlightCodeAllocator(company_codes, FileSequenceStore(os.path.join(output_dir, 'flight_code_sequences.json')))
+        flight_chunks = iter_generated_flights(AirportSampler(airports), nb_flights, batch_size, np.random.default_rng(0))
+        start = time.perf_counter()
+        with ParquetSink(output_dir) as sink:
+            done, _ = run_batch_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink)
+        elapsed = time.perf_counter() - start
+    results['pipeline_parquet'] = {'calls': done, 'best_s': elapsed, 'per_call_us': elapsed / max(done, 1) * 1e6}
+
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(sys.stderr):
+        airports, company_codes, fleet_index = load_json_data(rng=np.random.default_rng(0))
+        code_allocator = FlightCodeAllocator(company_codes, FileSequenceStore(os.path.join(output_dir, 'flight_code_sequences.json')))
+        flight_chunks = iter_generated_flights(AirportSampler(airports), nb_flights, batch_size, np.random.default_rng(0))
+        start = time.perf_counter()
+        with ParquetSink(output_dir) as sink:
+            done, _ = run_pipeline_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, batch_size)
+        elapsed = time.perf_counter() - start
+    results['pipeline_staged_parquet'] = {'calls': done, 'best_s': elapsed, 'per_call_us': elapsed / max(done, 1) * 1e6}
+    return results
+
+def run_simulator(db_file, *options):
+    """
+    Run simulator_flight_data.py on the SQLite database db_file.
+
+    Returns:
+        (number of flights completed, run time in seconds), from the metrics summary (without the interpreter start)
+    """
+    env = dict(os.environ, AIRFLIGHT_DB_URL=f'sqlite:///{db_file}')
+    output = subprocess.run([sys.executable, os.path.join(SIMULATOR_DIR, 'simulator_flight_data.py'), '--oil_price',
+                             f'fixed:{OIL_PRICE_PER_BARREL}', '--seed', '0', '--metrics_interval', '3600', *options],
+                            cwd=SIMULATOR_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    run_time = float(output.split('Run time ', 1)[1].split('s', 1)[0])
+    done = int(output.split('\nflights: ', 1)[1].split(' ', 1)[0])
+    return done, run_time
+
+def bench_completion(nb_flights, batch_size):
+    """
+    Flights completed per second by the one-flight-at-a-time loop (default mode) and by batch mode,
+    each on a new SQLite database file with the same nb_flights pending flights.
+    """
+    results = {}
+    for stage, options in (('completion_per_flight_sqlite', ()), ('completion_batch_sqlite', ('--batch_size', str(batch_size)))):
+        with tempfile.TemporaryDirectory() as db_dir:
+            db_file = os.path.join(db_dir, 'bench.db')
+            create_memory_db(nb_flights, url=f'sqlite:///{db_file}').dispose()
+            done, run_time = run_simulator(db_file, *options)
+        results[stage] = {'calls': done, 'best_s': run_time, 'per_call_us': run_time / max(done, 1) * 1e6,
+                          'flights_per_s': done / run_time}
+    speedup = results['completion_batch_sqlite']['flights_per_s'] / results['completion_per_flight_sqlite']['flights_per_s']
+    print(f"Flights completed per second: {results['completion_per_flight_sqlite']['flights_per_s']:.1f} one at a time, "
+          f"{results['completion_batch_sqlite']['flights_per_s']:.1f} with --batch_size {batch_size} ({speedup:.1f}x)", file=sys.stderr)
+    return results
+
+def git_version():
+    """
+    Commit of the benchmarked code, None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, previous):
+    """
+    Print the speedup of each stage against a previous result file.
+    """
+    print(f"{'stage':>36} {'before (us)':>12} {'now (us)':>12} {'speedup':>8}", file=sys.stderr)
+    for stage, result in results['stages'].items():
+        if stage in previous['stages']:
+            before = previous['stages'][stage]['per_call_us']
+            print(f"{stage:>36} {before:>12.1f} {result['per_call_us']:>12.1f} {before / result['per_call_us']:>7.2f}x", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the simulator hot path (no MySQL, no network).')
+    parser.add_argument('--flights', type=int, default=2000, help='Number of flights of the end-to-end pipeline')
+    parser.add_argument('--batch_size', type=int, default=500, help='Batch size of the end-to-end pipeline')
+    parser.add_argument('--size', type=int, default=2000, help='Number of calls of the per-call stages')
+    parser.add_argument('--passengers', type=int, default=300, help='Number of passengers of a manifest')
+    parser.add_argument('--fuel_batch', type=int, default=1000000, help='Number of flights of the FuelEngine batch')
+    parser.add_argument('--completion_flights', type=int, default=1000, help='Number of pending flights of the completion rate runs')
+    parser.add_argument('--output', type=str, default=None, help='JSON file of the results (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None, help='JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    engine = create_memory_db(nb_flights=0)
+    stages = {}
+    stages.update(bench_haversine(engine, args.size))
+    stages.update(bench_plane_selection(engine, args.size))
+    stages.update(bench_passengers(args.passengers))
+    stages.update(bench_ticket_price(args.passengers, 5000))
+    stages.update(bench_fuel_cost(args.size))
+    stages.update(bench_fuel_engine(args.fuel_batch))
+    stages.update(bench_timestamps(args.size, args.fuel_batch))
+    stages.update(bench_pipeline(args.flights, args.batch_size))
+    stages.update(bench_completion(args.completion_flights, args.batch_size))
+
+    results = {
+        'version': git_version(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'stages': stages,
+    }
+    if args.compare:
+        compare(results, load_json(args.compare))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
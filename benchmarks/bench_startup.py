@@ -0,0 +1,65 @@
+"""
+Author : Laurent Cesaro
+Topic : Cold-start benchmark of the simulator entry points, results in JSON
+
+Each command runs in a new interpreter (repeat times, the best and median times are kept), so the
+numbers include the imports of the script: pandas, Faker, pyarrow, sqlalchemy, airportsdata, pycountry and
+bmdOilPriceFetch are only imported by the code paths which need them.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --output startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SIMULATOR_DIR = os.path.join(ROOT_DIR, 'simulator')
+
+# Best startup time above which a command is reported as too slow (about half of the eager imports)
+TARGET_S = 0.6
+
+COMMANDS = {
+    'python': [sys.executable, '-c', 'pass'],
+    'simulator_flight_data --help': [sys.executable, os.path.join(SIMULATOR_DIR, 'simulator_flight_data.py'), '--help'],
+    'generator_flight --help': [sys.executable, os.path.join(SIMULATOR_DIR, 'generator_flight.py'), '--help'],
+    'import functions': [sys.executable, '-c', 'import functions'],
+}
+
+
+def time_command(command, repeat):
+    """
+    Best and median wall time of repeat runs of command.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=SIMULATOR_DIR, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return {'best_s': min(times), 'median_s': statistics.median(times)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Cold-start time of the simulator entry points.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each command')
+    parser.add_argument('--output', type=str, default=None, help='JSON file of the results (default: stdout)')
+    args = parser.parse_args()
+
+    results = {name: time_command(command, args.repeat) for name, command in COMMANDS.items()}
+    for name, result in results.items():
+        result['target_s'] = TARGET_S
+        result['ok'] = result['best_s'] <= TARGET_S
+        print(f"{name:>30}: best {result['best_s']:.3f}s, median {result['median_s']:.3f}s"
+              f"{'' if result['ok'] else f' (above the {TARGET_S}s target)'}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
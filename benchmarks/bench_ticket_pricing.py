@@ -0,0 +1,42 @@
+"""
+Author : Laurent Cesaro
+Topic : Benchmark of compute_ticket_price (iterrows) against compute_ticket_price_vectorized
+
+Run from the repository root:
+    python benchmarks/bench_ticket_pricing.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulator'))
+
+from faker import Faker
+import numpy as np
+from functions import generate_passengers_information, compute_ticket_price, compute_ticket_price_vectorized
+
+PASSENGER_NUMBERS = [10, 100, 555]
+DISTANCE_KM = 5000
+DEPARTURE_TIME = "2024/06/15 14:30:00"
+
+
+def bench(function, repeat=5):
+    """
+    Best time of repeat runs, in seconds.
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+if __name__ == "__main__":
+    fake = Faker()
+    rng = np.random.default_rng(0)
+
+    print(f"{'passengers':>10} {'iterrows (ms)':>14} {'vectorized (ms)':>16} {'speedup':>8}")
+    for num_passengers in PASSENGER_NUMBERS:
+        passenger_df = generate_passengers_information(fake, num_passengers, rng)
+
+        legacy = bench(lambda: compute_ticket_price(num_passengers, DISTANCE_KM, DEPARTURE_TIME, passenger_df.copy(), rng))
+        vectorized = bench(lambda: compute_ticket_price_vectorized(num_passengers, DISTANCE_KM, DEPARTURE_TIME, passenger_df.copy(), rng))
+
+        print(f"{num_passengers:>10} {legacy * 1000:>14.2f} {vectorized * 1000:>16.2f} {legacy / vectorized:>7.0f}x")
@@ -9,9 +9,19 @@ Topic : Python file to load start data in the database
 import json
 from datetime import datetime, timedelta
 import random
-from sqlalchemy import create_engine, insert, Table, Column, Float, String, Integer, DateTime, Boolean, MetaData, select
+from sqlalchemy import create_engine, insert, Table, Column, Float, String, Integer, DateTime, Boolean, MetaData, select, func
 import datetime
 import sys
+import os
+import argparse
+import time
+
+# Folder of the JSON files
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Database connection and tables are shared with the simulator
+sys.path.append(os.path.join(DATA_DIR, '..', 'simulator'))
+from database import get_engine, airport_table, company_table, plane_table, plane_status_table
 
 
 # Function to load JSON data
@@ -102,81 +112,126 @@ def insert_plane_status(conn, plane_table, plane_status_table, airport_table, ai
         # Commit the changes
         conn.commit()
 
+def load_full_iata_airports(airport_data):
+    """
+    Airports of the full airportsdata IATA set, in the airport_coordinates.json format:
+    {code: [latitude, longitude, landing price, country]}.
+    Airports of airport_data keep their values, the others get a random landing price in the same range.
+    """
+    from functions import load_iata_airports  # Cached airportsdata/pycountry table
+
+    landing_prices = [doc_[2] for doc_ in airport_data.values()]
+    min_price, max_price = min(landing_prices), max(landing_prices)
+    full_airport_data = {}
+    for code, airport in load_iata_airports().items():
+        if code in airport_data:
+            full_airport_data[code] = airport_data[code]
+            continue
+        full_airport_data[code] = [airport['lat'], airport['lon'], random.randint(min_price, max_price), airport['country_name']]
+    return full_airport_data
+
+def generate_fleet(airline_plane_data, plane_data, fleet_size):
+    """
+    Generate fleet_size planes: {airline: {'planes': [plane model keys]}} with random airlines and models.
+    """
+    airlines = list(airline_plane_data.keys())
+    plane_models = list(plane_data.keys())
+    fleet = {airline: {'planes': []} for airline in airlines}
+    for _ in range(fleet_size):
+        fleet[random.choice(airlines)]['planes'].append(random.choice(plane_models))
+    return fleet
+
+def execute_in_chunks(conn, query, rows, chunk_size):
+    """
+    Execute an INSERT with one multi-row executemany per chunk of rows.
+    """
+    for i in range(0, len(rows), chunk_size):
+        conn.execute(query, rows[i:i + chunk_size])
+
+def bulk_seed(engine, airport_table, company_table, plane_table, plane_status_table,
+              airport_data, plane_company_data, plane_data, airline_plane_data, chunk_size=10000):
+    """
+    Seed Airport, Company, Plane and Plane_Status in a single transaction.
+    All the rows are built in memory, IDs are resolved with dictionaries, and
+    each table is written with multi-row executemany statements.
+    """
+    with engine.begin() as conn:
+        # Airports
+        airport_rows = [{'AirportCode': code, 'Latitude': doc_[0], 'Longitude': doc_[1],
+                         'LandingPrice': doc_[2], 'AirportCountry': doc_[3]}
+                        for code, doc_ in airport_data.items()]
+        execute_in_chunks(conn, insert(airport_table), airport_rows, chunk_size)
+        airport_ids = dict(conn.execute(select(airport_table.c.AirportCode, airport_table.c.AirportID)).fetchall())
+
+        # Companies
+        company_rows = [{'Name': name, 'Country': doc_['country'], 'IATACode': doc_['iata_code']}
+                        for name, doc_ in plane_company_data.items()]
+        execute_in_chunks(conn, insert(company_table), company_rows, chunk_size)
+        company_ids = dict(conn.execute(select(company_table.c.Name, company_table.c.CompanyID)).fetchall())
+
+        # Planes
+        last_planeID = conn.execute(select(func.coalesce(func.max(plane_table.c.PlaneID), 0))).scalar()
+        plane_rows = []
+        for airline, doc_ in airline_plane_data.items():
+            if airline not in company_ids:
+                continue
+            for plane_ in doc_['planes']:
+                plane_rows.append({'Model': plane_data[plane_]['model'],
+                                   'Manufacturer': plane_data[plane_]['manufacturer'],
+                                   'RangeKM': plane_data[plane_]['range_km'],
+                                   'PassengerCapacity': plane_data[plane_]['passenger_capacity'],
+                                   'CruisingSpeedKPH': plane_data[plane_]['cruising_speed_kph'],
+                                   'WeightKG': plane_data[plane_]['weight_kg'],
+                                   'TankCapacityInGallon': plane_data[plane_]['tank_capacity_in_gallon'],
+                                   'CompanyID': company_ids[airline]})
+        execute_in_chunks(conn, insert(plane_table), plane_rows, chunk_size)
+
+        # Plane status: each new plane is parked at a random airport of airport_data
+        new_plane_ids = conn.execute(
+            select(plane_table.c.PlaneID).where(plane_table.c.PlaneID > last_planeID).order_by(plane_table.c.PlaneID)
+        ).scalars().all()
+        seeded_airport_ids = [airport_ids[code] for code in airport_data]
+        plane_status_rows = [{'InFlight': False, 'AirportID': random.choice(seeded_airport_ids), 'PlaneID': plane_id}
+                             for plane_id in new_plane_ids]
+        execute_in_chunks(conn, insert(plane_status_table), plane_status_rows, chunk_size)
+
+    return len(airport_rows), len(company_rows), len(plane_rows)
+
 # Main function
 def main():
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description='Load start data in the database.')
+    parser.add_argument('--full_iata', action='store_true', help='Seed the full airportsdata IATA airport set instead of airport_coordinates.json')
+    parser.add_argument('--fleet_size', type=int, default=0, help='Generate this number of random planes instead of using airline_plane_data.json')
+    parser.add_argument('--chunk_size', type=int, default=10000, help='Number of rows per executemany')
+    parser.add_argument('--row_by_row', action='store_true', help='Use the former one INSERT per row loader')
+    args = parser.parse_args()
+
     # Load JSON data
-    plane_data = load_json('/home/laurent/docker/airflight_project/Airflight-Simulator/data_loader/plane_data.json')
-    airline_companies = load_json('/home/laurent/docker/airflight_project/Airflight-Simulator/data_loader/airline_companies.json')
-    airline_plane_data = load_json('/home/laurent/docker/airflight_project/Airflight-Simulator/data_loader/airline_plane_data.json')
-    airport_coordinates = load_json('/home/laurent/docker/airflight_project/Airflight-Simulator/data_loader/airport_coordinates.json')
-
-    # Define metadata
-    metadata = MetaData()
-
-    # Define the 'airport' table
-    airport_table = Table(
-        'Airport', metadata,
-        Column('AirportID', Integer, primary_key=True, autoincrement=True),
-        Column('AirportCode', String(3)),
-        Column('Latitude', Float),
-        Column('Longitude', Float),
-        Column('LandingPrice', Float),
-        Column('AirportCountry', String(255))
-    )
-    # Define the 'company' table
-    company_table = Table(
-        'Company', metadata,
-        Column('CompanyID', Integer, primary_key=True, autoincrement=True),
-        Column('Name', String(255)),
-        Column('Country', String(255)),
-        Column('IATACode', String(3))
-    )
-    
-    # Define the 'Plane' table
-    plane_table = Table(
-        'Plane', metadata,
-        Column('PlaneID', Integer, primary_key=True, autoincrement=True),
-        Column('Model', String(255)),
-        Column('Manufacturer', String(255)),
-        Column('RangeKM', Integer),
-        Column('PassengerCapacity', Integer),
-        Column('CruisingSpeedKPH', Integer),
-        Column('WeightKG', Integer),
-        Column('TankCapacityInGallon', Integer),
-        Column('CompanyID', Integer)
-    )
-
-    # Define the 'Plane' table
-    plane_status_table = Table(
-        'Plane_Status', metadata,
-        Column('PlaneStatusID', Integer, primary_key=True, autoincrement=True),
-        Column('InFlight', Boolean),
-        Column('AirportID', Integer),
-        Column('PlaneID', Integer)
-    )
-
-    # Connect to the database
-    # Database connection configuration
-    DATABASE_TYPE = 'mysql'
-    DBAPI = 'mysql+mysqlconnector'  # Adjust based on your SQLAlchemy version
-    ENDPOINT = 'localhost'
-    PORT = 3306
-    USER = 'laurent'  # Replace with your actual MySQL username
-    PASSWORD = '123456789'  # Replace with your actual MySQL password
-    DATABASE = 'AIRFLIGHT_DB'
-
-    # Construct the SQLAlchemy URL
-    db_url = f"{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}"
-
-    print("Connecting to database with URL:", db_url)
-
-    # Create database connection
-    try:
-        engine = create_engine(db_url)
-        print("Database connection successful")
-    except Exception as e:
-        print("Error connecting to database:", str(e))
-        
+    plane_data = load_json(os.path.join(DATA_DIR, 'plane_data.json'))
+    airline_companies = load_json(os.path.join(DATA_DIR, 'airline_companies.json'))
+    airline_plane_data = load_json(os.path.join(DATA_DIR, 'airline_plane_data.json'))
+    airport_coordinates = load_json(os.path.join(DATA_DIR, 'airport_coordinates.json'))
+    if args.full_iata:
+        airport_coordinates = load_full_iata_airports(airport_coordinates)
+    if args.fleet_size > 0:
+        airline_plane_data = generate_fleet(airline_plane_data, plane_data, args.fleet_size)
+
+    # Connect to the database (settings in simulator/database.py)
+    engine = get_engine()
+    print("Connecting to database with URL:", engine.url.render_as_string(hide_password=True))
+
+    if not args.row_by_row:
+        try:
+            start = time.perf_counter()
+            nb_airports, nb_companies, nb_planes = bulk_seed(engine, airport_table, company_table, plane_table, plane_status_table,
+                                                             airport_coordinates, airline_companies, plane_data, airline_plane_data,
+                                                             args.chunk_size)
+            print(f'Data properly inserted ! {nb_airports} airports, {nb_companies} companies, {nb_planes} planes in {time.perf_counter() - start:.1f}s')
+        except Exception as e:
+            print("Error inserting data:", str(e))
+        return
+
     try:
         # Insert airport data in Airport Table
         insert_airport_data(engine, airport_table, airport_coordinates)
@@ -18,7 +18,8 @@ CREATE TABLE Company (
     CompanyID INT AUTO_INCREMENT PRIMARY KEY,
     Name VARCHAR(255) NOT NULL,
     Country VARCHAR(255) NOT NULL,
-    IATACode CHAR(3) UNIQUE NOT NULL
+    IATACode CHAR(3) UNIQUE NOT NULL,
+    INDEX idx_company_name (Name)  -- Company lookup by name in the loader
 );
 
 -- Create the Company table
@@ -37,8 +38,9 @@ CREATE TABLE Airport (
     AirportCode CHAR(3) NOT NULL,
     Latitude FLOAT,
     Longitude FLOAT,
-    LandingPrice INT,
-    AirportCountry VARCHAR(255) NOT NULL
+    LandingPrice FLOAT,
+    AirportCountry VARCHAR(255) NOT NULL,
+    UNIQUE INDEX idx_airport_code (AirportCode)  -- Airport lookup by code in the loader
 );
 
 -- Create the Plane table
@@ -62,7 +64,9 @@ CREATE TABLE Plane_Status (
     AirportID INT NOT NULL,
     FOREIGN KEY (AirportID) REFERENCES Airport(AirportID) ON DELETE CASCADE,
     PlaneID INT NOT NULL,
-    FOREIGN KEY (PlaneID) REFERENCES Plane(PlaneID) ON DELETE CASCADE
+    FOREIGN KEY (PlaneID) REFERENCES Plane(PlaneID) ON DELETE CASCADE,
+    UNIQUE INDEX idx_plane_status_plane (PlaneID),  -- One status per plane
+    INDEX idx_plane_status_airport (AirportID, InFlight, PlaneID)  -- Available planes at an airport
 );
 
 -- Create the Flight table
@@ -80,7 +84,16 @@ CREATE TABLE Flight (
     PlaneID INT,
     FOREIGN KEY (PlaneID) REFERENCES Plane(PlaneID) ON DELETE CASCADE,
     FOREIGN KEY (AirportDeparture) REFERENCES Airport(AirportID) ON DELETE CASCADE,
-    FOREIGN KEY (AirportArrival) REFERENCES Airport(AirportID) ON DELETE CASCADE
+    FOREIGN KEY (AirportArrival) REFERENCES Airport(AirportID) ON DELETE CASCADE,
+    INDEX idx_flight_pending (FlightStatus, FlightID),  -- Pending flights scan, ordered by FlightID
+    UNIQUE INDEX idx_flight_code (FlightCode)  -- Flight codes are never reused
+);
+
+-- Create the Flight Code Sequence table
+CREATE TABLE Flight_Code_Sequence (
+    CompanyID INT PRIMARY KEY,
+    NextValue BIGINT NOT NULL,  -- Next flight number of the company, reserved by blocks by the simulator
+    FOREIGN KEY (CompanyID) REFERENCES Company(CompanyID) ON DELETE CASCADE
 );
 
 -- Create the Person table
@@ -0,0 +1,27 @@
+-- Migration of an existing AIRFLIGHT_DB to the indexes and column types of build_db.sql
+-- Run it once:
+-- source /home/laurent/docker/airflight_project/Airflight-Simulator/database/migrations/001_hot_path_indexes.sql
+
+USE AIRFLIGHT_DB;
+
+-- Company lookup by name in the loader
+ALTER TABLE Company ADD INDEX idx_company_name (Name);
+
+-- Airport lookup by code in the loader, landing price stored like the other prices
+ALTER TABLE Airport
+    MODIFY LandingPrice FLOAT,
+    ADD UNIQUE INDEX idx_airport_code (AirportCode);
+
+-- Keep only the first status of each plane before adding the unique constraint
+DELETE duplicate_status FROM Plane_Status AS duplicate_status
+JOIN Plane_Status AS first_status
+    ON first_status.PlaneID = duplicate_status.PlaneID
+    AND first_status.PlaneStatusID < duplicate_status.PlaneStatusID;
+
+-- One status per plane, and available planes at an airport
+ALTER TABLE Plane_Status
+    ADD UNIQUE INDEX idx_plane_status_plane (PlaneID),
+    ADD INDEX idx_plane_status_airport (AirportID, InFlight, PlaneID);
+
+-- Pending flights scan, ordered by FlightID
+ALTER TABLE Flight ADD INDEX idx_flight_pending (FlightStatus, FlightID);
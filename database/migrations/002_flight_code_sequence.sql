@@ -0,0 +1,22 @@
+-- Migration of an existing AIRFLIGHT_DB to the flight code sequences of build_db.sql
+-- Run it once:
+-- source /home/laurent/docker/airflight_project/Airflight-Simulator/database/migrations/002_flight_code_sequence.sql
+
+USE AIRFLIGHT_DB;
+
+-- Next flight number of each company, reserved by blocks by the simulator
+CREATE TABLE Flight_Code_Sequence (
+    CompanyID INT PRIMARY KEY,
+    NextValue BIGINT NOT NULL,
+    FOREIGN KEY (CompanyID) REFERENCES Company(CompanyID) ON DELETE CASCADE
+);
+
+-- Codes of the previous versions were random: clear the duplicates (keep the first flight) before the unique constraint
+UPDATE Flight AS duplicate_flight
+JOIN Flight AS first_flight
+    ON first_flight.FlightCode = duplicate_flight.FlightCode
+    AND first_flight.FlightID < duplicate_flight.FlightID
+SET duplicate_flight.FlightCode = NULL;
+
+-- Flight codes are never reused
+ALTER TABLE Flight ADD UNIQUE INDEX idx_flight_code (FlightCode);
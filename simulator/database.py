@@ -0,0 +1,272 @@
+"""
+Author : Laurent Cesaro
+Topic : Python file which contains the database connection (pooled engine, settings) and the table definitions
+
+Settings are read, by order of priority, from:
+ - environment variables: AIRFLIGHT_DB_URL, or AIRFLIGHT_DB_DRIVER / AIRFLIGHT_DB_HOST / AIRFLIGHT_DB_PORT /
+   AIRFLIGHT_DB_USER / AIRFLIGHT_DB_PASSWORD / AIRFLIGHT_DB_NAME, and AIRFLIGHT_DB_POOL_SIZE /
+   AIRFLIGHT_DB_MAX_OVERFLOW / AIRFLIGHT_DB_POOL_RECYCLE / AIRFLIGHT_DB_POOL_PRE_PING, and AIRFLIGHT_DB_ASYNC_URL
+ - the [database] section of an INI file (path in AIRFLIGHT_DB_CONFIG, default database.ini next to this file),
+   with the same keys in lower case without the AIRFLIGHT_DB_ prefix (url, host, port, ...)
+ - the defaults below
+"""
+
+import os
+import configparser
+from contextlib import contextmanager, nullcontext
+from sqlalchemy import create_engine, make_url, Table, Column, Float, String, Integer, BigInteger, DateTime, Boolean, MetaData, Index
+
+DEFAULT_SETTINGS = {
+    'url': None,  # Full SQLAlchemy URL, takes precedence over driver/host/port/user/password/name
+    'driver': 'mysql+mysqlconnector',
+    'host': 'localhost',
+    'port': '3306',
+    'user': 'laurent',
+    'password': '123456789',
+    'name': 'AIRFLIGHT_DB',
+    'pool_size': '5',
+    'max_overflow': '10',
+    'pool_recycle': '3600',  # Seconds before a connection is recycled (MySQL closes idle connections)
+    'pool_pre_ping': 'true',
+    'async_url': None,  # URL of the async engine (default: the URL above with the async driver of its database)
+}
+
+# Async driver of each database, for the asyncio runner
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.ini')
+
+# Engine of the current process
+_engine = None
+_engine_pid = None
+
+
+def load_settings():
+    """
+    Database settings: defaults, overridden by the config file, overridden by the environment.
+    """
+    settings = dict(DEFAULT_SETTINGS)
+
+    config_file = os.environ.get('AIRFLIGHT_DB_CONFIG', DEFAULT_CONFIG_FILE)
+    if os.path.exists(config_file):
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        if config.has_section('database'):
+            settings.update({key: value for key, value in config.items('database') if key in settings})
+
+    for key in settings:
+        value = os.environ.get(f'AIRFLIGHT_DB_{key.upper()}')
+        if value is not None:
+            settings[key] = value
+    return settings
+
+def database_url(settings):
+    """
+    Build the SQLAlchemy URL from the settings.
+    """
+    if settings['url']:
+        return settings['url']
+    return f"{settings['driver']}://{settings['user']}:{settings['password']}@{settings['host']}:{settings['port']}/{settings['name']}"
+
+def create_db_engine(settings=None):
+    """
+    Create a new engine with a configured connection pool.
+    """
+    if settings is None:
+        settings = load_settings()
+    url = database_url(settings)
+    if url.startswith('sqlite'):
+        # SQLite has its own pool implementations
+        return create_engine(url)
+    return create_engine(url,
+                         pool_size=int(settings['pool_size']),
+                         max_overflow=int(settings['max_overflow']),
+                         pool_recycle=int(settings['pool_recycle']),
+                         pool_pre_ping=str(settings['pool_pre_ping']).lower() in ('1', 'true', 'yes'))
+
+def async_database_url(settings):
+    """
+    URL of the async engine: async_url, or the URL of the settings with the async driver of its database.
+    """
+    if settings['async_url']:
+        return settings['async_url']
+    url = make_url(database_url(settings))
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for the '{backend}' database, set AIRFLIGHT_DB_ASYNC_URL")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def create_async_db_engine(settings=None):
+    """
+    Create a new async engine (asyncio runner) with the same connection pool settings as create_db_engine.
+    """
+    # Only the asyncio runner needs it (and greenlet, aiomysql/aiosqlite)
+    from sqlalchemy.ext.asyncio import create_async_engine
+    if settings is None:
+        settings = load_settings()
+    url = async_database_url(settings)
+    if make_url(url).get_backend_name() == 'sqlite':
+        return create_async_engine(url)
+    return create_async_engine(url,
+                               pool_size=int(settings['pool_size']),
+                               max_overflow=int(settings['max_overflow']),
+                               pool_recycle=int(settings['pool_recycle']),
+                               pool_pre_ping=str(settings['pool_pre_ping']).lower() in ('1', 'true', 'yes'))
+
+def get_engine():
+    """
+    Engine shared by the whole process (created on first use).
+    A process started with fork gets its own engine instead of the parent's connections.
+    """
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        if _engine is not None:
+            # Connections of the parent process must not be used nor closed by the child
+            _engine.dispose(close=False)
+        _engine = create_db_engine()
+        _engine_pid = os.getpid()
+    return _engine
+
+
+class UnitOfWork:
+    """
+    One connection used for a whole simulation loop, instead of one connection per query.
+
+    It can be passed wherever an engine is expected by the helpers of functions.py:
+    connect() gives the shared connection, begin() a transaction on it.
+
+        with UnitOfWork(engine) as uow:
+            rows = select_pending_flights(uow, ...)
+            with uow.begin() as connection:
+                connection.execute(...)
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine if engine is not None else get_engine()
+        self.connection = None
+
+    def __enter__(self):
+        self.connection = self.engine.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and self.connection.in_transaction():
+            self.connection.rollback()
+        self.connection.close()
+        self.connection = None
+
+    def connect(self):
+        # The connection stays open at the end of the with block
+        return nullcontext(self.connection)
+
+    @contextmanager
+    def begin(self):
+        # Reads start an implicit transaction, end it before starting the write transaction
+        if self.connection.in_transaction():
+            self.connection.commit()
+        with self.connection.begin():
+            yield self.connection
+
+
+# Define metadata
+metadata = MetaData()
+# Define the 'Airport' table
+airport_table = Table(
+    'Airport', metadata,
+    Column('AirportID', Integer, primary_key=True, autoincrement=True),
+    Column('AirportCode', String(3)),
+    Column('Latitude', Float),
+    Column('Longitude', Float),
+    Column('LandingPrice', Float),
+    Column('AirportCountry', String(255)),
+    Index('idx_airport_code', 'AirportCode', unique=True)
+)
+# Define the 'Company' table
+company_table = Table(
+    'Company', metadata,
+    Column('CompanyID', Integer, primary_key=True, autoincrement=True),
+    Column('Name', String(255)),
+    Column('Country', String(255)),
+    Column('IATACode', String(3)),
+    Index('idx_company_name', 'Name')
+)
+# Define the 'Plane' table
+plane_table = Table(
+    'Plane', metadata,
+    Column('PlaneID', Integer, primary_key=True, autoincrement=True),
+    Column('Model', String(255)),
+    Column('Manufacturer', String(255)),
+    Column('RangeKM', Integer),
+    Column('PassengerCapacity', Integer),
+    Column('CruisingSpeedKPH', Integer),
+    Column('WeightKG', Integer),
+    Column('TankCapacityInGallon', Integer),
+    Column('CompanyID', Integer)
+)
+# Define the 'Flight' table
+flight_table = Table(
+    'Flight', metadata,
+    Column('FlightID', Integer, primary_key=True, autoincrement=True),
+    Column('FlightCode', String(13)),
+    Column('FlightStatus', Boolean),
+    Column('AirportDeparture', Integer),
+    Column('AirportArrival', Integer),
+    Column('TimeDeparture', DateTime),
+    Column('TimeArrival', DateTime),
+    Column('Distance', Integer),
+    Column('FlightTimeMinutes', Integer),
+    Column('NbPassenger', Integer),
+    Column('PlaneID', Integer),
+    Index('idx_flight_pending', 'FlightStatus', 'FlightID'),
+    Index('idx_flight_code', 'FlightCode', unique=True)
+)
+# Define the 'Passenger' table
+passenger_table = Table(
+    'Passenger', metadata,
+    Column('PassengerID', Integer, primary_key=True, autoincrement=True),
+    Column('Name', String(255), nullable=False),
+    Column('Surname', String(255), nullable=False),
+    Column('PhoneNumber', String(10)),
+    Column('Mail', String(255), nullable=False),
+    Column('Gender', String(255), nullable=False),
+    Column('TicketPriceDollar', Float),
+    Column('PurchaseDate', DateTime),
+    Column('FlightID', Integer)
+)
+# Define the 'Company_Income' table
+company_income_table = Table(
+    'Company_Income', metadata,
+    Column('IncomeID', Integer, primary_key=True, autoincrement=True),
+    Column('Income', Float),
+    Column('TransactionDate', DateTime),
+    Column('Topic', String(10)),
+    Column('CompanyID', Integer)
+)
+# Define the 'Consumption' table
+consumption_table = Table(
+    'Consumption', metadata,
+    Column('ConsumptionID', Integer, primary_key=True, autoincrement=True),
+    Column('BarrelPriceDollar', Float),
+    Column('TotalFuelPriceDollar', Float),
+    Column('TotalFuelVolumeGallons', Float),
+    Column('FlightID', Integer)
+)
+# Define the 'Plane_Status' table
+plane_status_table = Table(
+    'Plane_Status', metadata,
+    Column('PlaneStatusID', Integer, primary_key=True, autoincrement=True),
+    Column('InFlight', Boolean),
+    Column('AirportID', Integer),
+    Column('PlaneID', Integer),
+    Index('idx_plane_status_plane', 'PlaneID', unique=True),
+    Index('idx_plane_status_airport', 'AirportID', 'InFlight', 'PlaneID')
+)
+# Define the 'Flight_Code_Sequence' table (next flight number of each company, see FlightCodeAllocator)
+flight_code_sequence_table = Table(
+    'Flight_Code_Sequence', metadata,
+    Column('CompanyID', Integer, primary_key=True, autoincrement=False),
+    Column('NextValue', BigInteger, nullable=False)
+)
@@ -5,46 +5,118 @@ Topic : Python file which contains functions used in simulator_flight_data.py
 
 import math
 import json
-import random, string
+import os
+import hashlib
+import string
+import csv
+import time
+import bisect
+import threading
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-import airportsdata
-import pycountry
-from sqlalchemy import create_engine, DateTime, text, insert, Table, Column, Float, String, Integer, DateTime, Boolean, MetaData, select
 import sys
 import argparse
-from faker import Faker # Generate fake Name/Surname/Phone/Gender
-import pandas as pd
-import bmdOilPriceFetch # Get Current Oil price --> https://pypi.org/project/bmdOilPriceFetch/
+import numpy as np
+# sqlalchemy and database.py are imported by the functions which query the database: a run without database never loads them
+
+# Folder used to cache precomputed data (distance matrix, ...)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+# Folder of the JSON start data (airports, companies, planes)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data_loader')
+
+
+# Rows of the Airport, Plane and Flight tables, loaded once (from the database or the JSON files) and passed
+# through the simulation. Slots: no per-object __dict__, and the fields are read by name instead of by index.
+
+@dataclass(slots=True)
+class Airport:
+    AirportID: int
+    AirportCode: str
+    Latitude: float
+    Longitude: float
+    LandingPrice: float
+    AirportCountry: str
+
+@dataclass(slots=True)
+class Plane:
+    PlaneID: int
+    Model: str
+    Manufacturer: str
+    RangeKM: int
+    PassengerCapacity: int
+    CruisingSpeedKPH: int
+    WeightKG: int
+    TankCapacityInGallon: int
+    CompanyID: int
+
+@dataclass(slots=True)
+class Flight:
+    FlightID: int
+    FlightCode: str = None
+    FlightStatus: bool = False
+    AirportDeparture: int = None
+    AirportArrival: int = None
+    TimeDeparture: datetime = None
+    TimeArrival: datetime = None
+    Distance: int = None
+    FlightTimeMinutes: int = None
+    NbPassenger: int = None
+    PlaneID: int = None
+
+
+
+class RunRandom:
+    """
+    Random streams of a run, all derived from the run seed with NumPy SeedSequence.
+
+    Each flight has its own Generator, keyed by (run seed, FlightID): the random values of a flight
+    don't depend on the other flights, so any shard of the flights can be simulated in another process
+    (or machine) and give the same output as a serial run with the same seed.
+    Run-level streams (planes parking, generated flights, scheduled departures, flight code salt) have their own keys.
+    The random helpers of this module take their Generator as a required argument: none of them falls back
+    on an unseeded Generator, which would silently break the reproducibility of a seeded run.
+    """
+
+    # spawn_key of the run-level streams: two integers, so they never collide with a (FlightID,) key
+    RUN_STREAMS = {'fleet': (0, 1), 'flights': (0, 2), 'schedule': (0, 4), 'codes': (0, 5)}
+
+    def __init__(self, seed=None):
+        # A run without seed gets a random one, printed so the run can be replayed
+        self.seed = int(seed) if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+
+    def flight(self, flightID):
+        """
+        Generator of one flight: plane choice, departure time, passengers, prices...
+        """
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(self.seed, spawn_key=(int(flightID),))))
+
+    def stream(self, name):
+        """
+        Generator of a run-level stream ('fleet', 'flights', 'schedule' or 'codes').
+        """
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(self.seed, spawn_key=self.RUN_STREAMS[name])))
+
+    def passenger_generator(self):
+        """
+        PassengerGenerator of the run: its name pools are the same for every run (PassengerGenerator.load),
+        the names of each manifest are drawn with the Generator of the flight.
+        """
+        return PassengerGenerator.load()
 
 # Establish connection to the database
 def connect_db():
-    # Connect to the database
-    # Database connection configuration
-    DATABASE_TYPE = 'mysql'
-    DBAPI = 'mysql+mysqlconnector'  # Adjust based on your SQLAlchemy version
-    ENDPOINT = 'localhost'
-    PORT = 3306
-    USER = 'laurent'  # Replace with your actual MySQL username
-    PASSWORD = '123456789'  # Replace with your actual MySQL password
-    DATABASE = 'AIRFLIGHT_DB' # Replace with your actual MySQL DATABASE NAME
-
-    # Construct the SQLAlchemy URL
-    db_url = f"{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}"
-
-    print("Connecting to database with URL:", db_url)
-
-    # Create database connection
-    try:
-        engine = create_engine(db_url)
-        print("Database connection successful")
-        return engine
-    except Exception as e:
-        print("Error connecting to database:", str(e))
-
-def generate_random_code(conn, plane_information, company_table):
-    plane_information = list(plane_information)
+    """
+    Return the pooled engine shared by the process (settings in database.py).
+    """
+    from database import get_engine
+    engine = get_engine()
+    print("Connecting to database with URL:", engine.url.render_as_string(hide_password=True))
+    return engine
+
+def generate_random_code(conn, plane_information, company_table, rng):
+    from sqlalchemy import select
     # Query to select all planes with sufficient range
-    query = select(company_table).where(company_table.c.CompanyID == plane_information[-1]) 
+    query = select(company_table).where(company_table.c.CompanyID == plane_information.CompanyID) 
 
     # Execute the query 
     with conn.connect() as connection:
@@ -52,30 +124,213 @@ def generate_random_code(conn, plane_information, company_table):
         for commpany_ in result:
             commpany_ = list(commpany_)
     IATACode = commpany_[3]
+    return generate_code_from_iata(IATACode, rng)
+
+def generate_code_from_iata(IATACode, rng):
+    """
+    Build a random flight code from the airline IATA code, without any database lookup.
+    Codes are not guaranteed to be unique, see FlightCodeAllocator.
+    """
     # Generate one random part, with 10 characters (uppercase letters and digits)
-    ten_digits = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    ten_digits = ''.join(FLIGHT_CODE_ALPHABET[i] for i in rng.integers(0, len(FLIGHT_CODE_ALPHABET), size=10))
     
     # Combine the two parts with a hyphen
     return f"{IATACode}:{ten_digits}"
 
+def load_company_codes(conn, company_table):
+    """
+    Load the CompanyID -> IATACode mapping in one query.
+    """
+    from sqlalchemy import select
+    query = select(company_table.c.CompanyID, company_table.c.IATACode)
+    with conn.connect() as connection:
+        result = connection.execute(query)
+        return {row[0]: row[1] for row in result}
+
+# Flight codes are IATA:XXXXXXXXXX, 10 base 36 characters (uppercase letters and digits)
+FLIGHT_CODE_ALPHABET = string.digits + string.ascii_uppercase
+FLIGHT_CODE_SPACE = 36 ** 10
+# Odd and not a multiple of 3 (coprime with 36**10): value -> value * FLIGHT_CODE_MULTIPLIER is a permutation of the code space
+FLIGHT_CODE_MULTIPLIER = 1_968_557_180_987_611
+
+def encode_flight_number(value):
+    """
+    10 base 36 characters of the flight number value. Consecutive values give codes which look random,
+    and two different values (below 36**10) never give the same code.
+    """
+    value = (value * FLIGHT_CODE_MULTIPLIER) % FLIGHT_CODE_SPACE
+    characters = []
+    for _ in range(10):
+        value, digit = divmod(value, 36)
+        characters.append(FLIGHT_CODE_ALPHABET[digit])
+    return ''.join(reversed(characters))
+
+class DatabaseSequenceStore:
+    """
+    Flight number sequences of the companies in the Flight_Code_Sequence table.
+    A block is reserved with SELECT ... FOR UPDATE in its own short transaction, so concurrent workers
+    and later runs always get different blocks.
+    """
+
+    def __init__(self, conn, sequence_table):
+        self.conn = conn
+        self.sequence_table = sequence_table
+
+    def allocate(self, companyID, block_size):
+        """
+        Reserve block_size flight numbers of companyID, returns the first one.
+        """
+        from sqlalchemy import select, insert, update
+        from sqlalchemy.exc import IntegrityError
+        table = self.sequence_table
+        query = select(table.c.NextValue).where(table.c.CompanyID == companyID).with_for_update()
+        while True:
+            try:
+                with self.conn.begin() as connection:
+                    first_value = connection.execute(query).scalar()
+                    if first_value is None:
+                        # First flight of the company: the row is created (a concurrent insert makes it retry)
+                        first_value = 1
+                        connection.execute(insert(table).values(CompanyID=companyID, NextValue=first_value + block_size))
+                    else:
+                        connection.execute(update(table).where(table.c.CompanyID == companyID)
+                                           .values(NextValue=first_value + block_size))
+                return first_value
+            except IntegrityError:
+                continue
+
+class FileSequenceStore:
+    """
+    Flight number sequences of the companies in a JSON file {CompanyID: next value}, for the runs without database.
+    The file is locked while a block is reserved, so parallel processes get different blocks.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def allocate(self, companyID, block_size):
+        import fcntl  # Only needed without database
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+        with os.fdopen(os.open(self.file_path, os.O_RDWR | os.O_CREAT), 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            content = f.read()
+            sequences = json.loads(content) if content else {}
+            first_value = sequences.get(str(companyID), 1)
+            sequences[str(companyID)] = first_value + block_size
+            f.seek(0)
+            f.truncate()
+            json.dump(sequences, f)
+            f.flush()
+            os.fsync(f.fileno())
+        return first_value
+
+class FlightCodeAllocator:
+    """
+    Unique flight codes (IATA:XXXXXXXXXX) without any query per flight.
+
+    The CompanyID -> IATACode mapping is loaded once. Each company has a sequence of flight numbers
+    in store (DatabaseSequenceStore or FileSequenceStore); numbers are reserved block_size at a time,
+    so codes are unique across runs and parallel workers.
+    """
+
+    def __init__(self, company_codes, store, block_size=1000):
+        self.company_codes = company_codes
+        self.store = store
+        self.block_size = block_size
+        self._blocks = {}  # CompanyID -> [next value, end of the block]
+
+    def next_code(self, companyID, flightID=None):
+        """
+        Next flight code of the company (flightID is not used, see FlightIDCodeAllocator).
+        """
+        block = self._blocks.get(companyID)
+        if block is None or block[0] >= block[1]:
+            first_value = self.store.allocate(companyID, self.block_size)
+            block = self._blocks[companyID] = [first_value, first_value + self.block_size]
+        value = block[0]
+        block[0] += 1
+        return f"{self.company_codes[companyID]}:{encode_flight_number(value)}"
+
+# Flight numbers of FlightIDCodeAllocator are in the upper half of the code space, the sequences stay in the lower half
+FLIGHTID_CODE_OFFSET = FLIGHT_CODE_SPACE // 2
+FLIGHTID_CODE_RANGE = FLIGHT_CODE_SPACE - FLIGHTID_CODE_OFFSET
+
+class FlightIDCodeAllocator:
+    """
+    Flight codes derived from the FlightID, for seeded runs: the code of a flight doesn't depend on the order
+    in which flights are simulated, so sharded and serial runs give the same codes. Never equal to a code of FlightCodeAllocator.
+
+    - With a database (salt 0), unique as long as FlightIDs are.
+    - Without database, FlightIDs are 1 to N in every run: the flight numbers are shifted by salt (see run_salt),
+      so codes are unique within a run, and two runs with different seeds only share codes when their shifted
+      ranges overlap (about 2 * N / 1.8e15 for two runs of N flights). The same seed gives the same codes.
+    """
+
+    def __init__(self, company_codes, salt=0):
+        self.company_codes = company_codes
+        self.salt = salt
+
+    @staticmethod
+    def run_salt(run_random):
+        """
+        Shift of the flight numbers of a run, derived from its seed (the same for all its shards).
+        """
+        return int(run_random.stream('codes').integers(FLIGHTID_CODE_RANGE))
+
+    def next_code(self, companyID, flightID):
+        value = FLIGHTID_CODE_OFFSET + (self.salt + flightID) % FLIGHTID_CODE_RANGE
+        return f"{self.company_codes[companyID]}:{encode_flight_number(value)}"
+
+def load_iata_airports(cache_dir=CACHE_DIR):
+    """
+    IATA airports of airportsdata: {code: {'lat', 'lon', 'country', 'country_name'}}.
+
+    airportsdata.load and the pycountry lookups are done once, then the table is cached as a compact .npy
+    file named after the airportsdata version (a new version of the package rebuilds the cache).
+    """
+    import airportsdata
+    cache_file = os.path.join(cache_dir, f"iata_airports_{airportsdata.__version__}.npy")
+
+    if not os.path.exists(cache_file):
+        import pycountry
+        country_names = {}
+        rows = []
+        for code, airport in airportsdata.load("IATA").items():
+            country_code = airport['country']
+            if country_code not in country_names:
+                country = pycountry.countries.get(alpha_2=country_code)
+                country_names[country_code] = country.name if country else country_code
+            rows.append((code, airport['lat'], airport['lon'], country_code, country_names[country_code]))
+        width = max(len(row[4]) for row in rows)
+        table = np.array(rows, dtype=[('code', 'U3'), ('lat', 'f8'), ('lon', 'f8'), ('country', 'U2'), ('country_name', f'U{width}')])
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write in a temporary file first so a concurrent reader never sees a partial file
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            np.save(f, table)
+        os.replace(tmp_file, cache_file)
+
+    table = np.load(cache_file)
+    return {code: {'lat': lat, 'lon': lon, 'country': country, 'country_name': country_name}
+            for code, lat, lon, country, country_name in zip(table['code'].tolist(), table['lat'].tolist(), table['lon'].tolist(),
+                                                            table['country'].tolist(), table['country_name'].tolist())}
+
 def get_airport_info(airport_code, airports):
     """
-    Get latitude, longitude, and country name from the IATA code using airportsdata and pycountry.
+    Get the country name from the IATA code, with the airports of load_iata_airports (or airportsdata.load).
     """
     airport_info = airports.get(airport_code)
-    
+
     if not airport_info:
         raise ValueError(f"Airport '{airport_code}' not found in the database.")
-    
-    # Accessing latitude, longitude, and country from dictionary keys
-    lat = airport_info['lat']
-    lon = airport_info['lon']
-    country_code = airport_info['country']
-    
+
+    # Tables of load_iata_airports already have the country name
+    if 'country_name' in airport_info:
+        return airport_info['country_name']
+
     # Convert country code to full country name using pycountry
-    country_name = pycountry.countries.get(alpha_2=country_code).name
-    
-    return country_name
+    import pycountry
+    return pycountry.countries.get(alpha_2=airport_info['country']).name
 
 def haversine(lat1, lon1, lat2, lon2):
     """
@@ -108,20 +363,126 @@ def calculate_distance_between_airports(airport_dept, airport_arr):
     Calculate the distance between two airports given their IATA codes.
     """
     # Get coordinates of both airports
-    lat_airport_dept = airport_dept[2]
-    lon_airport_dept = airport_dept[3]
-    lat_airport_arr = airport_arr[2]
-    lon_airport_arr = airport_arr[3]
+    lat_airport_dept = airport_dept.Latitude
+    lon_airport_dept = airport_dept.Longitude
+    lat_airport_arr = airport_arr.Latitude
+    lon_airport_arr = airport_arr.Longitude
     
     # Calculate the distance using the Haversine formula
     distance = int(haversine(lat_airport_dept, lon_airport_dept, lat_airport_arr, lon_airport_arr))
     
     return distance
 
-def select_plane_with_sufficient_range(conn, plane_table, plane_status_table, airportID, distance):
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Vectorized version of haversine.
+    Arguments can be scalars or NumPy arrays (broadcasting rules apply), the result is in kilometers.
+    """
+    R = 6371.0  # Radius of the Earth in kilometers
+
+    lat1_rad = np.radians(lat1)
+    lon1_rad = np.radians(lon1)
+    lat2_rad = np.radians(lat2)
+    lon2_rad = np.radians(lon2)
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = np.sin(dlat / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R * c
+
+class DistanceMatrix:
+    """
+    All-pairs distance matrix (in km) between a set of airports.
+
+    Rows and columns follow the order of airport_ids. The matrix is cached on disk as a .npy file
+    whose name is a hash of the airport set, and loaded memory-mapped.
+    """
+
+    def __init__(self, airport_ids, matrix):
+        self.airport_ids = np.asarray(airport_ids)
+        self.matrix = matrix
+        self._positions = {airport_id: position for position, airport_id in enumerate(self.airport_ids.tolist())}
+
+    @staticmethod
+    def airport_set_hash(airport_ids, latitudes, longitudes):
+        """
+        Hash of the airport set: a different set or different coordinates give a different cache file.
+        """
+        digest = hashlib.sha1()
+        for airport_id, lat, lon in zip(airport_ids, latitudes, longitudes):
+            digest.update(f"{airport_id}:{float(lat):.6f}:{float(lon):.6f};".encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def build(cls, airport_ids, latitudes, longitudes, cache_dir=CACHE_DIR):
+        """
+        Load the matrix from the cache, or compute it and save it in the cache.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        cache_file = os.path.join(cache_dir, f"distances_{cls.airport_set_hash(airport_ids, latitudes, longitudes)}.npy")
+
+        if not os.path.exists(cache_file):
+            matrix = haversine_np(latitudes[:, None], longitudes[:, None], latitudes[None, :], longitudes[None, :])
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write in a temporary file first so a concurrent reader never sees a partial file
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                np.save(f, matrix.astype(np.float32))
+            os.replace(tmp_file, cache_file)
+
+        return cls(airport_ids, np.load(cache_file, mmap_mode='r'))
+
+    @classmethod
+    def from_json(cls, file_path, cache_dir=CACHE_DIR):
+        """
+        Build the matrix for the airports of airport_coordinates.json, indexed by AirportCode.
+        """
+        with open(file_path, 'r') as f:
+            airports = json.load(f)
+        codes = list(airports.keys())
+        return cls.build(codes, [airports[code][0] for code in codes], [airports[code][1] for code in codes], cache_dir)
+
+    @classmethod
+    def from_db(cls, conn, airport_table, cache_dir=CACHE_DIR):
+        """
+        Build the matrix for the airports of the Airport table, indexed by AirportID.
+        """
+        from sqlalchemy import select
+        query = (
+            select(airport_table.c.AirportID, airport_table.c.Latitude, airport_table.c.Longitude)
+            .order_by(airport_table.c.AirportID)
+        )
+        with conn.connect() as connection:
+            rows = connection.execute(query).fetchall()
+        return cls.build([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows], cache_dir)
+
+    def positions(self, airport_ids):
+        """
+        Row/column position of each airport id.
+        """
+        return np.fromiter((self._positions[airport_id] for airport_id in airport_ids), dtype=np.intp, count=len(airport_ids))
+
+    def distance(self, airport_departure, airport_arrival):
+        """
+        Distance in km between two airports, truncated like calculate_distance_between_airports.
+        """
+        return int(self.matrix[self._positions[airport_departure], self._positions[airport_arrival]])
+
+    def distances(self, departure_positions, arrival_positions):
+        """
+        Vectorized lookup: distances in km (truncated to int) for arrays of row/column positions.
+        """
+        return self.matrix[departure_positions, arrival_positions].astype(np.int64)
+
+def select_plane_with_sufficient_range(conn, plane_table, plane_status_table, airportID, distance, rng):
     """
     Select a plane from the database that has a range greater than or equal to the given distance.
     """
+    from sqlalchemy import select
     # Query to select all planes with sufficient range
     query = (
         select(plane_table)
@@ -143,18 +504,295 @@ def select_plane_with_sufficient_range(conn, plane_table, plane_status_table, ai
             return msg
         else:
             # Select a random plane from the suitable planes
-            selected_plane = random.choice(suitable_planes)
+            selected_plane = suitable_planes[rng.integers(len(suitable_planes))]
+            return Plane(*selected_plane)
+
+class FleetIndex:
+    """
+    In-memory index of the planes which are not in flight, per airport.
+
+    Planes of each airport are sorted by RangeKM, so the planes with a sufficient range
+    are found with a bisect instead of a query on Plane_Status/Plane.
+    Changes (plane taken or released) are kept until flush() writes them back to Plane_Status, with the flights of the planes:
+    a plane taken for a flight which is not written yet (still in a stage of the pipeline) stays pending.
+    take/release/pop_changes hold a lock, so the planes can be assigned in one thread and written in another.
+    """
+
+    def __init__(self, plane_status_table=None):
+        self.plane_status_table = plane_status_table
+        self._ranges = {}  # AirportID -> sorted list of RangeKM
+        self._planes = {}  # AirportID -> list of Plane, in the same order as _ranges
+        self._changes = {}  # PlaneID -> (InFlight, AirportID) not yet written in Plane_Status
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, conn, plane_table, plane_status_table, worker=0, nb_workers=1):
+        """
+        Load all the planes which are not in flight, in one query.
+        With nb_workers > 1, only the planes at the airports of the worker (AirportID % nb_workers == worker).
+        """
+        from sqlalchemy import select
+        fleet_index = cls(plane_status_table)
+        query = (
+            select(plane_table, plane_status_table.c.AirportID)
+            .select_from(
+                plane_status_table.join(plane_table, plane_table.c.PlaneID == plane_status_table.c.PlaneID)
+            )
+            .where(plane_status_table.c.InFlight == False)
+            .order_by(plane_table.c.RangeKM)
+        )
+        if nb_workers > 1:
+            query = query.where(plane_status_table.c.AirportID % nb_workers == worker)
+        with conn.connect() as connection:
+            for *columns, airportID in connection.execute(query):
+                plane = Plane(*columns)
+                # Rows are sorted by RangeKM, so appending keeps each airport list sorted
+                fleet_index._ranges.setdefault(airportID, []).append(plane.RangeKM)
+                fleet_index._planes.setdefault(airportID, []).append(plane)
+        return fleet_index
+
+    @classmethod
+    def from_planes(cls, planes, airportIDs):
+        """
+        Build the index from Plane records and the AirportID where each plane is parked (no database).
+        """
+        fleet_index = cls()
+        for plane, airportID in sorted(zip(planes, airportIDs), key=lambda item: item[0].RangeKM):
+            fleet_index._ranges.setdefault(airportID, []).append(plane.RangeKM)
+            fleet_index._planes.setdefault(airportID, []).append(plane)
+        return fleet_index
+
+    def __len__(self):
+        return sum(len(planes) for planes in self._planes.values())
+
+    def take(self, airportID, distance, rng):
+        """
+        Select a random plane at airportID with RangeKM >= distance and mark it in flight.
+        Same contract as select_plane_with_sufficient_range. rng is the Generator of the flight.
+        """
+        with self._lock:
+            ranges = self._ranges.get(airportID)
+            if not ranges:
+                return "No plane with sufficient range found."
+            first = bisect.bisect_left(ranges, distance)
+            if first == len(ranges):
+                return "No plane with sufficient range found."
+
+            # Select a random plane from the suitable planes
+            position = int(rng.integers(first, len(ranges)))
+            del ranges[position]
+            selected_plane = self._planes[airportID].pop(position)
+            self._changes[selected_plane.PlaneID] = (True, airportID)
             return selected_plane
-        
+
+    def release(self, plane, airportID):
+        """
+        Put a plane back on the ground at airportID.
+        """
+        with self._lock:
+            ranges = self._ranges.setdefault(airportID, [])
+            position = bisect.bisect_right(ranges, plane.RangeKM)
+            ranges.insert(position, plane.RangeKM)
+            self._planes.setdefault(airportID, []).insert(position, plane)
+            self._changes[plane.PlaneID] = (False, airportID)
+
+    def status_update(self):
+        """
+        Multi-row UPDATE of Plane_Status, with the rows of pop_changes() as parameters.
+        """
+        from sqlalchemy import update, bindparam
+        return (
+            update(self.plane_status_table)
+            .where(self.plane_status_table.c.PlaneID == bindparam('b_PlaneID'))
+            .values(InFlight=bindparam('InFlight'), AirportID=bindparam('AirportID'))
+        )
+
+    def pop_changes(self, planeIDs=None):
+        """
+        Pending changes as parameter rows of status_update(); they are no longer pending.
+        With planeIDs (the planes of the flights being written), only the changes of these planes and the planes
+        back on the ground: the planes taken for other flights stay pending until their flights are written.
+        """
+        with self._lock:
+            if planeIDs is None:
+                changes, self._changes = self._changes, {}
+            else:
+                planeIDs = set(planeIDs)
+                changes = {planeID: change for planeID, change in self._changes.items() if planeID in planeIDs or not change[0]}
+                for planeID in changes:
+                    del self._changes[planeID]
+        return [{'b_PlaneID': planeID, 'InFlight': in_flight, 'AirportID': airportID}
+                for planeID, (in_flight, airportID) in changes.items()]
+
+    def flush(self, connection, planeIDs=None):
+        """
+        Write the pending changes (of planeIDs, see pop_changes) to Plane_Status with one multi-row UPDATE.
+        Must be called inside the transaction which writes the flights using these planes.
+        """
+        rows = self.pop_changes(planeIDs)
+        if rows:
+            connection.execute(self.status_update(), rows)
+        return len(rows)
+
+def iter_pending_flights(conn, flight_table, chunk_size, start_after=0, worker=0, nb_workers=1):
+    """
+    Stream the pending flights (FlightStatus == 0) with FlightID > start_after, ordered by FlightID,
+    as lists of at most chunk_size Flight records. Memory stays flat whatever the backlog.
+
+    - If the driver supports server-side cursors (mysqlclient, PyMySQL), one query is streamed
+      with stream_results/yield_per on its own connection.
+    - Otherwise (mysql-connector, SQLite), each chunk is a new query starting after the last FlightID
+      read (FlightID > last LIMIT chunk_size, an index seek on (FlightStatus, FlightID)).
+    With nb_workers > 1, only the flights departing from the airports of the worker (AirportDeparture % nb_workers == worker).
+    """
+    from sqlalchemy import select
+    query = (
+        select(flight_table)
+        .where(flight_table.c.FlightStatus == 0)
+        .order_by(flight_table.c.FlightID)
+    )
+    if nb_workers > 1:
+        query = query.where(flight_table.c.AirportDeparture % nb_workers == worker)
+
+    engine = getattr(conn, 'engine', conn)
+    if engine.dialect.supports_server_side_cursors:
+        # The cursor stays open during the simulation, it can't share the connection used for the writes
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                query.where(flight_table.c.FlightID > start_after))
+            for flights in result.partitions():
+                yield [Flight(*flight_) for flight_ in flights]
+        return
+
+    last_flightID = start_after
+    while True:
+        with conn.connect() as connection:
+            flights = connection.execute(
+                query.where(flight_table.c.FlightID > last_flightID).limit(chunk_size)).fetchall()
+        if not flights:
+            return
+        last_flightID = flights[-1].FlightID
+        yield [Flight(*flight_) for flight_ in flights]
+
+async def iter_pending_flights_async(engine, flight_table, chunk_size, start_after=0):
+    """
+    Same as iter_pending_flights with an async engine: chunks of at most chunk_size pending flights,
+    each one read by a new query starting after the last FlightID read.
+    """
+    from sqlalchemy import select
+    query = (
+        select(flight_table)
+        .where(flight_table.c.FlightStatus == 0)
+        .order_by(flight_table.c.FlightID)
+    )
+    last_flightID = start_after
+    while True:
+        async with engine.connect() as connection:
+            result = await connection.execute(query.where(flight_table.c.FlightID > last_flightID).limit(chunk_size))
+            flights = result.fetchall()
+        if not flights:
+            return
+        last_flightID = flights[-1].FlightID
+        yield [Flight(*flight_) for flight_ in flights]
+
+def load_json_data(rng, data_dir=DATA_DIR):
+    """
+    Airports, companies and planes of the JSON start data, to run the simulator without a database.
+    IDs are the ones load_data_in_db.py gives (1, 2, ... in file order) and each plane
+    is parked at a random airport (drawn with rng), like insert_plane_status.
+
+    Returns:
+        (list of Airport, {CompanyID: IATACode}, FleetIndex)
+    """
+    with open(os.path.join(data_dir, 'airport_coordinates.json'), 'r') as f:
+        airport_data = json.load(f)
+    with open(os.path.join(data_dir, 'airline_companies.json'), 'r') as f:
+        company_data = json.load(f)
+    with open(os.path.join(data_dir, 'plane_data.json'), 'r') as f:
+        plane_data = json.load(f)
+    with open(os.path.join(data_dir, 'airline_plane_data.json'), 'r') as f:
+        airline_plane_data = json.load(f)
+
+    airports = [Airport(airportID, code, *doc_) for airportID, (code, doc_) in enumerate(airport_data.items(), start=1)]
+    company_ids = {name: companyID for companyID, name in enumerate(company_data, start=1)}
+    company_codes = {company_ids[name]: doc_['iata_code'] for name, doc_ in company_data.items()}
+
+    planes = []
+    for airline, doc_ in airline_plane_data.items():
+        if airline not in company_ids:
+            continue
+        for plane_ in doc_['planes']:
+            model = plane_data[plane_]
+            planes.append(Plane(len(planes) + 1, model['model'], model['manufacturer'], model['range_km'],
+                                   model['passenger_capacity'], model['cruising_speed_kph'], model['weight_kg'],
+                                   model['tank_capacity_in_gallon'], company_ids[airline]))
+    airportIDs = rng.choice([airport.AirportID for airport in airports], size=len(planes)).tolist()
+    return airports, company_codes, FleetIndex.from_planes(planes, airportIDs)
+
+def sample_flights(airport_sampler, distance_matrix, rng, size):
+    """
+    Draw size flights between the airports of airport_sampler.
+
+    Returns:
+        (departure AirportIDs, arrival AirportIDs, distances in km) as lists
+    """
+    departures, arrivals = airport_sampler.sample_positions(rng, size)
+    distances = distance_matrix.distances(departures, arrivals)
+    return (distance_matrix.airport_ids[departures].tolist(),
+            distance_matrix.airport_ids[arrivals].tolist(),
+            distances.tolist())
+
+def iter_generated_flights(airport_sampler, count, chunk_size, rng):
+    """
+    Generate count pending flights in memory (no database), as lists of at most chunk_size rows.
+    FlightIDs are 1 to count.
+    """
+    airports = airport_sampler.airports
+    distance_matrix = DistanceMatrix.build([airport.AirportID for airport in airports],
+                                           [airport.Latitude for airport in airports],
+                                           [airport.Longitude for airport in airports])
+    generated = 0
+    while generated < count:
+        size = min(chunk_size, count - generated)
+        departures, arrivals, distances = sample_flights(airport_sampler, distance_matrix, rng, size)
+        yield [Flight(generated + i + 1, AirportDeparture=dep, AirportArrival=arr, Distance=dist)
+               for i, (dep, arr, dist) in enumerate(zip(departures, arrivals, distances))]
+        generated += size
+
+class Checkpoint:
+    """
+    FlightID up to which every flight of a run is done, saved in a file so an interrupted run restarts where it stopped.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def load(self):
+        """
+        Last FlightID saved, 0 if there is no checkpoint yet.
+        """
+        if self.file_path is None or not os.path.exists(self.file_path):
+            return 0
+        with open(self.file_path, 'r') as f:
+            return int(json.load(f)['last_flight_id'])
+
+    def save(self, last_flightID):
+        if self.file_path is None:
+            return
+        # Write in a temporary file first so an interruption never leaves a partial checkpoint
+        tmp_file = f"{self.file_path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'last_flight_id': int(last_flightID)}, f)
+        os.replace(tmp_file, self.file_path)
 
 def calculate_flight_time(distance, plane_code):
     """
     Calculate the flight time based on the distance and plane's cruising speed.
     """
-    speed = plane_code[5]
+    speed = plane_code.CruisingSpeedKPH
 
     if not speed:
-        raise ValueError(f"Speed for plane '{plane_code[1]}' not available.")
+        raise ValueError(f"Speed for plane '{plane_code.Model}' not available.")
     
     # Calculate the flight time in hours
     alea_time = 30 #Time for landing and takeoff
@@ -162,35 +800,49 @@ def calculate_flight_time(distance, plane_code):
     flight_time_in_minutes = int(flight_time * 60)
     return flight_time_in_minutes
 
-def get_random_departure_time():
+# Timestamps are generated as datetime64[s] (int64 seconds since 1970-01-01), alone or in arrays,
+# and only converted to datetimes or strings by the sinks
+DEPARTURE_START = np.datetime64('1970-01-01', 'D')
+DEPARTURE_END = np.datetime64('2024-12-31', 'D')
+# Departures are never between midnight (00:00) and 6AM: 18 "daytime" hours per day
+FIRST_DEPARTURE_SECOND = 6 * 3600
+SECONDS_PER_DAY = 24 * 3600
+DAYTIME_SECONDS = SECONDS_PER_DAY - FIRST_DEPARTURE_SECOND
+NB_DEPARTURE_DAYS = int((DEPARTURE_END - DEPARTURE_START) // np.timedelta64(1, 'D'))
+
+def random_departure_times(rng, size=None):
     """
-    Generate a random date between the years 1970 and 2024.
-    Ensure that the hour is not between midnight (00:00) and 6AM.
-    
+    Random departure times between DEPARTURE_START and DEPARTURE_END, never between midnight and 6AM.
+    rng is the NumPy Generator of the flight.
+
     Returns:
-        A string representing the random date and time in the format yyyy/mm/dd hh:mm:ss.
+        One datetime64[s] (size is None) or an array of size datetime64[s].
     """
-    # Define the date range (from January 1, 1970 to December 31, 2024)
-    start_date = datetime(1970, 1, 1)
-    end_date = datetime(2024, 12, 31)
+    # One draw among the daytime seconds of the period: uniform day, uniform time between 6AM and midnight
+    daytime_seconds = rng.integers(0, NB_DEPARTURE_DAYS * DAYTIME_SECONDS, size=size)
+    if size is None:
+        # Python integers: NumPy scalar arithmetic is slower for one value
+        days, seconds = divmod(int(daytime_seconds), DAYTIME_SECONDS)
+        return DEPARTURE_START + np.timedelta64(days * SECONDS_PER_DAY + FIRST_DEPARTURE_SECOND + seconds, 's')
+    days, seconds = np.divmod(daytime_seconds, DAYTIME_SECONDS)
+    return DEPARTURE_START + (days * SECONDS_PER_DAY + FIRST_DEPARTURE_SECOND + seconds).astype('timedelta64[s]')
 
-    # Get the total seconds between the start and end dates
-    delta_seconds = (end_date - start_date).total_seconds()
-    # Generate a random number of seconds between start_date and end_date
-    random_seconds = random.randint(0, int(delta_seconds))
-    # Create a random date by adding the random seconds to start_date
-    random_date = start_date + timedelta(seconds=random_seconds)
-
-    # Ensure the time is not between midnight (00:00) and 6AM
-    random_hour = random.randint(6, 23)  # Generate hours between 6AM and 11:59PM
-    random_minute = random.randint(0, 59)
-    random_second = random.randint(0, 59)
+def calculate_arrival_times(departure_times, flight_times):
+    """
+    Arrival times (datetime64[s]) of departure times (datetime64) and flight times in minutes (int),
+    one value or arrays of the same length.
+    """
+    return departure_times + flight_times * np.timedelta64(1, 'm')
 
-    # Replace the hour, minute, and second in the random date
-    random_date = random_date.replace(hour=random_hour, minute=random_minute, second=random_second)
+def get_random_departure_time(rng):
+    """
+    Generate a random date between the years 1970 and 2024.
+    Ensure that the hour is not between midnight (00:00) and 6AM.
 
-    # Return the formatted date and time
-    return random_date.strftime("%Y/%m/%d %H:%M:%S")
+    Returns:
+        A string representing the random date and time in the format yyyy/mm/dd hh:mm:ss.
+    """
+    return random_departure_times(rng).item().strftime("%Y/%m/%d %H:%M:%S")
 
 def get_current_time():
     """
@@ -206,7 +858,7 @@ def calculate_arrival_time(departure_time_str, flight_time):
     arrival_time = departure_time + timedelta(minutes=flight_time)
     return arrival_time.strftime("%Y/%m/%d %H:%M:%S")
 
-def get_passenger_number(plane):
+def get_passenger_number(plane, rng):
     """
     Simulate the number of passengers on a flight based on predefined probabilities.
     - 75% of the time the plane is full.
@@ -214,29 +866,26 @@ def get_passenger_number(plane):
     - 5% of the time the plane is 40-50% full.
     - 5% of the time the plane is 10-30% full.
     """
-    max_passenger = plane[4]
-
-    # Define the scenarios and their corresponding probabilities
-    scenarios = ["full", "almost_full", "half_full", "low_full"]
-    probabilities = [0.75, 0.15, 0.05, 0.05]
+    max_passenger = plane.PassengerCapacity
 
-    # Select a scenario based on the defined probabilities
-    scenario = random.choices(scenarios, probabilities)[0]
+    # Select a scenario based on the probabilities above (cumulated)
+    draw = rng.random()
 
-    if scenario == "full":
+    if draw < 0.75:
         nb_passenger = max_passenger
-    elif scenario == "almost_full":
-        nb_passenger = random.randint(int(0.80 * max_passenger), int(0.90 * max_passenger))
-    elif scenario == "half_full":
-        nb_passenger = random.randint(int(0.40 * max_passenger), int(0.50 * max_passenger))
-    elif scenario == "low_full":
-        nb_passenger = random.randint(int(0.10 * max_passenger), int(0.30 * max_passenger))
+    elif draw < 0.90:
+        nb_passenger = int(rng.integers(int(0.80 * max_passenger), int(0.90 * max_passenger), endpoint=True))
+    elif draw < 0.95:
+        nb_passenger = int(rng.integers(int(0.40 * max_passenger), int(0.50 * max_passenger), endpoint=True))
+    else:
+        nb_passenger = int(rng.integers(int(0.10 * max_passenger), int(0.30 * max_passenger), endpoint=True))
     # nb_passenger can't be less than 3
     if nb_passenger < 3:
         nb_passenger = 3
     return nb_passenger
 
 def select_two_random_airports(conn):
+    from sqlalchemy import text
     # Raw SQL query to select two random airports
     random_airports_query = text("SELECT * FROM Airport ORDER BY RAND() LIMIT 2")
     
@@ -247,23 +896,111 @@ def select_two_random_airports(conn):
         airp_dept = airports[0]
         airp_arr = airports[1]
         return airp_dept, airp_arr
+
+class AliasSampler:
+    """
+    Walker/Vose alias method: O(1) sampling of an index according to a list of weights.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or len(weights) == 0 or (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("Weights must be a non-empty list of positive numbers.")
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        self.probability = np.ones(n)
+        self.alias = np.arange(n)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            i = small.pop()
+            j = large.pop()
+            self.probability[i] = scaled[i]
+            self.alias[i] = j
+            scaled[j] = scaled[j] + scaled[i] - 1.0
+            if scaled[j] < 1.0:
+                small.append(j)
+            else:
+                large.append(j)
+        # Remaining columns are full (probability 1), up to rounding errors
+
+    def sample(self, rng, size=None):
+        """
+        Draw one index (size=None) or an array of size indexes.
+        """
+        column = rng.integers(0, len(self.probability), size=size)
+        keep = rng.random(size=size) < self.probability[column]
+        return np.where(keep, column, self.alias[column])
+
+class AirportSampler:
+    """
+    Sample (departure, arrival) airport pairs in memory instead of ORDER BY RAND() on the Airport table.
+
+    Airports are drawn with an alias sampler, uniformly or according to weights
+    (LandingPrice, number of planes based at the airport, ...). The same airport is never drawn twice in a pair.
+    """
+
+    def __init__(self, airports, weights=None):
+        self.airports = list(airports)
+        if len(self.airports) < 2:
+            raise ValueError("At least two airports are needed to sample a pair.")
+        if weights is None:
+            weights = np.ones(len(self.airports))
+        if np.count_nonzero(weights) < 2:
+            raise ValueError("At least two airports need a positive weight.")
+        self.sampler = AliasSampler(weights)
+
+    @classmethod
+    def load(cls, conn, airport_table, weight_column=None):
+        """
+        Load the Airport table once. weight_column is an optional Airport column used as weight (e.g. 'LandingPrice').
+        """
+        from sqlalchemy import select
+        query = select(airport_table).order_by(airport_table.c.AirportID)
+        with conn.connect() as connection:
+            airports = [Airport(*row) for row in connection.execute(query)]
+        weights = None
+        if weight_column is not None:
+            weights = [getattr(airport, weight_column) or 0 for airport in airports]
+        return cls(airports, weights)
+
+    def sample_positions(self, rng, size):
+        """
+        Vectorized sampling: positions (in self.airports) of size departure/arrival pairs.
+        """
+        departures = self.sampler.sample(rng, size)
+        arrivals = self.sampler.sample(rng, size)
+        # Draw again the arrivals which are the same airport as the departure
+        same = np.flatnonzero(departures == arrivals)
+        while len(same):
+            arrivals[same] = self.sampler.sample(rng, len(same))
+            same = same[departures[same] == arrivals[same]]
+        return departures, arrivals
+
+    def sample_pair(self, rng):
+        """
+        Same contract as select_two_random_airports: returns the rows of two different airports.
+        """
+        departures, arrivals = self.sample_positions(rng, 1)
+        return self.airports[departures[0]], self.airports[arrivals[0]]
  
-def generate_phone_number():
+def generate_phone_number(rng):
     """Generate a random 10-digit phone number in the format like 0205040659."""
-    return ''.join([str(random.randint(0, 9)) for _ in range(10)])
+    return ''.join(map(str, rng.integers(0, 10, size=10).tolist()))
 
-def generate_family_members(fake, family_size, surname):
+def generate_family_members(fake, family_size, surname, rng):
     """Generate family members with the same surname, different first names, gender, and phone numbers."""
     family_members = []
     for _ in range(family_size):
-        gender = random.choice(["male", "female"])
+        gender = "male" if rng.random() < 0.5 else "female"
         if gender == "male":
             first_name = fake.first_name_male()
         else:
             first_name = fake.first_name_female()
 
         # Generate a fake 10-digit phone number
-        phone_number = generate_phone_number()
+        phone_number = generate_phone_number(rng)
         
         family_members.append({
             "Name": first_name,
@@ -273,22 +1010,22 @@ def generate_family_members(fake, family_size, surname):
         })
     return family_members
 
-def generate_passengers_information(fake, num_passengers):
+def generate_passengers_information(fake, num_passengers, rng):
     passengers = []
     while len(passengers) < num_passengers:
         # Randomly decide if a family or individual will be added
-        if random.random() < 0.3:  # 30% chance to add a family
-            family_size = random.randint(2, 5)  # Family size between 2 and 5
+        if rng.random() < 0.3:  # 30% chance to add a family
+            family_size = int(rng.integers(2, 5, endpoint=True))  # Family size between 2 and 5
             surname = fake.last_name()
-            family_members = generate_family_members(fake, family_size, surname)
+            family_members = generate_family_members(fake, family_size, surname, rng)
             
             # Ensure we don't exceed the total number of passengers
             if len(passengers) + len(family_members) <= num_passengers:
                 passengers.extend(family_members)
             else:
-                gender = random.choice(["male", "female"])
+                gender = "male" if rng.random() < 0.5 else "female"
                 first_name = fake.first_name_male() if gender == "male" else fake.first_name_female()
-                phone_number = generate_phone_number()
+                phone_number = generate_phone_number(rng)
                 passengers.append({
                     "Name": first_name,
                     "Surname": fake.last_name(),
@@ -297,9 +1034,9 @@ def generate_passengers_information(fake, num_passengers):
                 })
         else:
             # Add a single random passenger
-            gender = random.choice(["male", "female"])
+            gender = "male" if rng.random() < 0.5 else "female"
             first_name = fake.first_name_male() if gender == "male" else fake.first_name_female()
-            phone_number = generate_phone_number()
+            phone_number = generate_phone_number(rng)
             passengers.append({
                 "Name": first_name,
                 "Surname": fake.last_name(),
@@ -308,6 +1045,7 @@ def generate_passengers_information(fake, num_passengers):
             })
     
     # Convert the list of dictionaries to a pandas DataFrame
+    import pandas as pd
     passengers_df = pd.DataFrame(passengers)
     
     # Add the 'Mail' column
@@ -315,8 +1053,117 @@ def generate_passengers_information(fake, num_passengers):
     
     return passengers_df
 
+class PassengerGenerator:
+    """
+    Generate passenger manifests as columns instead of calling Faker once per passenger.
+
+    Pools of first names and surnames are drawn from Faker once (load() caches them on disk), then names,
+    surnames, gender, phone number and mail of whole manifests are drawn with a NumPy Generator.
+    Same grouping as generate_passengers_information: 30% of the groups are families
+    of 2 to 5 passengers sharing a surname.
+    """
+
+    def __init__(self, male_names, female_names, surnames):
+        self.male_names = np.asarray(male_names)
+        self.female_names = np.asarray(female_names)
+        self.surnames = np.asarray(surnames)
+        self.male_names_lower = np.char.lower(self.male_names)
+        self.female_names_lower = np.char.lower(self.female_names)
+        self.surnames_lower = np.char.lower(self.surnames)
+
+    @classmethod
+    def from_faker(cls, fake, pool_size=5000):
+        """
+        Pools of pool_size names drawn with fake: drawing them through Faker keeps the frequency of each name.
+        """
+        return cls([fake.first_name_male() for _ in range(pool_size)],
+                   [fake.first_name_female() for _ in range(pool_size)],
+                   [fake.last_name() for _ in range(pool_size)])
+
+    @classmethod
+    def load(cls, pool_size=5000, cache_dir=CACHE_DIR):
+        """
+        Pools of a Faker seeded with 0, drawn once and cached as a .npy file named after the Faker version
+        and the pool size (a new version of the package rebuilds the cache). A run which finds the cache doesn't import Faker.
+        The pools are the same for every run: the names of a manifest only depend on the Generator of its flight.
+        """
+        from importlib.metadata import version
+        cache_file = os.path.join(cache_dir, f"passenger_names_{version('Faker')}_{pool_size}.npy")
+
+        if not os.path.exists(cache_file):
+            from faker import Faker # Generate fake Name/Surname/Phone/Gender
+            fake = Faker()
+            fake.seed_instance(0)
+            pools = cls.from_faker(fake, pool_size)
+            table = np.empty(pool_size, dtype=[('male', pools.male_names.dtype), ('female', pools.female_names.dtype),
+                                               ('surname', pools.surnames.dtype)])
+            table['male'], table['female'], table['surname'] = pools.male_names, pools.female_names, pools.surnames
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write in a temporary file first so a concurrent reader never sees a partial file
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                np.save(f, table)
+            os.replace(tmp_file, cache_file)
+
+        table = np.load(cache_file)
+        return cls(table['male'], table['female'], table['surname'])
+
+    def group_sizes(self, rng, num_passengers):
+        """
+        Size of each group (1 for a single passenger, 2 to 5 for a family), summing to num_passengers.
+        """
+        # num_passengers groups of at least 1 passenger are always enough
+        is_family = rng.random(num_passengers) < 0.3
+        sizes = np.where(is_family, rng.integers(2, 6, size=num_passengers), 1)
+        # Groups starting with at least 5 free seats always fit
+        starts = np.cumsum(sizes) - sizes
+        nb_groups = int(np.searchsorted(starts, num_passengers - 5, side='right'))
+        groups = sizes[:nb_groups].tolist()
+        remaining = num_passengers - sum(groups)
+        # Less than 5 seats left: like generate_passengers_information, groups are still drawn
+        # and a family which doesn't fit is replaced by one single passenger
+        for size in sizes[nb_groups:].tolist():
+            if remaining == 0:
+                break
+            if size > remaining:
+                size = 1
+            groups.append(size)
+            remaining -= size
+        return np.array(groups, dtype=sizes.dtype)
+
+    def generate_columns(self, rng, num_passengers):
+        """
+        Generate a manifest as a dict of NumPy arrays (Name, Surname, Gender, PhoneNumber, Mail).
+        """
+        sizes = self.group_sizes(rng, num_passengers)
+        surname_index = np.repeat(rng.integers(0, len(self.surnames), size=len(sizes)), sizes)
+
+        is_male = rng.random(num_passengers) < 0.5
+        name_index = rng.integers(0, len(self.male_names), size=num_passengers)
+        names = np.where(is_male, self.male_names[name_index], self.female_names[name_index])
+        names_lower = np.where(is_male, self.male_names_lower[name_index], self.female_names_lower[name_index])
+
+        # 10-digit phone number, leading zeros included
+        phone_numbers = np.char.zfill(rng.integers(0, 10**10, size=num_passengers).astype('U10'), 10)
+        mails = np.char.add(np.char.add(np.char.add(names_lower, '.'), self.surnames_lower[surname_index]), '@mail.com')
+
+        return {
+            "Name": names,
+            "Surname": self.surnames[surname_index],
+            "Gender": np.where(is_male, "male", "female"),
+            "PhoneNumber": phone_numbers,
+            "Mail": mails,
+        }
+
+    def generate(self, rng, num_passengers):
+        """
+        Same output as generate_passengers_information: a DataFrame with one row per passenger.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.generate_columns(rng, num_passengers))
+
 # Compute ticket price
-def compute_ticket_price(num_passengers, distance_km, departure_time, df):
+def compute_ticket_price(num_passengers, distance_km, departure_time, df, rng):
     """
     Compute ticket prices based on aircraft capacity, distance, and class distribution.
 
@@ -325,21 +1172,23 @@ def compute_ticket_price(num_passengers, distance_km, departure_time, df):
         distance_km (float): The distance of the flight in kilometers.
         departure_time Datetime: Date of the departure
         df (dataframe): The list of the passenger randomly generated
+        rng: NumPy Generator of the flight.
     Returns:
         df
     """
+    import pandas as pd
     df['Departure_Time'] = departure_time
     df['Departure_Time'] = pd.to_datetime(df['Departure_Time'], format="%Y/%m/%d %H:%M:%S")
     df = df.reset_index()
     
     if num_passengers < 20:
         # For planes with capacity under 20, ticket cost between 10000 and 50000 dollars
-        ticket_price = random.randint(10000, 50000)
+        ticket_price = int(rng.integers(10000, 50000, endpoint=True))
         #return {"ticket_price": ticket_price}
 
     elif 21 <= num_passengers <= 99:
         # For planes with num_passengers between 21 and 99, ticket cost between 2000 and 10000 dollars
-        ticket_price = random.randint(2000, 10000)
+        ticket_price = int(rng.integers(2000, 10000, endpoint=True))
         #return {"ticket_price": ticket_price}
 
     else:
@@ -399,21 +1248,21 @@ def compute_ticket_price(num_passengers, distance_km, departure_time, df):
         current_surname = row['Surname'] # Select surname to apply same price to family members
         departure_date = row['Departure_Time']
         if num_passengers <= 99:
-            df = attribute_price_to_passenger(ticket_price, previous_surname, current_surname, df, index, departure_date)
+            df = attribute_price_to_passenger(ticket_price, previous_surname, current_surname, df, index, departure_date, rng)
         else:
             if count_sold <= first_class_passengers:
-                df = attribute_price_to_passenger(first_class_price, previous_surname, current_surname, df, index, departure_date)
+                df = attribute_price_to_passenger(first_class_price, previous_surname, current_surname, df, index, departure_date, rng)
             elif count_sold > first_class_passengers and count_sold <= second_class_passengers:
-                df = attribute_price_to_passenger(second_class_price, previous_surname, current_surname, df, index, departure_date)
+                df = attribute_price_to_passenger(second_class_price, previous_surname, current_surname, df, index, departure_date, rng)
             elif count_sold > second_class_passengers and count_sold <= third_class_passengers:
-                df = attribute_price_to_passenger(third_class_price, previous_surname, current_surname, df, index, departure_date)
+                df = attribute_price_to_passenger(third_class_price, previous_surname, current_surname, df, index, departure_date, rng)
         
         # Update the previous_surname for the next iteration
         previous_surname = current_surname
     # Return a dictionary with ticket prices for each class and the number of seats in each class
     return df
 
-def attribute_price_to_passenger(ticket_price, previous_surname, current_surname, df, index, departure_date):
+def attribute_price_to_passenger(ticket_price, previous_surname, current_surname, df, index, departure_date, rng):
     if previous_surname is not None:
         if current_surname == previous_surname:
             PurchaseDate = str(df.loc[index-1, 'PurchaseDate']) # Get n-1 Value
@@ -421,12 +1270,12 @@ def attribute_price_to_passenger(ticket_price, previous_surname, current_surname
             discounted_price = df.loc[index-1, 'TicketPriceDollar'] # Get n-1 Value
             df.at[index, 'TicketPriceDollar'] = discounted_price
         else:
-            PurchaseDate = generate_random_purchase_date(departure_date)
+            PurchaseDate = generate_random_purchase_date(departure_date, rng)
             df.at[index, 'PurchaseDate'] = PurchaseDate
             discounted_price = compute_discount_price(ticket_price, PurchaseDate, departure_date)
             df.at[index, 'TicketPriceDollar'] = discounted_price
     else:
-        PurchaseDate = generate_random_purchase_date(departure_date)
+        PurchaseDate = generate_random_purchase_date(departure_date, rng)
         df.at[index, 'PurchaseDate'] = PurchaseDate
         discounted_price = compute_discount_price(ticket_price, PurchaseDate, departure_date)
         df.at[index, 'TicketPriceDollar'] = discounted_price
@@ -447,10 +1296,86 @@ def compute_discount_price(base_price, PurchaseDate, departure_date):
     else:
         return base_price  # No discount, full price
     
+# Discount windows of compute_discount_price: (min days, max days, price factor)
+DISCOUNT_WINDOWS = [(75, 90, 0.40), (60, 74, 0.50), (45, 59, 0.70)]
+
+def compute_discount_factors(days_until_departure):
+    """
+    Vectorized compute_discount_price: price factor for an array of days between purchase and departure.
+    """
+    factors = np.ones(len(days_until_departure))
+    for min_days, max_days, factor in DISCOUNT_WINDOWS:
+        factors[(days_until_departure >= min_days) & (days_until_departure <= max_days)] = factor
+    return factors
+
+def compute_ticket_price_vectorized(num_passengers, distance_km, departure_time, df, rng):
+    """
+    Columnar version of compute_ticket_price: class, purchase date and discounted price
+    are assigned with NumPy array operations instead of iterrows().
+
+    - Under 20 passengers one price between 10000 and 50000 dollars, up to 99 passengers between 2000 and 10000 dollars.
+    - Above 99 passengers, 5% first class (10x), 15% second class (5x) and the rest third class (2x)
+      of the base price per km (0.15 dollar from 1000 km, 0.05 dollar below).
+    - Consecutive passengers with the same surname (a family) share the price and purchase date of the first member.
+    - Purchase date is 1 to 90 days before departure and the discount windows of compute_discount_price apply.
+
+    Args:
+        num_passengers (int): Number of passengers in the flight.
+        distance_km (float): The distance of the flight in kilometers.
+        departure_time: Date of the departure (datetime64, datetime or string yyyy/mm/dd hh:mm:ss).
+        df (dataframe): The passengers, as returned by generate_passengers_information.
+        rng: NumPy Generator of the flight.
+    Returns:
+        df
+    """
+    if isinstance(departure_time, str):
+        departure_time = datetime.strptime(departure_time, "%Y/%m/%d %H:%M:%S")
+    departure = np.datetime64(departure_time, 's')
+
+    df = df.reset_index()
+    df['Departure_Time'] = np.full(len(df), departure)
+    df['TicketPriceDollar'], df['PurchaseDate'] = compute_ticket_prices(num_passengers, distance_km, departure,
+                                                                        df['Surname'].to_numpy(), rng)
+    return df
+
+def compute_ticket_prices(num_passengers, distance_km, departure, surnames, rng):
+    """
+    Core of compute_ticket_price_vectorized on the columns of a manifest, without any DataFrame.
+
+    Args:
+        departure: datetime64[s] of the departure.
+        surnames: array of the surnames of the passengers, in manifest order (families are consecutive).
+    Returns:
+        (ticket prices in dollars, purchase dates as datetime64[s]), arrays in manifest order
+    """
+    nb_rows = len(surnames)
+    if num_passengers < 20:
+        base_prices = np.full(nb_rows, float(rng.integers(10000, 50001)))
+    elif num_passengers <= 99:
+        base_prices = np.full(nb_rows, float(rng.integers(2000, 10001)))
+    else:
+        base_price_per_km = 0.15 if distance_km >= 1000 else 0.05
+        first_class_passengers = round(num_passengers * 0.05)
+        second_class_passengers = round(num_passengers * 0.15)
+        # Class multiplier by seat position, the third class takes the remaining passengers
+        multipliers = np.full(nb_rows, 2.0)
+        multipliers[:first_class_passengers] = 10.0
+        multipliers[first_class_passengers:first_class_passengers + second_class_passengers] = 5.0
+        base_prices = base_price_per_km * distance_km * multipliers
+
+    # A new group starts each time the surname changes, family members copy the first member of their group
+    new_group = np.ones(nb_rows, dtype=bool)
+    new_group[1:] = surnames[1:] != surnames[:-1]
+    group_first_row = np.flatnonzero(new_group)[np.cumsum(new_group) - 1]
+
+    days_before_departure = rng.integers(1, 91, size=nb_rows)[group_first_row]
+    prices = base_prices[group_first_row] * compute_discount_factors(days_before_departure)
+    return prices, departure - days_before_departure.astype('timedelta64[D]')
+
 # Function to generate a random purchase date between 90 days before departure and the departure date
-def generate_random_purchase_date(departure_date):
+def generate_random_purchase_date(departure_date, rng):
     # Generate a random number of days before the departure (between 1 and 90 days)
-    days_before_departure = random.randint(1, 90)
+    days_before_departure = int(rng.integers(1, 90, endpoint=True))
     # Calculate the purchase date by subtracting the random number of days from the departure date
     PurchaseDate = departure_date - timedelta(days=days_before_departure)
     return PurchaseDate
@@ -458,6 +1383,7 @@ def generate_random_purchase_date(departure_date):
 
 # Get Oil Price per Gallon
 def get_oil_price():
+    import bmdOilPriceFetch # Get Current Oil price --> https://pypi.org/project/bmdOilPriceFetch/
     data = bmdOilPriceFetch.bmdPriceFetch()
     # Get the price of oil per barrel
     price_per_barrel = data['regularMarketPrice']
@@ -466,6 +1392,110 @@ def get_oil_price():
     return price_per_gallon
 
 
+class OilPriceProvider:
+    """
+    Base class of the oil price providers. Subclasses implement price_per_barrel(date).
+    """
+
+    def price_per_barrel(self, date=None):
+        raise NotImplementedError
+
+    def price_per_gallon(self, date=None):
+        # 1 barrel = 42 gallons
+        return self.price_per_barrel(date) / 42
+
+    def prices_per_barrel(self, dates):
+        """
+        Price per barrel of each date (array of datetime64), as a float array.
+        """
+        return np.array([self.price_per_barrel(date) for date in dates], dtype=float)
+
+class LiveOilPriceProvider(OilPriceProvider):
+    """
+    Current oil price from bmdOilPriceFetch (one network call per price, the date is ignored).
+    """
+
+    def price_per_barrel(self, date=None):
+        import bmdOilPriceFetch
+        return bmdOilPriceFetch.bmdPriceFetch()['regularMarketPrice']
+
+class CachedOilPriceProvider(OilPriceProvider):
+    """
+    Keep the price of another provider for ttl seconds (for providers which ignore the date).
+    """
+
+    def __init__(self, provider, ttl=600):
+        self.provider = provider
+        self.ttl = ttl
+        self._price = None
+        self._expires_at = 0
+
+    def price_per_barrel(self, date=None):
+        now = time.monotonic()
+        if self._price is None or now >= self._expires_at:
+            self._price = self.provider.price_per_barrel(date)
+            self._expires_at = now + self.ttl
+        return self._price
+
+class FixedOilPriceProvider(OilPriceProvider):
+    """
+    Always the same price, to run the simulator without network access.
+    """
+
+    def __init__(self, price_per_barrel):
+        self._price = float(price_per_barrel)
+
+    def price_per_barrel(self, date=None):
+        return self._price
+
+class HistoricalOilPriceProvider(OilPriceProvider):
+    """
+    Price per barrel from a historical series, keyed by date.
+
+    The file is either a CSV with 'date' and 'price' columns, or a JSON object {"yyyy-mm-dd": price}.
+    The price of a date is the last known price on or before that date (the first one for older dates).
+    """
+
+    def __init__(self, file_path):
+        if file_path.endswith('.json'):
+            with open(file_path, 'r') as f:
+                series = json.load(f).items()
+        else:
+            with open(file_path, 'r', newline='') as f:
+                series = [(row['date'], row['price']) for row in csv.DictReader(f)]
+        series = sorted((np.datetime64(str(date).replace('/', '-')[:10], 'D'), float(price)) for date, price in series)
+        if not series:
+            raise ValueError(f"No oil price found in '{file_path}'.")
+        self.dates = np.array([date for date, _ in series])
+        self.prices = np.array([price for _, price in series])
+
+    def price_per_barrel(self, date=None):
+        if date is None:
+            return float(self.prices[-1])
+        if isinstance(date, str):
+            date = date.replace('/', '-')[:10]
+        position = np.searchsorted(self.dates, np.datetime64(date, 'D'), side='right') - 1
+        return float(self.prices[max(position, 0)])
+
+    def prices_per_barrel(self, dates):
+        # One searchsorted for all the dates
+        positions = np.searchsorted(self.dates, np.asarray(dates).astype('datetime64[D]'), side='right') - 1
+        return self.prices[np.maximum(positions, 0)]
+
+def get_oil_price_provider(source, ttl=600):
+    """
+    Build a provider from a command-line value:
+    - 'live': bmdOilPriceFetch, cached for ttl seconds
+    - 'fixed:<price per barrel>': fixed price
+    - '<file.csv|file.json>': historical series
+    """
+    if source == 'live':
+        return CachedOilPriceProvider(LiveOilPriceProvider(), ttl)
+    if source.startswith('fixed:'):
+        return FixedOilPriceProvider(source[len('fixed:'):])
+    return HistoricalOilPriceProvider(source)
+
+
 # Compute the consumption of fuel
 def compute_fuel_cost(weight_kg, gas_price_per_gallon, flight_distance_km, num_people, avg_weight_per_person, efficiency_constant=15):
     """
@@ -499,4 +1529,84 @@ def compute_fuel_cost(weight_kg, gas_price_per_gallon, flight_distance_km, num_p
 
     return total_fuel_cost, total_fuel_gallons
 
+# Fuel efficiency of each plane model (Plane.Model -> efficiency constant of compute_fuel_cost)
+FUEL_EFFICIENCY_FILE = os.path.join(DATA_DIR, 'fuel_efficiency.json')
+# Jet fuel: 1 liter = 0.8 kg, 1 gallon = 3.78541 liters
+JET_FUEL_KG_PER_GALLON = 0.8 * 3.78541
+
+class FuelEngine:
+    """
+    Fuel volume and cost of whole batches of flights, with the fuel efficiency of each plane model.
+
+    Same model as compute_fuel_cost: fuel (kg/km) = (plane weight + passengers weight) / efficiency,
+    with the efficiency of fuel_efficiency.json. A model missing from the table gets the efficiency which
+    burns the whole tank on a full-range flight with all seats taken (the median of the table without tank capacity).
+    Flights which need more fuel than the tank capacity of their plane are flagged.
+    compute() only does arithmetic, so it takes NumPy arrays (a batch) as well as numbers (one flight).
+    """
+
+    def __init__(self, efficiencies=None, avg_weight_per_person=75):
+        self.efficiencies = efficiencies or {}
+        self.avg_weight_per_person = avg_weight_per_person
+        # Efficiency of the planes missing from the table and without tank capacity, on the scale of the table
+        self.default_efficiency = float(np.median(list(self.efficiencies.values()))) if self.efficiencies else None
+        self._positions = {}  # PlaneID -> row of _plane_values
+        self._plane_values = np.empty((0, 3))  # (WeightKG, efficiency, TankCapacityInGallon) of each known plane
+
+    @classmethod
+    def load(cls, file_path=FUEL_EFFICIENCY_FILE, avg_weight_per_person=75):
+        with open(file_path, 'r') as f:
+            return cls(json.load(f), avg_weight_per_person)
+
+    def efficiency(self, plane):
+        efficiency = self.efficiencies.get(plane.Model)
+        if efficiency is not None:
+            return efficiency
+        if not plane.TankCapacityInGallon:
+            if self.default_efficiency is None:
+                raise ValueError(f"No fuel efficiency for the plane model '{plane.Model}' (no tank capacity and no efficiency table).")
+            return self.default_efficiency
+        full_weight = plane.WeightKG + plane.PassengerCapacity * self.avg_weight_per_person
+        return full_weight * plane.RangeKM / (plane.TankCapacityInGallon * JET_FUEL_KG_PER_GALLON)
+
+    def positions(self, planes):
+        """
+        Rows of _plane_values of planes, the planes seen for the first time are added.
+        """
+        positions = self._positions
+        new_planes = {plane.PlaneID: plane for plane in planes if plane.PlaneID not in positions}
+        if new_planes:
+            for plane in new_planes.values():
+                positions[plane.PlaneID] = len(positions)
+            self._plane_values = np.concatenate([self._plane_values, np.array(
+                [(plane.WeightKG, self.efficiency(plane), plane.TankCapacityInGallon or math.inf) for plane in new_planes.values()],
+                dtype=np.float64)])
+        return np.fromiter((positions[plane.PlaneID] for plane in planes), dtype=np.intp, count=len(planes))
+
+    def compute(self, weights_kg, efficiencies, tank_gallons, distances_km, nb_passengers, prices_per_gallon):
+        """
+        Returns:
+            (fuel costs, fuel volumes in gallons, whether the volume exceeds the tank capacity)
+        """
+        total_weights = weights_kg + nb_passengers * self.avg_weight_per_person
+        volumes = total_weights / efficiencies * distances_km / JET_FUEL_KG_PER_GALLON
+        return volumes * prices_per_gallon, volumes, volumes > tank_gallons
+
+    def compute_flight(self, plane, distance_km, nb_passengers, price_per_gallon):
+        """
+        Fuel cost, volume and tank flag of one flight.
+        """
+        return self.compute(plane.WeightKG, self.efficiency(plane), plane.TankCapacityInGallon or math.inf,
+                            distance_km, nb_passengers, price_per_gallon)
+
+    def compute_flights(self, planes, distances_km, nb_passengers, prices_per_gallon):
+        """
+        Vectorized compute_flight: planes is a list of Plane, the other arguments are arrays of the same length.
+        """
+        positions = self.positions(planes)
+        plane_values = self._plane_values[positions] if len(positions) else np.empty((0, 3))
+        return self.compute(plane_values[:, 0], plane_values[:, 1], plane_values[:, 2],
+                            np.asarray(distances_km, dtype=np.float64), np.asarray(nb_passengers, dtype=np.float64),
+                            np.asarray(prices_per_gallon, dtype=np.float64))
+
 
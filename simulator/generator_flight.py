@@ -4,16 +4,16 @@ Topic : Python file to create flight in DB
 """
 
 from datetime import datetime, timedelta
-import airportsdata
-from sqlalchemy import create_engine, DateTime, text, insert, Table, Column, Float, String, Integer, DateTime, Boolean, MetaData, select
 import sys
 import argparse
-from faker import Faker # Generate fake Name/Surname/Phone/Gender
-import pandas as pd
+import numpy as np
+import time
 from functions import * # Import functions from functions.py
+# sqlalchemy and the tables of database.py are imported once the arguments are parsed, so --help stays fast
 
 
 def insert_new_flight(conn, flight_table, airport_departure, airport_arrival, flight_distance_km):
+    from sqlalchemy import insert
     with conn.connect() as conn:
 
         query = insert(flight_table).values(FlightStatus=False,
@@ -24,41 +24,91 @@ def insert_new_flight(conn, flight_table, airport_departure, airport_arrival, fl
         conn.execute(query)
         conn.commit()
 
+def hub_weights(conn, plane_status_table, airports):
+    """
+    Weight of each airport = number of planes based there (at least 1), to get hub-heavy traffic.
+    """
+    from sqlalchemy import select, func
+    query = (
+        select(plane_status_table.c.AirportID, func.count())
+        .group_by(plane_status_table.c.AirportID)
+    )
+    with conn.connect() as connection:
+        nb_planes = dict(connection.execute(query).fetchall())
+    return [max(nb_planes.get(airport.AirportID, 0), 1) for airport in airports]
+
+def insert_new_flights_bulk(conn, flight_table, airport_sampler, count, rng, chunk_size=10000):
+    """
+    Insert count new pending flights between airports drawn by airport_sampler with rng (NumPy Generator).
+    Flights are generated and written chunk by chunk (one executemany per chunk) so memory stays bounded.
+    """
+    from sqlalchemy import insert
+    airports = airport_sampler.airports
+    distance_matrix = DistanceMatrix.build([airport.AirportID for airport in airports],
+                                           [airport.Latitude for airport in airports],
+                                           [airport.Longitude for airport in airports])
+
+    query = insert(flight_table)
+    inserted = 0
+    start = time.perf_counter()
+    with conn.connect() as connection:
+        while inserted < count:
+            size = min(chunk_size, count - inserted)
+            departures, arrivals, distances = sample_flights(airport_sampler, distance_matrix, rng, size)
+            rows = [{'FlightStatus': False, 'AirportDeparture': dep, 'AirportArrival': arr, 'Distance': dist}
+                    for dep, arr, dist in zip(departures, arrivals, distances)]
+            connection.execute(query, rows)
+            connection.commit()
+            inserted += size
+
+    elapsed = time.perf_counter() - start
+    print(f'{inserted} flights inserted in {elapsed:.1f}s ({inserted / elapsed:.0f} rows/s)')
+    return inserted
+
 
 
 # Main execution
 if __name__ == "__main__":
-    
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description='Generate pending flights in the database.')
+    parser.add_argument('--count', type=int, default=1, help='Number of flights to generate')
+    parser.add_argument('--chunk_size', type=int, default=10000, help='Number of flights written per executemany in bulk mode')
+    parser.add_argument('--weight', type=str, default='uniform', choices=['uniform', 'LandingPrice', 'hub'], help='How airports are weighted when drawing flights')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the run: the same seed, airports and weights give the same flights')
+    args = parser.parse_args()
+
+    # The seed is printed so a run without --seed can be replayed
+    run_random = RunRandom(args.seed)
+    print(f'Seed of the run: {run_random.seed}')
+    rng = run_random.stream('flights')
+
+    from database import flight_table, airport_table, plane_status_table, UnitOfWork
+
     # Connect to the database
     engine = connect_db()
     
-    # Define metadata
-    metadata = MetaData()
-    # Define the 'Flight' table
-    flight_table = Table(
-        'Flight', metadata,
-        Column('FlightID', Integer, primary_key=True, autoincrement=True),
-        Column('FlightCode', String(13)),
-        Column('FlightStatus', Boolean),
-        Column('AirportDeparture', Integer),
-        Column('AirportArrival', Integer),
-        Column('TimeDeparture', DateTime),
-        Column('TimeArrival', DateTime),
-        Column('Distance', Integer),
-        Column('FlightTimeMinutes', Integer),
-        Column('NbPassenger', Integer),
-        Column('PlaneID', Integer)
-    )
-    
-    # Select two random airports from database
-    airport_departure, airport_arrival = select_two_random_airports(engine)
-    #print(f"The airport departure is {airport_departure[1]} and airport arrival is {airport_arrival[1]}.")
+    # One connection for all the queries of the run
+    with UnitOfWork(engine) as uow:
+        # Load the airports once, and sample them in memory
+        if args.weight == 'LandingPrice':
+            airport_sampler = AirportSampler.load(uow, airport_table, 'LandingPrice')
+        else:
+            airport_sampler = AirportSampler.load(uow, airport_table)
+            if args.weight == 'hub':
+                airport_sampler = AirportSampler(airport_sampler.airports, hub_weights(uow, plane_status_table, airport_sampler.airports))
+
+        if args.count > 1:
+            insert_new_flights_bulk(uow, flight_table, airport_sampler, args.count, rng, args.chunk_size)
+        else:
+            # Select two random airports
+            airport_departure, airport_arrival = airport_sampler.sample_pair(rng)
+            #print(f"The airport departure is {airport_departure.AirportCode} and airport arrival is {airport_arrival.AirportCode}.")
 
-    # Calculate the distance between the two randomly selected airports
-    flight_distance_km = calculate_distance_between_airports(airport_departure, airport_arrival)
-    #print(f"The distance between {airport_departure[1]} and {airport_arrival[1]} is {flight_distance_km} kilometers.")
+            # Calculate the distance between the two randomly selected airports
+            flight_distance_km = calculate_distance_between_airports(airport_departure, airport_arrival)
+            #print(f"The distance between {airport_departure.AirportCode} and {airport_arrival.AirportCode} is {flight_distance_km} kilometers.")
     
-    insert_new_flight(engine, flight_table, airport_departure[0], airport_arrival[0], flight_distance_km)
+            insert_new_flight(uow, flight_table, airport_departure.AirportID, airport_arrival.AirportID, flight_distance_km)
 
     print('Data inserted !')
     """
@@ -0,0 +1,274 @@
+"""
+Author : Laurent Cesaro
+Topic : Python file which contains the instrumentation of the simulator (stage timers, histograms, counters)
+
+    with METRICS.timer('pricing'):
+        ...
+    METRICS.count('flights')
+    METRICS.progress()          # Progress line, at most every progress_interval seconds
+    print(METRICS.summary())    # p50/p95/p99 of each stage, counters and rates
+
+Each timing goes to a histogram with logarithmic buckets (2% precision): memory is bounded
+and an observation costs a few hundred nanoseconds, so the metrics can stay on in production.
+Histograms and counters are updated under a lock: the stages of the pipeline time and count from several threads.
+DB statements are timed with SQLAlchemy events (instrument_engine), in the METRICS of the process.
+"""
+
+import os
+import math
+import time
+import threading
+
+# Ratio between two consecutive buckets of a histogram
+BUCKET_RATIO = 1.02
+LOG_BUCKET_RATIO = math.log(BUCKET_RATIO)
+SMALLEST_VALUE = 1e-9
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Distribution of positive values (durations in seconds) in logarithmic buckets.
+    observe() and quantile() hold the lock of the histogram, so several threads can time the same stage.
+    """
+
+    __slots__ = ('buckets', 'count', 'sum', 'min', 'max', 'lock')
+
+    def __init__(self):
+        self.buckets = {}  # Bucket index -> number of values
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        # Bucket b holds [BUCKET_RATIO ** b, BUCKET_RATIO ** (b + 1)): int() would put the values below 1s one bucket too high
+        bucket = math.floor(math.log(max(value, SMALLEST_VALUE)) / LOG_BUCKET_RATIO)
+        with self.lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.sum += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """
+        Value below which q of the values are (middle of the bucket, clamped to min/max).
+        """
+        with self.lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    return min(max(BUCKET_RATIO ** (bucket + 0.5), self.min), self.max)
+            return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Timer:
+    """
+    Context manager timing one execution of a stage.
+    """
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class NullTimer:
+    """
+    Timer of disabled metrics.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """
+    Stage timings (histograms) and counters of a simulation run.
+    The lock protects the counters and the creation of the histograms; the reports read copies taken under it.
+    """
+
+    def __init__(self, progress_interval=10.0, enabled=True):
+        self.progress_interval = progress_interval
+        self.enabled = enabled
+        self.histograms = {}  # Stage name -> Histogram
+        self.counters = {}  # Counter name -> value
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+        self.start = time.perf_counter()
+        self.last_progress = self.start
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def snapshot(self):
+        """
+        Copies of (histograms items, counters items), which other threads can't change while they are read.
+        """
+        with self._lock:
+            return list(self.histograms.items()), list(self.counters.items())
+
+    def timer(self, name):
+        """
+        with metrics.timer('stage'): ...
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self.histogram(name))
+
+    def timed(self, name=None):
+        """
+        Decorator timing each call of a function (stage name: the function name by default).
+        """
+        def decorator(function):
+            stage = name or function.__name__
+
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            wrapper.__wrapped__ = function
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def progress_line(self):
+        """
+        One line: counters with their rate, and the share of the time spent in DB statements.
+        """
+        elapsed = max(self.elapsed(), 1e-9)
+        histograms, counters = self.snapshot()
+        parts = [f'{value} {name} ({value / elapsed:.1f}/s)' for name, value in counters]
+        db_time = sum(histogram.sum for name, histogram in histograms if name.startswith('db.'))
+        if db_time:
+            parts.append(f'db {100 * db_time / elapsed:.0f}% of the time')
+        return f'{elapsed:.0f}s: ' + ', '.join(parts)
+
+    def progress(self, prefix='', force=False):
+        """
+        Print the progress line if progress_interval seconds passed since the last one (or if force).
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if force or now - self.last_progress >= self.progress_interval:
+            self.last_progress = now
+            print(f'{prefix}{self.progress_line()}', flush=True)
+
+    def summary(self):
+        """
+        Report of the run: one line per stage (count, total, mean, p50/p95/p99 in ms), then the counters.
+        """
+        elapsed = max(self.elapsed(), 1e-9)
+        histograms, counters = self.snapshot()
+        lines = [f"{'stage':<28} {'count':>9} {'total s':>9} {'% time':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        for name, histogram in sorted(histograms, key=lambda item: -item[1].sum):
+            lines.append(f"{name:<28} {histogram.count:>9} {histogram.sum:>9.2f} {100 * histogram.sum / elapsed:>6.1f}% "
+                         f"{1000 * histogram.mean():>9.3f} " + ' '.join(f'{1000 * histogram.quantile(q):>9.3f}' for q in QUANTILES))
+        lines.append(f'Run time {elapsed:.1f}s')
+        for name, value in counters:
+            lines.append(f'{name}: {value} ({value / elapsed:.1f}/s)')
+        return '\n'.join(lines)
+
+    def write_prometheus(self, file_path, labels=None):
+        """
+        Write the metrics in the Prometheus text format (for the node_exporter textfile collector).
+        The file is replaced atomically so the collector never reads a partial file.
+        """
+        labels = ''.join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        histograms, counters = self.snapshot()
+        own_labels = f'{{{labels[1:]}}}' if labels else ''
+        lines = ['# HELP airflight_stage_seconds Duration of the simulator stages.',
+                 '# TYPE airflight_stage_seconds summary']
+        for name, histogram in histograms:
+            stage = f'stage="{name}"{labels}'
+            for q in QUANTILES:
+                lines.append(f'airflight_stage_seconds{{{stage},quantile="{q}"}} {histogram.quantile(q):.9f}')
+            lines.append(f'airflight_stage_seconds_sum{{{stage}}} {histogram.sum:.9f}')
+            lines.append(f'airflight_stage_seconds_count{{{stage}}} {histogram.count}')
+        for name, value in counters:
+            metric = 'airflight_' + ''.join(c if c.isalnum() else '_' for c in name) + '_total'
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{own_labels} {value}')
+        lines.append('# TYPE airflight_run_seconds gauge')
+        lines.append(f'airflight_run_seconds{own_labels} {self.elapsed():.3f}')
+
+        tmp_file = f'{file_path}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_file, file_path)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+    words = statement.split(None, 1)
+    kind = words[0].upper() if words else 'OTHER'
+    METRICS.observe(f'db.{kind}', elapsed)
+    if kind in ('INSERT', 'UPDATE'):
+        METRICS.count('rows written', len(parameters) if executemany else max(cursor.rowcount, 0))
+
+def instrument_engine(engine):
+    """
+    Time every statement of engine in the 'db.<SELECT|INSERT|UPDATE|...>' stages of METRICS,
+    and count the rows written by INSERT/UPDATE ('rows written'). Calling it again does nothing.
+    """
+    from sqlalchemy import event  # Only the runs with a database have an engine
+    if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    return engine
+
+
+# Metrics of the process
+METRICS = Metrics()
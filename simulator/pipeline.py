@@ -0,0 +1,342 @@
+"""
+Author : Laurent Cesaro
+Topic : Python file which contains the staged pipeline of the simulator (bounded queues between the stages)
+
+    flights -> plane assignment -> timing -> manifest -> pricing -> fuel cost -> persistence
+
+Each stage has its own pool of threads and reads the flights of the previous stage from a bounded queue:
+when a stage is slower than the others its input queue fills up and the stages before it wait (backpressure),
+so memory stays flat. Plane assignment (fleet index, flight codes) and persistence (sink) run in one thread,
+the other stages can get more threads (NumPy releases the GIL during parts of its work).
+The persistence stage coalesces the flights of many input batches into large writes.
+"""
+
+import time
+import queue
+import threading
+import numpy as np
+
+from functions import calculate_flight_time, get_passenger_number, random_departure_times, calculate_arrival_times, compute_ticket_prices, FuelEngine
+from sinks import PASSENGER_COLUMNS
+from metrics import METRICS
+
+# Stages in pipeline order
+STAGES = ['plane_assignment', 'timing', 'manifest', 'pricing', 'fuel', 'persistence']
+# Default number of threads of the stages which can have several (the others have one)
+STAGE_WORKERS = {'timing': 1, 'manifest': 4, 'pricing': 2, 'fuel': 1}
+
+# End of the flights, sent once to each thread of the next stage
+DONE = object()
+
+
+class FlightRecord:
+    """
+    A flight going through the stages, each stage fills its own fields.
+    """
+
+    __slots__ = ('flight', 'plane', 'departure_time', 'flight_code', 'rng', 'flight_time', 'arrival_time', 'passenger_number',
+                 'passengers', 'barrel_price', 'fuel_price', 'fuel_volume', 'fuel_over_tank')
+
+    def __init__(self, flight, plane, departure_time, flight_code, rng):
+        self.flight = flight
+        self.plane = plane
+        self.departure_time = departure_time
+        self.flight_code = flight_code
+        self.rng = rng  # Generator of the flight: its values do not depend on the thread which runs a stage
+
+    def flight_row(self):
+        return {'FlightID': self.flight.FlightID,
+                'FlightCode': self.flight_code,
+                'FlightStatus': True,
+                'AirportDeparture': self.flight.AirportDeparture,
+                'AirportArrival': self.flight.AirportArrival,
+                'TimeDeparture': self.departure_time,
+                'TimeArrival': self.arrival_time,
+                'Distance': self.flight.Distance,
+                'FlightTimeMinutes': self.flight_time,
+                'NbPassenger': self.passenger_number,
+                'PlaneID': self.plane.PlaneID}
+
+    def consumption_row(self):
+        return {'BarrelPriceDollar': self.barrel_price,
+                'TotalFuelPriceDollar': self.fuel_price,
+                'TotalFuelVolumeGallons': self.fuel_volume,
+                'FlightID': self.flight.FlightID,
+                'FuelOverTank': self.fuel_over_tank}
+
+
+def assign_timing(record):
+    """
+    Flight time, number of passengers and arrival time.
+    """
+    with METRICS.timer('timing'):
+        record.flight_time = calculate_flight_time(record.flight.Distance, record.plane)
+        record.passenger_number = get_passenger_number(record.plane, record.rng)
+        # datetime64[s] until the sinks (the scheduler gives datetimes)
+        record.departure_time = np.datetime64(record.departure_time, 's')
+        record.arrival_time = calculate_arrival_times(record.departure_time, record.flight_time)
+    return record
+
+def generate_manifest(record, passenger_generator):
+    """
+    Passengers of the flight, as a dict of NumPy arrays (no DataFrame per flight).
+    """
+    with METRICS.timer('passengers'):
+        record.passengers = passenger_generator.generate_columns(record.rng, record.passenger_number)
+    return record
+
+def price_tickets(record):
+    """
+    Ticket price and purchase date of each passenger: record.passengers gets the PASSENGER_COLUMNS, in this order.
+    """
+    with METRICS.timer('pricing'):
+        passengers = record.passengers
+        passengers['TicketPriceDollar'], passengers['PurchaseDate'] = compute_ticket_prices(
+            record.passenger_number, record.flight.Distance, record.departure_time, passengers['Surname'], record.rng)
+        passengers['FlightID'] = np.full(record.passenger_number, record.flight.FlightID)
+        record.passengers = {column: passengers[column] for column in PASSENGER_COLUMNS}
+    return record
+
+def compute_fuel(record, oil_price_provider, fuel_engine):
+    """
+    Oil price of the departure date and fuel cost of the flight.
+    """
+    with METRICS.timer('oil_price'):
+        record.barrel_price = oil_price_provider.price_per_barrel(record.departure_time)
+    with METRICS.timer('fuel_cost'):
+        record.fuel_price, record.fuel_volume, record.fuel_over_tank = fuel_engine.compute_flight(
+            record.plane, record.flight.Distance, record.passenger_number, record.barrel_price / 42)
+    if record.fuel_over_tank:
+        METRICS.count('flights over tank capacity')
+    return record
+
+def compute_fuel_batch(records, oil_price_provider, fuel_engine):
+    """
+    compute_fuel for a batch of flights: one vectorized fuel computation for all the records.
+    """
+    if not records:
+        return records
+    with METRICS.timer('oil_price'):
+        barrel_prices = oil_price_provider.prices_per_barrel(np.array([record.departure_time for record in records]))
+    with METRICS.timer('fuel_cost'):
+        fuel_prices, fuel_volumes, over_tank = fuel_engine.compute_flights(
+            [record.plane for record in records], [record.flight.Distance for record in records],
+            [record.passenger_number for record in records], barrel_prices / 42)
+    for record, barrel_price, fuel_price, fuel_volume, fuel_over_tank in zip(records, barrel_prices.tolist(), fuel_prices.tolist(),
+                                                                             fuel_volumes.tolist(), over_tank.tolist()):
+        record.barrel_price = barrel_price
+        record.fuel_price = fuel_price
+        record.fuel_volume = fuel_volume
+        record.fuel_over_tank = fuel_over_tank
+    if over_tank.any():
+        METRICS.count('flights over tank capacity', int(over_tank.sum()))
+    return records
+
+def record_rows(records):
+    """
+    (Flight rows, Passenger columns, Consumption rows) of simulated records, as the sinks write them.
+    """
+    return ([record.flight_row() for record in records],
+            [record.passengers for record in records],
+            [record.consumption_row() for record in records])
+
+def parse_stage_workers(text):
+    """
+    'manifest=4,pricing=2' -> {'manifest': 4, 'pricing': 2}
+    """
+    stage_workers = {}
+    for item in filter(None, text.split(',')):
+        name, _, value = item.partition('=')
+        if name not in STAGE_WORKERS:
+            raise ValueError(f"Unknown stage '{name}', the stages with a thread pool are: {', '.join(STAGE_WORKERS)}")
+        if not value.isdigit() or int(value) < 1:
+            raise ValueError(f"Number of threads of '{name}' must be a positive integer")
+        stage_workers[name] = int(value)
+    return stage_workers
+
+
+class PipelineStopped(Exception):
+    """
+    Raised in the threads of the stages when another stage failed.
+    """
+
+
+class FlightPipeline:
+    """
+    Simulate the flights with one pool of threads per stage, connected by queues of at most queue_size flights.
+
+    The persistence stage writes write_batch_size flights at a time in the sink, or what it has when
+    no flight arrived for flush_interval seconds. The first error of a stage stops the pipeline and is raised by run().
+    Flights are written in the order they leave the pipeline, not in FlightID order.
+    """
+
+    def __init__(self, fleet_index, code_allocator, passenger_generator, oil_price_provider, sink, run_random,
+                 stage_workers=None, queue_size=256, write_batch_size=1000, flush_interval=1.0, fuel_engine=None):
+        self.fleet_index = fleet_index
+        self.code_allocator = code_allocator
+        self.passenger_generator = passenger_generator
+        self.oil_price_provider = oil_price_provider
+        self.sink = sink
+        self.run_random = run_random
+        self.fuel_engine = fuel_engine if fuel_engine is not None else FuelEngine.load()
+        self.workers = {'plane_assignment': 1, **STAGE_WORKERS, **(stage_workers or {}), 'persistence': 1}
+        self.queue_size = queue_size
+        self.write_batch_size = write_batch_size
+        self.flush_interval = flush_interval
+        self.done = 0
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+
+    def fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def put(self, output_queue, item):
+        # Blocks while the queue is full (backpressure), but gives up when the pipeline stops
+        while not self._stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise PipelineStopped()
+
+    def get(self, input_queue, timeout=None):
+        """
+        Next item of input_queue, None if nothing arrived for timeout seconds (never if timeout is None).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+        raise PipelineStopped()
+
+    def handler(self, stage):
+        """
+        Function of one thread of stage: record -> record, or None when the flight leaves the pipeline.
+        The random values of a flight come from its own Generator (run_random.flight), created by the plane assignment.
+        """
+        if stage == 'plane_assignment':
+            def assign_plane(flight):
+                rng = self.run_random.flight(flight.FlightID)
+                with METRICS.timer('plane_assignment'):
+                    plane = self.fleet_index.take(flight.AirportDeparture, flight.Distance, rng)
+                if isinstance(plane, str):
+                    # No plane available, the flight stays pending
+                    self.skipped += 1
+                    METRICS.count('skipped flights')
+                    return None
+                with METRICS.timer('flight_code'):
+                    flight_code = self.code_allocator.next_code(plane.CompanyID, flight.FlightID)
+                return FlightRecord(flight, plane, random_departure_times(rng), flight_code, rng)
+            return assign_plane
+        if stage == 'timing':
+            return assign_timing
+        if stage == 'manifest':
+            return lambda record: generate_manifest(record, self.passenger_generator)
+        if stage == 'pricing':
+            return price_tickets
+        if stage == 'fuel':
+            return lambda record: compute_fuel(record, self.oil_price_provider, self.fuel_engine)
+        raise ValueError(f"Unknown stage: {stage}")
+
+    def run_stage(self, stage, input_queue, output_queue, next_workers, remaining):
+        """
+        Loop of one thread of stage. The last thread of the stage to finish sends DONE to each thread of the next stage.
+        """
+        try:
+            handle = self.handler(stage)
+            while True:
+                record = self.get(input_queue)
+                if record is DONE:
+                    break
+                record = handle(record)
+                if record is not None:
+                    self.put(output_queue, record)
+            with self._lock:
+                remaining[stage] -= 1
+                last = remaining[stage] == 0
+            if last:
+                for _ in range(next_workers):
+                    self.put(output_queue, DONE)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self.fail(error)
+
+    def persist(self, input_queue):
+        """
+        Loop of the persistence stage: coalesce the flights into writes of write_batch_size flights.
+        """
+        records = []
+        try:
+            while True:
+                record = self.get(input_queue, self.flush_interval)
+                if record is DONE:
+                    break
+                if record is None:
+                    # Nothing new for flush_interval seconds: write what is there
+                    self.write(records)
+                    records = []
+                    continue
+                records.append(record)
+                if len(records) >= self.write_batch_size:
+                    self.write(records)
+                    records = []
+            self.write(records)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self.fail(error)
+
+    def write(self, records):
+        if not records:
+            return
+        with METRICS.timer('sink_write'):
+            self.sink.write(*record_rows(records))
+        self.done += len(records)
+        METRICS.count('flights', len(records))
+        METRICS.count('passengers', sum(record.passenger_number for record in records))
+        METRICS.progress()
+
+    def run(self, flight_chunks):
+        """
+        Simulate all the flights of flight_chunks (lists of Flight records), read in this thread.
+
+        Returns:
+            (number of flights simulated, number of flights skipped because no plane was available)
+        """
+        queues = {stage: queue.Queue(self.queue_size) for stage in STAGES}
+        remaining = dict(self.workers)
+        threads = []
+        for stage, next_stage in zip(STAGES, STAGES[1:]):
+            for _ in range(self.workers[stage]):
+                threads.append(threading.Thread(target=self.run_stage, name=stage, daemon=True,
+                                                args=(stage, queues[stage], queues[next_stage], self.workers[next_stage], remaining)))
+        threads.append(threading.Thread(target=self.persist, name='persistence', daemon=True, args=(queues['persistence'],)))
+        for thread in threads:
+            thread.start()
+
+        try:
+            for flights in flight_chunks:
+                for flight_ in flights:
+                    self.put(queues['plane_assignment'], flight_)
+            self.put(queues['plane_assignment'], DONE)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self.fail(error)
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return self.done, self.skipped
@@ -0,0 +1,154 @@
+"""
+Author : Laurent Cesaro
+Topic : Python file which contains the discrete-event scheduler of the fleet (plane rotations)
+
+Each flight is a DEPARTURE event: a plane with a sufficient range is taken at the departure airport.
+Its ARRIVAL event, flight time later, puts the plane back on the ground at the arrival airport,
+so the fleet moves with the traffic instead of staying in flight forever.
+A flight which finds no plane waits at its airport for the next arrival of a plane with a sufficient range.
+"""
+
+import heapq
+import itertools
+from datetime import datetime, timedelta
+import numpy as np
+
+from functions import calculate_flight_time
+
+# Origin of the "daytime seconds" timeline
+EPOCH = datetime(1970, 1, 1)
+# Departures are never between midnight (00:00) and 6AM
+FIRST_DEPARTURE_HOUR = 6
+DAYTIME_SECONDS = (24 - FIRST_DEPARTURE_HOUR) * 3600
+
+# At the same time, arrivals are processed before departures so landed planes can leave again
+ARRIVAL = 0
+DEPARTURE = 1
+
+
+def next_daytime(time):
+    """
+    time if it is between 6AM and midnight, else 6AM of the same day.
+    """
+    if time.hour < FIRST_DEPARTURE_HOUR:
+        return time.replace(hour=FIRST_DEPARTURE_HOUR, minute=0, second=0, microsecond=0)
+    return time
+
+def to_daytime_seconds(time):
+    """
+    Number of "daytime" seconds (6AM to midnight only, 18 hours per day) between 1970/01/01 and time.
+    """
+    day = (time - EPOCH).days
+    seconds = (time - EPOCH - timedelta(days=day)).seconds - FIRST_DEPARTURE_HOUR * 3600
+    return day * DAYTIME_SECONDS + min(max(seconds, 0), DAYTIME_SECONDS)
+
+def from_daytime_seconds(daytime_seconds):
+    """
+    Inverse of to_daytime_seconds.
+    """
+    day, seconds = divmod(int(daytime_seconds), DAYTIME_SECONDS)
+    return EPOCH + timedelta(days=day, seconds=FIRST_DEPARTURE_HOUR * 3600 + seconds)
+
+def random_daytimes(rng, start, end, size):
+    """
+    size sorted random departure times in [start, end), never between 00:00 and 6AM.
+    """
+    first = to_daytime_seconds(start)
+    last = max(to_daytime_seconds(end), first + 1)
+    daytime_seconds = rng.integers(first, last, size=size)
+    daytime_seconds.sort()
+    # from_daytime_seconds of the whole array, as datetime64[s], then datetimes for the event queue
+    days, seconds = np.divmod(daytime_seconds, DAYTIME_SECONDS)
+    return (np.datetime64(EPOCH, 's') + (days * 86400 + FIRST_DEPARTURE_HOUR * 3600 + seconds).astype('timedelta64[s]')).tolist()
+
+
+class FleetScheduler:
+    """
+    Heap-based discrete-event scheduler of departures and arrivals.
+
+    Flights whose departure airport has no plane with a sufficient range wait at the airport, in line (first come, first served):
+    when a plane lands there, the waiting flights it can fly take off first (6AM if it lands at night), whatever the delay.
+    Only the flights still waiting when no event is left never find a plane (skipped).
+    The plane of a flight is chosen with the Generator of the flight (run_random.flight), so a seeded run is reproducible.
+    """
+
+    def __init__(self, fleet_index, run_random):
+        self.fleet_index = fleet_index
+        self.run_random = run_random
+        self.now = None
+        self._events = []
+        self._sequence = itertools.count()  # Keeps the heap stable for events at the same time
+        self._waiting = {}  # AirportID -> flights waiting for a plane, in line order
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def waiting(self):
+        """
+        Flights waiting for a plane; once all the events are processed, the flights which never found one.
+        """
+        return [flight for flights in self._waiting.values() for flight in flights]
+
+    def schedule_departure(self, flight, time):
+        heapq.heappush(self._events, (time, DEPARTURE, next(self._sequence), flight, None))
+
+    def schedule_arrival(self, plane, airportID, time):
+        heapq.heappush(self._events, (time, ARRIVAL, next(self._sequence), plane, airportID))
+
+    def run(self, until=None):
+        """
+        Process the events in time order, up to until (all of them if until is None).
+
+        Yields:
+            (departure_time, flight, plane, rng) for each flight which took off, rng being the Generator of the flight.
+        """
+        while self._events and (until is None or self._events[0][0] < until):
+            time, kind, _, payload, extra = heapq.heappop(self._events)
+            self.now = time
+
+            if kind == ARRIVAL:
+                self.fleet_index.release(payload, extra)
+                yield from self.board_waiting(payload, extra, time)
+                continue
+
+            flight = payload
+            departure = self.depart(flight, time)
+            if departure is None:
+                # No plane with sufficient range at the airport for now: wait in line for the next one
+                self._waiting.setdefault(flight.AirportDeparture, []).append(flight)
+                continue
+            yield departure
+
+    def depart(self, flight, time):
+        """
+        Take a plane for flight at its departure airport and schedule its arrival.
+
+        Returns:
+            (departure_time, flight, plane, rng), or None when the airport has no plane with a sufficient range.
+        """
+        rng = self.run_random.flight(flight.FlightID)
+        plane = self.fleet_index.take(flight.AirportDeparture, flight.Distance, rng)
+        if isinstance(plane, str):
+            return None
+        flight_time = calculate_flight_time(flight.Distance, plane)
+        self.schedule_arrival(plane, flight.AirportArrival, time + timedelta(minutes=flight_time))
+        return time, flight, plane, rng
+
+    def board_waiting(self, plane, airportID, time):
+        """
+        A plane landed at airportID: the waiting flights it can fly take off, in line order, while the airport has planes for them.
+        Several can leave: the first one may take another plane of the airport.
+        """
+        waiting = self._waiting.get(airportID)
+        if not waiting:
+            return
+        departure_time = next_daytime(time)
+        still_waiting = []
+        for flight in waiting:
+            departure = self.depart(flight, departure_time) if flight.Distance <= plane.RangeKM else None
+            if departure is None:
+                still_waiting.append(flight)
+            else:
+                yield departure
+        self._waiting[airportID] = still_waiting
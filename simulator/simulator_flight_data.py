@@ -4,217 +4,605 @@ Topic : Python file to insert data in the database
 """
 
 from datetime import datetime, timedelta
-import airportsdata
-from sqlalchemy import create_engine, DateTime, text, insert, Table, Column, Float, String, Integer, DateTime, Boolean, MetaData, select, update
+import os
+import time
 import sys
+import multiprocessing
+import itertools
 import argparse
-from faker import Faker # Generate fake Name/Surname/Phone/Gender
-import pandas as pd
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from functions import * # Import functions from functions.py
+# sqlalchemy and database.py (tables, engines) are imported by the code paths which use the database
+from sinks import DatabaseSink, AsyncDatabaseSink, MultiSink, PASSENGER_COLUMNS, get_file_sink
+from scheduler import FleetScheduler, random_daytimes
+from pipeline import FlightPipeline, FlightRecord, assign_timing, generate_manifest, price_tickets, compute_fuel_batch, record_rows, parse_stage_workers
+from metrics import METRICS, instrument_engine
+
+
+def simulate_flight(flight_, plane_code, departure_time, passenger_generator, code_allocator, rng):
+    """
+    Simulate one flight with its plane and departure time already chosen,
+    except its fuel cost (computed for a whole batch by compute_fuel_batch).
+
+    Returns:
+        FlightRecord
+    """
+    with METRICS.timer('flight_code'):
+        FlightCode_ = code_allocator.next_code(plane_code.CompanyID, flight_.FlightID)
+    record = FlightRecord(flight_, plane_code, departure_time, FlightCode_, rng)
+
+    assign_timing(record)
+    # Generate the passengers and their ticket price
+    generate_manifest(record, passenger_generator)
+    price_tickets(record)
+    METRICS.count('flights')
+    METRICS.count('passengers', record.passenger_number)
+    return record
+
+def simulate_flights(flights, passenger_generator, code_allocator, fleet_index, oil_price_provider, run_random, fuel_engine):
+    """
+    Simulate a batch of pending flights: planes (fleet_index) and flight codes (code_allocator) are resolved in memory.
+    Every random value of a flight comes from its own Generator (run_random.flight), whatever the batch it is in.
+    The fuel cost of the batch is computed at once by fuel_engine.
+
+    Returns:
+        (Flight rows, Passenger columns, Consumption rows, FlightIDs of the flights skipped because no plane was available)
+    """
+    records = []
+    skipped = []
+    for flight_ in flights:
+        airport_departure = flight_.AirportDeparture
+        flight_distance_km = flight_.Distance
+        rng = run_random.flight(flight_.FlightID)
+
+        with METRICS.timer('plane_assignment'):
+            plane_code = fleet_index.take(airport_departure, flight_distance_km, rng)
+        if isinstance(plane_code, str):
+            # No plane available, the flight stays pending
+            skipped.append(flight_.FlightID)
+            METRICS.count('skipped flights')
+            continue
+
+        records.append(simulate_flight(flight_, plane_code, random_departure_times(rng), passenger_generator, code_allocator, rng))
+    # Oil price of the departure dates and fuel cost
+    compute_fuel_batch(records, oil_price_provider, fuel_engine)
+    return (*record_rows(records), skipped)
+
+def simulate_flight_batch(flights, passenger_generator, code_allocator, fleet_index, oil_price_provider, run_random, fuel_engine, sink):
+    """
+    Simulate a batch of pending flights and write them in the sink
+    (one transaction with a multi-row statement per table for the database).
+
+    Returns:
+        (number of flights simulated, FlightIDs of the flights skipped because no plane was available)
+    """
+    flight_rows, passenger_columns, consumption_rows, skipped = simulate_flights(flights, passenger_generator, code_allocator,
+                                                                             fleet_index, oil_price_provider, run_random, fuel_engine)
+    if not flight_rows:
+        return 0, skipped
+
+    with METRICS.timer('sink_write'):
+        sink.write(flight_rows, passenger_columns, consumption_rows)
+    return len(flight_rows), skipped
+
+def run_batch_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, checkpoint=None, worker=0, run_random=None):
+    """
+    Simulate all the pending flights of flight_chunks (lists of Flight records), one chunk per batch.
+
+    After each written batch, the FlightID up to which every flight is done is saved in checkpoint (if given),
+    and a new run starts after it: a flight skipped because no plane was available stays pending,
+    so the checkpoint stops before it and the next run simulates it again.
+    """
+    if run_random is None:
+        run_random = RunRandom()
+    passenger_generator = run_random.passenger_generator()
+    fuel_engine = FuelEngine.load()
+    if checkpoint is None:
+        checkpoint = Checkpoint(None)
+
+    total_done = 0
+    total_skipped = 0
+    all_done = True  # No flight skipped yet: the checkpoint follows the last FlightID written
+    for flights in flight_chunks:
+        done, skipped = simulate_flight_batch(flights, passenger_generator, code_allocator, fleet_index, oil_price_provider, run_random,
+                                              fuel_engine, sink)
+        if all_done:
+            # Flights are read in FlightID order
+            checkpoint.save(skipped[0] - 1 if skipped else flights[-1].FlightID)
+            all_done = not skipped
+        total_done += done
+        total_skipped += len(skipped)
+        METRICS.progress(f'[worker {worker}] ')
+    print(f'[worker {worker}] {total_done} flights simulated, {total_skipped} skipped (no plane)')
+    return total_done, total_skipped
+
+def run_pipeline_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, batch_size, stage_workers=None, run_random=None):
+    """
+    Simulate the pending flights of flight_chunks with the staged pipeline of pipeline.py:
+    one pool of threads per stage, bounded queues between the stages and writes of batch_size flights.
+    """
+    if run_random is None:
+        run_random = RunRandom()
+    pipeline = FlightPipeline(fleet_index, code_allocator, run_random.passenger_generator(), oil_price_provider, sink,
+                              run_random, stage_workers, write_batch_size=batch_size)
+    done, skipped = pipeline.run(flight_chunks)
+    print(f'{done} flights simulated, {skipped} skipped (no plane)')
+    return done, skipped
+
+def prepare_flight_batch(flights, passenger_generator, code_allocator, fleet_index, oil_price_provider, run_random, fuel_engine, sink):
+    """
+    Simulate a batch of pending flights and build the parameters of its transaction (sink.prepare), for run_async_mode.
+
+    Returns:
+        (transaction parameters or None, number of flights simulated, number of flights skipped)
+    """
+    flight_rows, passenger_columns, consumption_rows, skipped = simulate_flights(flights, passenger_generator, code_allocator,
+                                                                             fleet_index, oil_price_provider, run_random, fuel_engine)
+    if not flight_rows:
+        return None, 0, len(skipped)
+    return sink.prepare(flight_rows, passenger_columns, consumption_rows), len(flight_rows), len(skipped)
+
+async def run_async_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, run_random=None):
+    """
+    Asyncio version of run_batch_mode: flight_chunks is an async iterator of pending flights (iter_pending_flights_async)
+    and sink an AsyncDatabaseSink.
+
+    Each batch is simulated in a worker thread, so the event loop keeps running the write transactions
+    of the previous batches meanwhile; the simulation only waits when all the write slots of the sink are busy.
+    """
+    if run_random is None:
+        run_random = RunRandom()
+    passenger_generator = run_random.passenger_generator()
+    fuel_engine = FuelEngine.load()
+    loop = asyncio.get_running_loop()
+
+    total_done = 0
+    total_skipped = 0
+    # One thread: the fleet index, the code allocator and the generators are not thread-safe
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        async with sink:
+            async for flights in flight_chunks:
+                batch, done, skipped = await loop.run_in_executor(executor, prepare_flight_batch, flights, passenger_generator,
+                                                                  code_allocator, fleet_index, oil_price_provider, run_random,
+                                                                  fuel_engine, sink)
+                if batch is not None:
+                    with METRICS.timer('write_slot_wait'):
+                        await sink.write(batch)
+                total_done += done
+                total_skipped += skipped
+                METRICS.progress()
+    print(f'{total_done} flights simulated, {total_skipped} skipped (no plane)')
+    return total_done, total_skipped
+
+def run_schedule_mode(flight_chunks, nb_flights, fleet_index, code_allocator, oil_price_provider, sink, batch_size, start, days, run_random=None):
+    """
+    Simulate the nb_flights pending flights of flight_chunks over days days of simulated time from start, with plane rotations.
+
+    Pending flights (in FlightID order) get departure times spread over the period.
+    The FleetScheduler takes a plane at each departure and puts it back at the arrival airport
+    after the flight time, so the fleet never drains. A flight without a plane waits for the next arrival at its airport
+    of a plane with a sufficient range. Flights are written batch_size at a time.
+    """
+    if run_random is None:
+        run_random = RunRandom()
+    passenger_generator = run_random.passenger_generator()
+    fuel_engine = FuelEngine.load()
+    rng = run_random.stream('schedule')
+    scheduler = FleetScheduler(fleet_index, run_random)
+    if not nb_flights:
+        return 0, 0
+    period_per_flight = timedelta(days=days) / nb_flights
+
+    records = []
+    total_done = 0
+
+    def write_records():
+        nonlocal records, total_done
+        # Oil price of the departure dates and fuel cost of the batch
+        compute_fuel_batch(records, oil_price_provider, fuel_engine)
+        with METRICS.timer('sink_write'):
+            sink.write(*record_rows(records))
+        total_done += len(records)
+        records = []
+
+    def simulate_departures(until):
+        for departure_time, flight_, plane_code, flight_rng in scheduler.run(until):
+            records.append(simulate_flight(flight_, plane_code, departure_time, passenger_generator, code_allocator, flight_rng))
+            if len(records) >= batch_size:
+                write_records()
+                METRICS.progress(f'[{scheduler.now}] ')
+
+    window_start = start
+    for flights in flight_chunks:
+        # The departures of this chunk are in [window_start, window_end)
+        window_end = window_start + period_per_flight * len(flights)
+        for departure_time, flight_ in zip(random_daytimes(rng, window_start, window_end, len(flights)), flights):
+            scheduler.schedule_departure(flight_, departure_time)
+        simulate_departures(window_end)
+        window_start = window_end
+
+    # Remaining departures (retries) and all the arrivals, so every plane is back on the ground
+    simulate_departures(None)
+    write_records()
+    # Flights still waiting once every plane has landed: no plane with a sufficient range ever came to their airport
+    skipped = len(scheduler.waiting)
+    METRICS.count('skipped flights', skipped)
+    print(f'{total_done} flights simulated, {skipped} skipped (no plane with a sufficient range came to their airport), until {scheduler.now}')
+    return total_done, skipped
+
+def load_code_allocator(conn, metadata, by_flightID=False):
+    """
+    Flight code allocator of the companies of the database, with the sequences of Flight_Code_Sequence
+    (by_flightID: codes derived from the FlightID, for seeded runs).
+    """
+    company_codes = load_company_codes(conn, metadata.tables['Company'])
+    if by_flightID:
+        return FlightIDCodeAllocator(company_codes)
+    return FlightCodeAllocator(company_codes, DatabaseSequenceStore(conn, metadata.tables['Flight_Code_Sequence']))
+
+def count_pending_flights(conn, flight_table):
+    """
+    Number of flights not simulated yet.
+    """
+    from sqlalchemy import select, func
+    with conn.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(flight_table).where(flight_table.c.FlightStatus == 0)).scalar()
+
+def open_sink(conn, metadata, fleet_index, export=None, output_dir=None, prefix=None):
+    """
+    Sink of a run: the database (conn is not None), files (export is 'parquet' or 'csv') or both.
+    """
+    sinks = []
+    if conn is not None:
+        sinks.append(DatabaseSink(conn, metadata, fleet_index))
+    if export is not None:
+        sinks.append(get_file_sink(export, output_dir, prefix))
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+
+def report_metrics(prometheus_file=None, worker=None):
+    """
+    Print the summary of the run, and write the metrics for Prometheus if prometheus_file is given.
+    """
+    if not METRICS.enabled:
+        return
+    print(METRICS.summary())
+    if prometheus_file is not None:
+        labels = {}
+        if worker is not None:
+            # One file per worker: the textfile collector reads all the *.prom files of its folder
+            root, extension = os.path.splitext(prometheus_file)
+            prometheus_file = f'{root}.worker{worker}{extension}'
+            labels['worker'] = worker
+        METRICS.write_prometheus(prometheus_file, labels)
+
+def run_worker(worker, nb_workers, batch_size, oil_price, oil_price_ttl, checkpoint_file=None, export=None, output_dir=None,
+               metrics_interval=10.0, prometheus_file=None, seed=None, by_flightID=False):
+    """
+    Entry point of a simulation process: each worker has its own engine, fleet index, oil price cache, checkpoint and files.
+
+    With nb_workers > 1, the worker only simulates the flights departing from its airports
+    (AirportID % nb_workers == worker) and only uses the planes parked at these airports,
+    so two workers never use the same Plane_Status row.
+    The random values of each flight only depend on (seed, FlightID), whatever nb_workers is,
+    and with by_flightID the flight codes are derived from the FlightID too.
+    """
+    from database import metadata, UnitOfWork
+    METRICS.reset()
+    METRICS.progress_interval = metrics_interval
+    METRICS.enabled = metrics_interval > 0
+    engine = instrument_engine(connect_db())
+    oil_price_provider = get_oil_price_provider(oil_price, oil_price_ttl)
+    if checkpoint_file is not None:
+        checkpoint_file = f'{checkpoint_file}.worker{worker}of{nb_workers}'
+    checkpoint = Checkpoint(checkpoint_file)
+    last_flightID = checkpoint.load()
+    if last_flightID:
+        print(f'[worker {worker}] Restart after FlightID {last_flightID}')
+
+    run_random = RunRandom(seed)
+    with UnitOfWork(engine) as uow:
+        code_allocator = load_code_allocator(uow, metadata, by_flightID)
+        fleet_index = FleetIndex.load(uow, metadata.tables['Plane'], metadata.tables['Plane_Status'], worker, nb_workers)
+        flight_chunks = iter_pending_flights(uow, metadata.tables['Flight'], batch_size, last_flightID, worker, nb_workers)
+        with open_sink(uow, metadata, fleet_index, export, output_dir, f"{time.strftime('%Y%m%d%H%M%S')}-worker{worker}") as sink:
+            run_batch_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, checkpoint, worker, run_random)
+    engine.dispose()
+    report_metrics(prometheus_file, worker if nb_workers > 1 else None)
+
+async def run_async_worker(batch_size, oil_price_provider, max_in_flight, run_random=None, by_flightID=False):
+    """
+    Entry point of the asyncio runner: reads and writes go through the async engine (AIRFLIGHT_DB_ASYNC_URL,
+    default: the database URL with aiomysql/aiosqlite), the start data and the flight code blocks through the usual engine.
+    """
+    from database import metadata, create_async_db_engine
+    if run_random is None:
+        run_random = RunRandom()
+    engine = instrument_engine(connect_db())
+    async_engine = create_async_db_engine()
+    instrument_engine(async_engine.sync_engine)
+    try:
+        code_allocator = load_code_allocator(engine, metadata, by_flightID)
+        fleet_index = FleetIndex.load(engine, metadata.tables['Plane'], metadata.tables['Plane_Status'])
+        flight_chunks = iter_pending_flights_async(async_engine, metadata.tables['Flight'], batch_size)
+        await run_async_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider,
+                             AsyncDatabaseSink(async_engine, metadata, fleet_index, max_in_flight), run_random)
+    finally:
+        await async_engine.dispose()
+        engine.dispose()
+
+def run_workers(nb_workers, batch_size, oil_price, oil_price_ttl, checkpoint_file=None, export=None, output_dir=None,
+                metrics_interval=10.0, prometheus_file=None, seed=None, by_flightID=False):
+    """
+    Start nb_workers simulation processes and wait for them.
+    """
+    processes = [multiprocessing.Process(target=run_worker, args=(worker, nb_workers, batch_size, oil_price, oil_price_ttl,
+                                                                  checkpoint_file, export, output_dir, metrics_interval, prometheus_file, seed, by_flightID))
+                 for worker in range(nb_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return all(process.exitcode == 0 for process in processes)
 
 
 # Main execution
 if __name__ == "__main__":
     # Parse command-line arguments
-    """
     parser = argparse.ArgumentParser(description='Flight simulation and database insertion.')
     
     # Adding arguments
-    parser.add_argument('--db', type=str, required=True, choices=['yes', 'no'], help='Whether to insert the simulated flights into the database')
-    parser.add_argument('--nb_f', type=int, required=True, help='The number of flights to simulate')
+    parser.add_argument('--db', type=str, default='yes', choices=['yes', 'no'], help='Whether to simulate the pending flights of the database (no: flights, airports and planes are generated from the JSON files)')
+    parser.add_argument('--nb_f', type=int, default=None, help='The number of flights to simulate (--db no)')
+    parser.add_argument('--export', type=str, default=None, choices=['parquet', 'csv'], help='Also write the simulated Flight/Passenger/Consumption tables as files (batch mode only)')
+    parser.add_argument('--output_dir', type=str, default='output', help='Folder of the exported files')
+    parser.add_argument('--batch_size', type=int, default=0, help='Number of pending flights simulated per transaction (0 = one flight at a time)')
+    parser.add_argument('--oil_price', type=str, default='live', help="Oil price source: 'live', 'fixed:<price per barrel>' or a CSV/JSON file of historical prices")
+    parser.add_argument('--oil_price_ttl', type=int, default=600, help='Seconds during which a live oil price is reused')
+    parser.add_argument('--workers', type=int, default=1, help='Number of simulation processes (batch mode only)')
+    parser.add_argument('--schedule_start', type=str, default=None, help='Start date (yyyy-mm-dd) of a scheduled run with plane rotations (batch mode only)')
+    parser.add_argument('--schedule_days', type=int, default=365, help='Number of simulated days of a scheduled run')
+    parser.add_argument('--checkpoint', type=str, default=None, help='File where the FlightID up to which every flight is simulated is saved, to resume an interrupted run (batch mode only)')
+    parser.add_argument('--async_writes', type=int, default=0, help='Number of write transactions kept in flight by the asyncio runner (0 = synchronous runner, batch mode only)')
+    parser.add_argument('--pipeline', action='store_true', help='Run the simulation stages in thread pools connected by bounded queues (batch mode only)')
+    parser.add_argument('--stage_workers', type=str, default='', help='Threads of the pipeline stages, e.g. manifest=4,pricing=2 (stages: timing, manifest, pricing, fuel)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the run: the random values of a flight only depend on (seed, FlightID) and flight codes are derived from the FlightID')
+    parser.add_argument('--shard', type=str, default=None, help='I/N: only simulate the generated flights departing from the airports with AirportID %% N == I (--db no, needs --seed)')
+    parser.add_argument('--metrics_interval', type=float, default=10, help='Seconds between two progress lines (0 = no metrics)')
+    parser.add_argument('--prometheus_file', type=str, default=None, help='File where the metrics of the run are written in the Prometheus text format')
 
     # Parse the arguments
     args = parser.parse_args()
+    if (args.workers > 1 or args.schedule_start or args.export or args.db == 'no') and args.batch_size <= 0:
+        parser.error('--workers, --schedule_start, --export and --db no need --batch_size')
+    if args.workers > 1 and args.schedule_start:
+        parser.error('--schedule_start moves planes between airports, it runs in one process')
+    if args.async_writes > 0:
+        if args.batch_size <= 0 or args.db == 'no':
+            parser.error('--async_writes needs --batch_size and a database')
+        if args.workers > 1 or args.schedule_start or args.export or args.checkpoint:
+            parser.error('--async_writes runs in one process, without --schedule_start, --export nor --checkpoint')
+    if args.pipeline:
+        if args.batch_size <= 0:
+            parser.error('--pipeline needs --batch_size (number of flights per write)')
+        if args.workers > 1 or args.schedule_start or args.async_writes or args.checkpoint:
+            parser.error('--pipeline runs in one process, without --schedule_start, --async_writes nor --checkpoint')
+        try:
+            stage_workers = parse_stage_workers(args.stage_workers)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.db == 'no':
+        if args.nb_f is None or args.export is None:
+            parser.error('--db no needs --nb_f and --export')
+        if args.workers > 1 or args.checkpoint:
+            parser.error('--db no runs in one process, without checkpoint')
+    if args.shard is not None:
+        shard, _, nb_shards = args.shard.partition('/')
+        if not (shard.isdigit() and nb_shards.isdigit() and int(shard) < int(nb_shards)):
+            parser.error('--shard must be I/N with 0 <= I < N')
+        if args.db != 'no' or args.seed is None or args.schedule_start:
+            parser.error('--shard needs --db no and --seed, without --schedule_start (use --workers with a database)')
+        shard, nb_shards = int(shard), int(nb_shards)
 
-    # Use the provided arguments
-    insert_in_db = args.db
-    number_of_flights = args.nb_f
-    """
-    # Connect to the database
-    engine = connect_db()
-    
-    # Define metadata
-    metadata = MetaData()
-    # Define the 'Airport' table
-    airport_table = Table(
-        'Airport', metadata,
-        Column('AirportID', Integer, primary_key=True, autoincrement=True),
-        Column('AirportCode', String(3)),
-        Column('Latitude', Float),
-        Column('Longitude', Float),
-        Column('LandingPrice', Float),
-        Column('AirportCountry', String(255))
-    )
-    # Define the 'Company' table
-    company_table = Table(
-        'Company', metadata,
-        Column('CompanyID', Integer, primary_key=True, autoincrement=True),
-        Column('Name', String(255)),
-        Column('Country', String(255)),
-        Column('IATACode', String(3))
-    )
-    # Define the 'Plane' table
-    plane_table = Table(
-        'Plane', metadata,
-        Column('PlaneID', Integer, primary_key=True, autoincrement=True),
-        Column('Model', String(255)),
-        Column('Manufacturer', String(255)),
-        Column('RangeKM', Integer),
-        Column('PassengerCapacity', Integer),
-        Column('CruisingSpeedKPH', Integer),
-        Column('WeightKG', Integer),
-        Column('TankCapacityInGallon', Integer),
-        Column('CompanyID', Integer)
-    )
-    # Define the 'Flight' table
-    flight_table = Table(
-        'Flight', metadata,
-        Column('FlightID', Integer, primary_key=True, autoincrement=True),
-        Column('FlightCode', String(13)),
-        Column('FlightStatus', Boolean),
-        Column('AirportDeparture', Integer),
-        Column('AirportArrival', Integer),
-        Column('TimeDeparture', DateTime),
-        Column('TimeArrival', DateTime),
-        Column('Distance', Integer),
-        Column('FlightTimeMinutes', Integer),
-        Column('NbPassenger', Integer),
-        Column('PlaneID', Integer)
-    )
-    # Define the 'Passenger' table
-    passenger_table = Table(
-        'Passenger', metadata,
-        Column('PassengerID', Integer, primary_key=True, autoincrement=True),
-        Column('Name', String(255), nullable=False),
-        Column('Surname', String(255), nullable=False),
-        Column('PhoneNumber', String(10)),
-        Column('Mail', String(255), nullable=False),
-        Column('Gender', String(255), nullable=False),
-        Column('TicketPriceDollar', Integer),
-        Column('PurchaseDate', DateTime),
-        Column('FlightID', Integer)
-    )
-    # Define the 'Company_Income' table
-    company_income_table = Table(
-        'Company_Income', metadata,
-        Column('IncomeID', Integer, primary_key=True, autoincrement=True),
-        Column('Income', Integer),
-        Column('TransactionDate', DateTime),
-        Column('Topic', String(10)),
-        Column('CompanyID', Integer)
-    )
-    # Define the 'Consumption' table
-    consumption_table = Table(
-        'Consumption', metadata,
-        Column('ConsumptionID', Integer, primary_key=True, autoincrement=True),
-        Column('BarrelPriceDollar', Integer),
-        Column('TotalFuelPriceDollar', Integer),
-        Column('TotalFuelVolumeGallons', Integer),
-        Column('FlightID', Integer)
-    ) 
-    # Define the 'Plane' table
-    plane_status_table = Table(
-        'Plane_Status', metadata,
-        Column('PlaneStatusID', Integer, primary_key=True, autoincrement=True),
-        Column('InFlight', Boolean),
-        Column('AirportID', Integer),
-        Column('PlaneID', Integer)
-    )
-    
-    # Load the airports database
-    airports = airportsdata.load("IATA")
+    # The seed is printed so a run without --seed can be replayed
+    run_random = RunRandom(args.seed)
+    print(f'Seed of the run: {run_random.seed}')
+
+    METRICS.progress_interval = args.metrics_interval
+    METRICS.enabled = args.metrics_interval > 0
+
+    if args.workers > 1:
+        # Each worker connects to the database by itself
+        success = run_workers(args.workers, args.batch_size, args.oil_price, args.oil_price_ttl, args.checkpoint, args.export, args.output_dir,
+                              args.metrics_interval, args.prometheus_file, run_random.seed, args.seed is not None)
+        sys.exit(0 if success else 1)
+
+    oil_price_provider = get_oil_price_provider(args.oil_price, args.oil_price_ttl)
+
+    if args.db == 'no':
+        # Airports, companies and planes come from the JSON files, the flights are generated in memory
+        airports, company_codes, fleet_index = load_json_data(rng=run_random.stream('fleet'))
+        if args.seed is not None:
+            # Generated FlightIDs are 1 to nb_f in every run: codes are shifted by a salt of the seed
+            code_allocator = FlightIDCodeAllocator(company_codes, FlightIDCodeAllocator.run_salt(run_random))
+        else:
+            # Flight numbers are kept next to the exported files, so codes stay unique across runs
+            code_allocator = FlightCodeAllocator(company_codes, FileSequenceStore(os.path.join(args.output_dir, 'flight_code_sequences.json')))
+        flight_chunks = iter_generated_flights(AirportSampler(airports), args.nb_f, args.batch_size, run_random.stream('flights'))
+        if args.shard is not None:
+            # Every shard generates the same flights and keeps the ones departing from its airports (like --workers)
+            flight_chunks = ([flight_ for flight_ in flights if flight_.AirportDeparture % nb_shards == shard] for flights in flight_chunks)
+        with open_sink(None, None, fleet_index, args.export, args.output_dir) as sink:
+            if args.schedule_start:
+                run_schedule_mode(flight_chunks, args.nb_f, fleet_index, code_allocator, oil_price_provider, sink,
+                                  args.batch_size, datetime.strptime(args.schedule_start, "%Y-%m-%d"), args.schedule_days, run_random)
+            elif args.pipeline:
+                run_pipeline_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, args.batch_size, stage_workers, run_random)
+            else:
+                run_batch_mode(flight_chunks, fleet_index, code_allocator, oil_price_provider, sink, run_random=run_random)
+        report_metrics(args.prometheus_file)
+        sys.exit(0)
+
+    # Every other mode uses the database
+    from database import metadata, UnitOfWork
+
+    if args.pipeline:
+        engine = instrument_engine(connect_db())
+        # The stages run in their own threads: each query checks out its own connection (no shared UnitOfWork)
+        code_allocator = load_code_allocator(engine, metadata, args.seed is not None)
+        fleet_index = FleetIndex.load(engine, metadata.tables['Plane'], metadata.tables['Plane_Status'])
+        with open_sink(engine, metadata, fleet_index, args.export, args.output_dir) as sink:
+            run_pipeline_mode(iter_pending_flights(engine, metadata.tables['Flight'], args.batch_size), fleet_index, code_allocator,
+                              oil_price_provider, sink, args.batch_size, stage_workers, run_random)
+        engine.dispose()
+        report_metrics(args.prometheus_file)
+        sys.exit(0)
+
+    if args.async_writes > 0:
+        asyncio.run(run_async_worker(args.batch_size, oil_price_provider, args.async_writes, run_random, args.seed is not None))
+        report_metrics(args.prometheus_file)
+        sys.exit(0)
+
+    if args.batch_size > 0 and not args.schedule_start:
+        run_worker(0, 1, args.batch_size, args.oil_price, args.oil_price_ttl, args.checkpoint, args.export, args.output_dir,
+                   args.metrics_interval, args.prometheus_file, run_random.seed, args.seed is not None)
+        sys.exit(0)
+
+    # Connect to the database, every statement is timed
+    engine = instrument_engine(connect_db())
     
-    try:
-        query = select(flight_table).where(flight_table.c.FlightStatus == 0) 
-        with engine.connect() as connection:
-            result_filght = connection.execute(query)
+    # Tables are defined in database.py
+    airport_table = metadata.tables['Airport']
+    company_table = metadata.tables['Company']
+    plane_table = metadata.tables['Plane']
+    flight_table = metadata.tables['Flight']
+    passenger_table = metadata.tables['Passenger']
+    company_income_table = metadata.tables['Company_Income']
+    consumption_table = metadata.tables['Consumption']
+    plane_status_table = metadata.tables['Plane_Status']
+
+    if args.schedule_start:
+        with UnitOfWork(engine) as uow:
+            code_allocator = load_code_allocator(uow, metadata, args.seed is not None)
+            fleet_index = FleetIndex.load(uow, plane_table, plane_status_table)
+            nb_pending = count_pending_flights(uow, flight_table)
+            with open_sink(uow, metadata, fleet_index, args.export, args.output_dir) as sink:
+                run_schedule_mode(iter_pending_flights(uow, flight_table, args.batch_size), nb_pending, fleet_index, code_allocator,
+                                  oil_price_provider, sink, args.batch_size,
+                                  datetime.strptime(args.schedule_start, "%Y-%m-%d"), args.schedule_days, run_random)
+        report_metrics(args.prometheus_file)
+        sys.exit(0)
+
+    # Only the legacy per-flight loop still uses Faker/pandas and builds its statements here
+    from faker import Faker # Generate fake Name/Surname/Phone/Gender
+    import pandas as pd
+    from sqlalchemy import insert, update
+
+    # One connection for the whole loop
+    with UnitOfWork(engine) as uow:
+        try:
+            # Company IATA codes are loaded once, flight numbers are reserved by blocks
+            code_allocator = load_code_allocator(uow, metadata, args.seed is not None)
+            # Fuel efficiency of each plane model
+            fuel_engine = FuelEngine.load()
+
+            # One Faker for the whole loop, re-seeded from the generator of each flight
+            fake = Faker()
+
+            # Pending flights are streamed, 1000 rows at a time
+            result_filght = itertools.chain.from_iterable(iter_pending_flights(uow, flight_table, 1000))
 
         
-        #for i in range(number_of_flights):
-        for flight_ in result_filght:
-            flight_ = list(flight_)  # convert tuple to list
-            flightID_ = flight_[0]
-            flight_distance_km = flight_[7]
-            airport_departure = flight_[3]
+            #for i in range(number_of_flights):
+            for flight_ in result_filght:
+                flightID_ = flight_.FlightID
+                flight_distance_km = flight_.Distance
+                airport_departure = flight_.AirportDeparture
+                rng = run_random.flight(flightID_)
             
-            plane_code = select_plane_with_sufficient_range(engine, plane_table, plane_status_table, airport_departure, flight_distance_km)
-            print(plane_code)
-            FlightCode_ = generate_random_code(engine, plane_code, company_table)
-            #print(f"The selected plane is {plane_code[1]} with a cruising speed of {plane_code[5]} km/h.")
+                with METRICS.timer('plane_assignment'):
+                    plane_code = select_plane_with_sufficient_range(uow, plane_table, plane_status_table, airport_departure, flight_distance_km, rng)
+                if isinstance(plane_code, str):
+                    # No plane available, the flight stays pending (as in batch mode)
+                    METRICS.count('skipped flights')
+                    continue
+                FlightCode_ = code_allocator.next_code(plane_code.CompanyID, flightID_)
+                #print(f"The selected plane is {plane_code.Model} with a cruising speed of {plane_code.CruisingSpeedKPH} km/h.")
             
-            flight_time = calculate_flight_time(flight_distance_km, plane_code)
-            #print(f"Estimated flight time for the distance {flight_distance_km} km is {flight_time} minutes.")
+                flight_time = calculate_flight_time(flight_distance_km, plane_code)
+                #print(f"Estimated flight time for the distance {flight_distance_km} km is {flight_time} minutes.")
 
-            # Get passenger number
-            passenger_number = get_passenger_number(plane_code)
-            #print(f"Number of passengers in the fligt is {passenger_number}. The plane capacity is {plane_code[4]}")
+                # Get passenger number
+                passenger_number = get_passenger_number(plane_code, rng)
+                #print(f"Number of passengers in the fligt is {passenger_number}. The plane capacity is {plane_code.PassengerCapacity}")
                     
-            # Get the current departure time
-            departure_time = get_random_departure_time()
-            #print(f"Departure time: {departure_time}")
-            
-            # Calculate the arrival time
-            arrival_time = calculate_arrival_time(departure_time, flight_time)
-            #print(f"Estimated arrival time: {arrival_time}")
+                # Get the current departure time
+                departure_time = random_departure_times(rng)
+                #print(f"Departure time: {departure_time}")
             
-            # Generate/Get the passenger information
-            fake = Faker()
-            passenger_df = generate_passengers_information(fake, passenger_number)
-            #Compute ticket price
-            passenger_df = compute_ticket_price(passenger_number, flight_distance_km, departure_time, passenger_df)
-
-            # Compute Plane Consuption
-            # Get Current Oil Price
-            data = bmdOilPriceFetch.bmdPriceFetch() 
-            Oil_Price = data['regularMarketPrice']
-            TotalFuelPrice_, TotalFuelVolumeGallons_ = compute_fuel_cost(plane_code[6], get_oil_price(), flight_distance_km, passenger_number, 75, 15)
+                # Calculate the arrival time
+                arrival_time = calculate_arrival_times(departure_time, flight_time)
+                #print(f"Estimated arrival time: {arrival_time}")
             
-            print('flightID_:', flightID_)
-            print('PlaneID_:', plane_code[0])
-            print('FlightCode_:', FlightCode_)
-
-            # Update Flight Table
-            FlightCode_ = FlightCode_
-            TimeDeparture_ = departure_time
-            TimeArrival_ = arrival_time
-            FlightTimeMinutes_ = flight_time
-            NbPassenger_ = passenger_number
-            PlaneID_ = plane_code[0]
-            with engine.connect() as conn:
-                update_flight = (
-                            update(flight_table).values(FlightCode=FlightCode_, 
-                                                                    TimeDeparture=TimeDeparture_,
-                                                                    TimeArrival=TimeArrival_,
-                                                                    FlightTimeMinutes=FlightTimeMinutes_,
-                                                                    NbPassenger=NbPassenger_,
-                                                                    PlaneID=PlaneID_
-                                                                    ).where(flight_table.c.FlightID == flightID_)
-                    )
-                conn.execute(update_flight)
-                print('ok')
-                update_plane_status = (
-                            update(plane_status_table).values(InFlight=True
-                                                                    ).where(plane_status_table.c.PlaneID == PlaneID_)
-                    )
-                conn.execute(update_plane_status)
-                print('ok')
-                # Insert Passenger Information
-                passenger_df['FlightID'] = flightID_  # Add FlightID in dataframe
-                passenger_df = passenger_df[['Name', 'Surname', 'PhoneNumber', 'Mail', 'Gender', 'TicketPriceDollar', 'PurchaseDate', 'FlightID']]  # Reorder the columns to match the specified order
-                passenger_df['PurchaseDate'] = pd.to_datetime(passenger_df['PurchaseDate'], format="%Y/%m/%d %H:%M:%S")
-                data = passenger_df.to_dict(orient='records')  # Convert DataFrame to a list of dictionaries
-                conn.execute(passenger_table.insert(), data)
+                # Generate/Get the passenger information
+                with METRICS.timer('passengers'):
+                    fake.seed_instance(int(rng.integers(2**63)))
+                    passenger_df = generate_passengers_information(fake, passenger_number, rng)
+                #Compute ticket price
+                with METRICS.timer('pricing'):
+                    passenger_df = compute_ticket_price(passenger_number, flight_distance_km, departure_time, passenger_df, rng)
+
+                # Compute Plane Consuption
+                # Get Oil Price of the departure date
+                with METRICS.timer('oil_price'):
+                    Oil_Price = oil_price_provider.price_per_barrel(departure_time)
+                TotalFuelPrice_, TotalFuelVolumeGallons_, _ = fuel_engine.compute_flight(plane_code, flight_distance_km, passenger_number, Oil_Price / 42)
+
+                # Update Flight Table
+                FlightCode_ = FlightCode_
+                TimeDeparture_ = departure_time.item()  # datetime64 -> datetime for the DB driver
+                TimeArrival_ = arrival_time.item()
+                FlightTimeMinutes_ = flight_time
+                NbPassenger_ = passenger_number
+                PlaneID_ = plane_code.PlaneID
+                with uow.begin() as conn:
+                    update_flight = (
+                                update(flight_table).values(FlightStatus=True,  # Done, not simulated again by the next run
+                                                                        FlightCode=FlightCode_, 
+                                                                        TimeDeparture=TimeDeparture_,
+                                                                        TimeArrival=TimeArrival_,
+                                                                        FlightTimeMinutes=FlightTimeMinutes_,
+                                                                        NbPassenger=NbPassenger_,
+                                                                        PlaneID=PlaneID_
+                                                                        ).where(flight_table.c.FlightID == flightID_)
+                        )
+                    conn.execute(update_flight)
+                    update_plane_status = (
+                                update(plane_status_table).values(InFlight=True
+                                                                        ).where(plane_status_table.c.PlaneID == PlaneID_)
+                        )
+                    conn.execute(update_plane_status)
+                    # Insert Passenger Information
+                    passenger_df['FlightID'] = flightID_  # Add FlightID in dataframe
+                    passenger_df = passenger_df[['Name', 'Surname', 'PhoneNumber', 'Mail', 'Gender', 'TicketPriceDollar', 'PurchaseDate', 'FlightID']]  # Reorder the columns to match the specified order
+                    passenger_df['PurchaseDate'] = pd.to_datetime(passenger_df['PurchaseDate'], format="%Y/%m/%d %H:%M:%S")
+                    data = passenger_df.to_dict(orient='records')  # Convert DataFrame to a list of dictionaries
+                    conn.execute(passenger_table.insert(), data)
                 
-                # Insert Consumption Information
-                insert_query = insert(consumption_table).values(BarrelPriceDollar=get_oil_price(), 
-                                                            TotalFuelPriceDollar=TotalFuelPrice_,
-                                                            TotalFuelVolumeGallons=TotalFuelVolumeGallons_,
-                                                            FlightID=flightID_
-                                                            )
-                conn.execute(insert_query)
-                conn.commit()
-                conn.close()
+                    # Insert Consumption Information
+                    insert_query = insert(consumption_table).values(BarrelPriceDollar=Oil_Price, 
+                                                                TotalFuelPriceDollar=TotalFuelPrice_,
+                                                                TotalFuelVolumeGallons=TotalFuelVolumeGallons_,
+                                                                FlightID=flightID_
+                                                                )
+                    conn.execute(insert_query)
+                METRICS.count('flights')
+                METRICS.count('passengers', passenger_number)
+                METRICS.progress()
         
-    except ValueError as e:
-        print(f'Error in the simulator for flight {FlightCode_}: {e}')
-        #continue
+        except ValueError as e:
+            print(f'Error in the simulator for flight {FlightCode_}: {e}')
+            #continue
+    report_metrics(args.prometheus_file)
@@ -0,0 +1,407 @@
+"""
+Author : Laurent Cesaro
+Topic : Python file which contains the outputs (sinks) of the simulator
+
+A sink receives the simulated flights batch by batch:
+ - DatabaseSink: UPDATE of Flight/Plane_Status and INSERT of Passenger/Consumption (MySQL)
+ - AsyncDatabaseSink: the same transactions on an async engine, several batches in flight (asyncio runner)
+ - ParquetSink: one Parquet dataset per table, partitioned by departure month (DepartureMonth=yyyy-mm)
+ - CsvSink: one CSV file per table
+The passengers of each flight are NumPy columns (PASSENGER_COLUMNS): the database sinks build their executemany
+parameters from them directly, Parquet and CSV are written from Arrow tables built with one DataFrame per batch.
+pandas, pyarrow and sqlalchemy are imported on first use, so importing this module stays cheap.
+"""
+
+import os
+import time
+import asyncio
+import numpy as np
+
+# Columns of the simulated flights which are written by the Flight UPDATE
+FLIGHT_UPDATE_COLUMNS = ['FlightCode', 'TimeDeparture', 'TimeArrival', 'FlightTimeMinutes', 'NbPassenger', 'PlaneID']
+# Columns of the exported tables, in the order of the database tables
+FLIGHT_COLUMNS = ['FlightID', 'FlightCode', 'FlightStatus', 'AirportDeparture', 'AirportArrival', 'TimeDeparture',
+                  'TimeArrival', 'Distance', 'FlightTimeMinutes', 'NbPassenger', 'PlaneID']
+PASSENGER_COLUMNS = ['Name', 'Surname', 'PhoneNumber', 'Mail', 'Gender', 'TicketPriceDollar', 'PurchaseDate', 'FlightID']
+CONSUMPTION_COLUMNS = ['BarrelPriceDollar', 'TotalFuelPriceDollar', 'TotalFuelVolumeGallons', 'FlightID']
+# The file exports also flag the flights which need more fuel than their tank holds (not a column of the database)
+CONSUMPTION_EXPORT_COLUMNS = CONSUMPTION_COLUMNS + ['FuelOverTank']
+
+
+def flight_update(flight_table):
+    """
+    Multi-row UPDATE of the simulated flights, with the rows of flight_update_rows as parameters.
+    The flights are marked as done (FlightStatus = 1).
+    """
+    from sqlalchemy import update, bindparam
+    return (
+        update(flight_table)
+        .where(flight_table.c.FlightID == bindparam('b_FlightID'))
+        .values(FlightStatus=True, **{column: bindparam(column) for column in FLIGHT_UPDATE_COLUMNS})
+    )
+
+def to_db_datetimes(values):
+    """
+    Departure/arrival times (datetime64, datetime or string yyyy/mm/dd hh:mm:ss) as datetimes, the type of the DB drivers.
+    One conversion for the whole batch.
+    """
+    values = [value.replace('/', '-') if isinstance(value, str) else value for value in values]
+    return np.array(values, dtype='datetime64[s]').tolist()
+
+def flight_update_rows(flight_rows):
+    rows = [{'b_FlightID': row['FlightID'], **{column: row[column] for column in FLIGHT_UPDATE_COLUMNS}}
+            for row in flight_rows]
+    for column in ('TimeDeparture', 'TimeArrival'):
+        for row, value in zip(rows, to_db_datetimes([row[column] for row in rows])):
+            row[column] = value
+    return rows
+
+def concat_passenger_columns(passenger_columns):
+    """
+    {column: array} of all the passengers of a batch, from the {column: array} of each flight.
+    """
+    return {column: np.concatenate([passengers[column] for passengers in passenger_columns]) for column in PASSENGER_COLUMNS}
+
+def passenger_records(passenger_columns):
+    """
+    Passenger rows (list of dict, the executemany parameters) of a batch, built from the NumPy columns:
+    one tolist() per column gives the Python str/float/int/datetime values of the DB drivers.
+    """
+    if not passenger_columns:
+        return []
+    columns = concat_passenger_columns(passenger_columns)
+    return [dict(zip(PASSENGER_COLUMNS, values)) for values in zip(*(columns[column].tolist() for column in PASSENGER_COLUMNS))]
+
+def write_flight_batch(conn, metadata, fleet_index, flight_rows, passenger_rows, consumption_rows):
+    """
+    Write simulated flights in one transaction: Flight/Plane_Status/Passenger/Consumption
+    with one multi-row statement each. The flights are marked as done (FlightStatus = 1).
+    """
+    from sqlalchemy import insert
+    update_rows = flight_update_rows(flight_rows)
+
+    # One transaction for the whole batch
+    with conn.begin() as connection:
+        if update_rows:
+            connection.execute(flight_update(metadata.tables['Flight']), update_rows)
+        # Only the planes of these flights: the other planes taken are for flights not written yet
+        fleet_index.flush(connection, [row['PlaneID'] for row in flight_rows])
+        if passenger_rows:
+            connection.execute(insert(metadata.tables['Passenger']), passenger_rows)
+        if consumption_rows:
+            connection.execute(insert(metadata.tables['Consumption']), consumption_rows)
+
+def to_datetime(values):
+    """
+    Departure/arrival times as datetime64: they are datetime64, strings (yyyy/mm/dd hh:mm:ss) or datetimes.
+    """
+    import pandas as pd
+    values = pd.Series(values)
+    if len(values) and isinstance(values.iloc[0], str):
+        return pd.to_datetime(values, format="%Y/%m/%d %H:%M:%S")
+    return pd.to_datetime(values)
+
+def file_schemas(pa):
+    """
+    {table name: Arrow schema} of the exported tables (types of the database tables), pa being the pyarrow module.
+    Every batch is cast to it, so a batch with an all-null column or ints instead of floats has the types of the others.
+    """
+    return {
+        'Flight': pa.schema([('FlightID', pa.int64()), ('FlightCode', pa.large_string()), ('FlightStatus', pa.bool_()),
+                             ('AirportDeparture', pa.int64()), ('AirportArrival', pa.int64()),
+                             ('TimeDeparture', pa.timestamp('s')), ('TimeArrival', pa.timestamp('s')), ('Distance', pa.int64()),
+                             ('FlightTimeMinutes', pa.int64()), ('NbPassenger', pa.int64()), ('PlaneID', pa.int64()),
+                             ('DepartureMonth', pa.large_string())]),
+        'Passenger': pa.schema([('Name', pa.large_string()), ('Surname', pa.large_string()), ('PhoneNumber', pa.large_string()),
+                                ('Mail', pa.large_string()), ('Gender', pa.large_string()), ('TicketPriceDollar', pa.float64()),
+                                ('PurchaseDate', pa.timestamp('s')), ('FlightID', pa.int64()), ('DepartureMonth', pa.large_string())]),
+        'Consumption': pa.schema([('BarrelPriceDollar', pa.float64()), ('TotalFuelPriceDollar', pa.float64()),
+                                  ('TotalFuelVolumeGallons', pa.float64()), ('FlightID', pa.int64()), ('FuelOverTank', pa.bool_()),
+                                  ('DepartureMonth', pa.large_string())]),
+    }
+
+
+class Sink:
+    """
+    Output of the simulator. write() receives one batch of simulated flights:
+    flight_rows (list of dict, FLIGHT_COLUMNS), passenger_columns (list of {column: NumPy array}, PASSENGER_COLUMNS, one per flight)
+    and consumption_rows (list of dict, CONSUMPTION_EXPORT_COLUMNS: the database sinks only insert CONSUMPTION_COLUMNS).
+    """
+
+    def write(self, flight_rows, passenger_columns, consumption_rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class DatabaseSink(Sink):
+    """
+    Write the batch in the database, with the Plane_Status changes of fleet_index, in one transaction.
+    """
+
+    def __init__(self, conn, metadata, fleet_index):
+        self.conn = conn
+        self.metadata = metadata
+        self.fleet_index = fleet_index
+
+    def write(self, flight_rows, passenger_columns, consumption_rows):
+        passenger_rows = passenger_records(passenger_columns)
+        write_flight_batch(self.conn, self.metadata, self.fleet_index, flight_rows, passenger_rows, consumption_rows)
+
+
+class AsyncDatabaseSink:
+    """
+    Database sink of the asyncio runner, on an async engine (aiomysql, aiosqlite).
+
+    Each batch is written in its own transaction by a task, and at most max_in_flight transactions run
+    at the same time: write() only waits for a free slot, so the next batch is generated meanwhile.
+    The first failed transaction is raised by the next write() or by close().
+
+        async with AsyncDatabaseSink(engine, metadata, fleet_index, 4) as sink:
+            batch = sink.prepare(flight_rows, passenger_columns, consumption_rows)  # In the generation thread
+            await sink.write(batch)
+    """
+
+    def __init__(self, engine, metadata, fleet_index, max_in_flight=4):
+        self.engine = engine
+        self.metadata = metadata
+        self.fleet_index = fleet_index
+        if engine.dialect.name == 'sqlite':
+            # SQLite has one writer at a time, concurrent write transactions fail with "database is locked"
+            max_in_flight = 1
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.tasks = set()
+        self.error = None
+
+    def prepare(self, flight_rows, passenger_columns, consumption_rows):
+        """
+        Parameters of the transaction of a batch, with the Plane_Status changes of the batch.
+        CPU work only: it runs in the thread which simulates the flights, not on the event loop.
+        """
+        return (flight_update_rows(flight_rows), self.fleet_index.pop_changes([row['PlaneID'] for row in flight_rows]),
+                passenger_records(passenger_columns), consumption_rows)
+
+    async def write(self, batch):
+        await self.slots.acquire()
+        if self.error is not None:
+            self.slots.release()
+            raise self.error
+        task = asyncio.create_task(self.write_batch(*batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.write_done)
+
+    def write_done(self, task):
+        self.tasks.discard(task)
+        self.slots.release()
+        if not task.cancelled() and task.exception() is not None and self.error is None:
+            self.error = task.exception()
+
+    async def write_batch(self, update_rows, plane_status_rows, passenger_rows, consumption_rows):
+        """
+        Same transaction as write_flight_batch.
+        """
+        from sqlalchemy import insert
+        async with self.engine.begin() as connection:
+            if update_rows:
+                await connection.execute(flight_update(self.metadata.tables['Flight']), update_rows)
+            if plane_status_rows:
+                await connection.execute(self.fleet_index.status_update(), plane_status_rows)
+            if passenger_rows:
+                await connection.execute(insert(self.metadata.tables['Passenger']), passenger_rows)
+            if consumption_rows:
+                await connection.execute(insert(self.metadata.tables['Consumption']), consumption_rows)
+
+    async def close(self):
+        """
+        Wait for the transactions in flight.
+        """
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.error is not None:
+            raise self.error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.close()
+        else:
+            # Already failing: wait for the tasks but keep the original error
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class FileSink(Sink):
+    """
+    Base of the file sinks: converts a batch into one Arrow table per output table (Flight, Passenger, Consumption).
+    Every table gets a DepartureMonth column (yyyy-mm of the departure of the flight) and the fixed schema of file_schemas.
+
+    Files are named after prefix (default: start time and process id) so runs and workers never overwrite each other.
+    """
+
+    def __init__(self, output_dir, prefix=None):
+        import pyarrow  # Only needed by the file sinks
+        self.pa = pyarrow
+        self.schemas = file_schemas(pyarrow)
+        self.output_dir = output_dir
+        self.prefix = prefix if prefix is not None else f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.nb_batches = 0
+
+    def record_batches(self, flight_rows, passenger_columns, consumption_rows):
+        """
+        {table name: Arrow table} of a batch.
+        """
+        import pandas as pd
+        flights = pd.DataFrame(flight_rows, columns=FLIGHT_COLUMNS)
+        flights['TimeDeparture'] = to_datetime(flights['TimeDeparture']).astype('datetime64[s]')
+        flights['TimeArrival'] = to_datetime(flights['TimeArrival']).astype('datetime64[s]')
+        flights['DepartureMonth'] = flights['TimeDeparture'].dt.strftime('%Y-%m')
+        departure_months = flights.set_index('FlightID')['DepartureMonth']
+
+        if passenger_columns:
+            passengers = pd.DataFrame(concat_passenger_columns(passenger_columns))
+        else:
+            passengers = pd.DataFrame(columns=PASSENGER_COLUMNS)
+        passengers['PurchaseDate'] = passengers['PurchaseDate'].astype('datetime64[s]')
+        passengers['DepartureMonth'] = passengers['FlightID'].map(departure_months)
+
+        consumption = pd.DataFrame(consumption_rows, columns=CONSUMPTION_EXPORT_COLUMNS)
+        consumption['DepartureMonth'] = consumption['FlightID'].map(departure_months)
+
+        return {name: self.pa.Table.from_pandas(df, schema=self.schemas[name], preserve_index=False)
+                for name, df in (('Flight', flights), ('Passenger', passengers), ('Consumption', consumption))}
+
+    def write(self, flight_rows, passenger_columns, consumption_rows):
+        if not flight_rows:
+            return
+        for name, table in self.record_batches(flight_rows, passenger_columns, consumption_rows).items():
+            if table.num_rows:
+                self.write_table(name, table)
+        self.nb_batches += 1
+
+    def write_table(self, name, table):
+        raise NotImplementedError
+
+
+class ParquetSink(FileSink):
+    """
+    output_dir/<table>/DepartureMonth=yyyy-mm/<prefix>-<n>.parquet
+
+    The rows of each partition are buffered and written as row groups of row_group_size rows in one open file
+    per partition, not as one file per batch and per month: a run gives one file per partition (a new one
+    when the partition's file was closed to stay under max_open_files). When more than max_buffered_rows rows
+    are buffered, the largest partition is written first. Everything left is written by close().
+    """
+
+    def __init__(self, output_dir, prefix=None, row_group_size=100000, max_buffered_rows=1000000, max_open_files=256):
+        super().__init__(output_dir, prefix)
+        import pyarrow.parquet
+        self.pq = pyarrow.parquet
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.max_open_files = max_open_files
+        self.buffers = {}  # (table name, month) -> list of Arrow tables not written yet
+        self.buffered_rows = {}  # (table name, month) -> number of rows in buffers
+        self.nb_buffered_rows = 0
+        self.writers = {}  # (table name, month) -> open ParquetWriter, least recently used first
+        self.nb_files = {}  # (table name, month) -> number of files of the partition
+
+    def write_table(self, name, table):
+        # One slice per month: sort by DepartureMonth, the months of the slices start at np.unique's indices
+        table = table.sort_by('DepartureMonth')
+        months, starts = np.unique(table.column('DepartureMonth').to_numpy(zero_copy_only=False), return_index=True)
+        table = table.drop_columns(['DepartureMonth'])  # In the path of the partition
+        ends = list(starts[1:]) + [table.num_rows]
+        for month, start, end in zip(months.tolist(), starts.tolist(), ends):
+            key = (name, month)
+            self.buffers.setdefault(key, []).append(table.slice(start, end - start))
+            self.buffered_rows[key] = self.buffered_rows.get(key, 0) + end - start
+            self.nb_buffered_rows += end - start
+            if self.buffered_rows[key] >= self.row_group_size:
+                self.write_partition(key)
+        while self.nb_buffered_rows > self.max_buffered_rows:
+            self.write_partition(max(self.buffered_rows, key=self.buffered_rows.get))
+
+    def write_partition(self, key):
+        """
+        Write the buffered rows of a partition as one row group of its open file.
+        """
+        table = self.pa.concat_tables(self.buffers.pop(key))
+        self.nb_buffered_rows -= self.buffered_rows.pop(key)
+        writer = self.writers.pop(key, None)
+        if writer is None:
+            if len(self.writers) >= self.max_open_files:
+                # Close the least recently used file, the next rows of its partition go to a new file
+                self.writers.pop(next(iter(self.writers))).close()
+            name, month = key
+            directory = os.path.join(self.output_dir, name, f"DepartureMonth={month}")
+            os.makedirs(directory, exist_ok=True)
+            number = self.nb_files.get(key, 0)
+            self.nb_files[key] = number + 1
+            writer = self.pq.ParquetWriter(os.path.join(directory, f"{self.prefix}-{number}.parquet"), table.schema)
+        writer.write_table(table)
+        self.writers[key] = writer  # Most recently used last
+
+    def close(self):
+        for key in list(self.buffers):
+            self.write_partition(key)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+class CsvSink(FileSink):
+    """
+    output_dir/<table>/<prefix>.csv, the files stay open and each batch is appended.
+    """
+
+    def __init__(self, output_dir, prefix=None):
+        super().__init__(output_dir, prefix)
+        import pyarrow.csv
+        self.csv = pyarrow.csv
+        self.writers = {}
+
+    def write_table(self, name, table):
+        if name not in self.writers:
+            os.makedirs(os.path.join(self.output_dir, name), exist_ok=True)
+            self.writers[name] = self.csv.CSVWriter(os.path.join(self.output_dir, name, f"{self.prefix}.csv"), self.schemas[name])
+        self.writers[name].write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+class MultiSink(Sink):
+    """
+    Write each batch in several sinks (e.g. the database and Parquet files).
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write(self, flight_rows, passenger_columns, consumption_rows):
+        for sink in self.sinks:
+            sink.write(flight_rows, passenger_columns, consumption_rows)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+FILE_SINKS = {'parquet': ParquetSink, 'csv': CsvSink}
+
+def get_file_sink(kind, output_dir, prefix=None):
+    """
+    File sink from its name ('parquet' or 'csv').
+    """
+    if kind not in FILE_SINKS:
+        raise ValueError(f"Unknown export format: {kind}")
+    return FILE_SINKS[kind](output_dir, prefix)
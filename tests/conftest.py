@@ -0,0 +1,11 @@
+"""
+Author : Laurent Cesaro
+Topic : pytest configuration of the simulator tests
+
+The simulator modules are flat scripts importing each other by name, as when they are run from simulator/.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulator'))
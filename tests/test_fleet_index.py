@@ -0,0 +1,61 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of FleetIndex (in-memory planes on the ground, per airport)
+"""
+
+import numpy as np
+
+from functions import Plane, FleetIndex
+
+
+def make_plane(planeID, range_km):
+    return Plane(planeID, 'A320', 'Airbus', range_km, 180, 840, 42000, 6400, 1)
+
+def make_fleet_index():
+    """
+    Planes 1, 2 and 3 at airport 10 (3000, 6000 and 12000 km), plane 4 at airport 20 (5000 km).
+    """
+    planes = [make_plane(1, 3000), make_plane(2, 6000), make_plane(3, 12000), make_plane(4, 5000)]
+    return FleetIndex.from_planes(planes, [10, 10, 10, 20])
+
+
+def test_take_needs_a_sufficient_range():
+    fleet_index = make_fleet_index()
+    rng = np.random.default_rng(0)
+    assert fleet_index.take(10, 7000, rng).PlaneID == 3
+    # Plane 3 is in flight: no other plane of airport 10 can fly 7000 km
+    assert isinstance(fleet_index.take(10, 7000, rng), str)
+    assert isinstance(fleet_index.take(99, 100, rng), str)
+    assert len(fleet_index) == 3
+
+def test_take_draws_among_the_suitable_planes():
+    taken = {make_fleet_index().take(10, 4000, np.random.default_rng(seed)).PlaneID for seed in range(100)}
+    assert taken == {2, 3}
+
+def test_take_is_reproducible():
+    first = [make_fleet_index().take(10, 1000, np.random.default_rng(seed)).PlaneID for seed in range(20)]
+    second = [make_fleet_index().take(10, 1000, np.random.default_rng(seed)).PlaneID for seed in range(20)]
+    assert first == second
+
+def test_release_puts_the_plane_back_in_range_order():
+    fleet_index = make_fleet_index()
+    rng = np.random.default_rng(0)
+    plane = fleet_index.take(10, 10000, rng)
+    fleet_index.release(plane, 20)
+    assert len(fleet_index) == 4
+    assert fleet_index._ranges[20] == [5000, 12000]
+    assert [plane.PlaneID for plane in fleet_index._planes[20]] == [4, 3]
+    assert fleet_index.take(20, 5500, rng).PlaneID == 3
+
+def test_pop_changes_keeps_the_planes_of_unwritten_flights():
+    fleet_index = make_fleet_index()
+    rng = np.random.default_rng(0)
+    plane_3 = fleet_index.take(10, 10000, rng)
+    fleet_index.take(20, 1000, rng)
+    # Only the flight of plane 3 is written: plane 4 stays pending
+    assert fleet_index.pop_changes([3]) == [{'b_PlaneID': 3, 'InFlight': True, 'AirportID': 10}]
+    fleet_index.release(plane_3, 20)
+    # A plane back on the ground is always written
+    assert fleet_index.pop_changes([]) == [{'b_PlaneID': 3, 'InFlight': False, 'AirportID': 20}]
+    assert fleet_index.pop_changes() == [{'b_PlaneID': 4, 'InFlight': True, 'AirportID': 20}]
+    assert fleet_index.pop_changes() == []
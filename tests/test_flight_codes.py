@@ -0,0 +1,68 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of the flight code allocators (unique IATA:XXXXXXXXXX codes without a query per flight)
+"""
+
+import re
+
+from functions import (RunRandom, FileSequenceStore, FlightCodeAllocator, FlightIDCodeAllocator, FLIGHT_CODE_SPACE,
+                       FLIGHTID_CODE_RANGE, encode_flight_number)
+
+COMPANY_CODES = {1: 'AF', 2: 'LH'}
+FLIGHT_CODE = re.compile(r'^[A-Z0-9]{2}:[0-9A-Z]{10}$')
+
+
+class MemorySequenceStore:
+    """
+    Sequences of the companies in a dict, as DatabaseSequenceStore without database.
+    """
+
+    def __init__(self):
+        self.sequences = {}
+
+    def allocate(self, companyID, block_size):
+        first_value = self.sequences.get(companyID, 1)
+        self.sequences[companyID] = first_value + block_size
+        return first_value
+
+
+def test_encode_flight_number_is_injective():
+    values = list(range(100000)) + [FLIGHT_CODE_SPACE - 1 - value for value in range(100000)]
+    codes = [encode_flight_number(value) for value in values]
+    assert len(set(codes)) == len(values)
+    assert all(len(code) == 10 for code in codes)
+
+def test_workers_sharing_a_store_get_unique_codes():
+    store = MemorySequenceStore()
+    workers = [FlightCodeAllocator(COMPANY_CODES, store, block_size=7) for _ in range(3)]
+    codes = [workers[i % 3].next_code(1 + i % 2) for i in range(1000)]
+    assert len(set(codes)) == len(codes)
+    assert all(FLIGHT_CODE.match(code) for code in codes)
+
+def test_file_store_keeps_the_sequences_across_runs(tmp_path):
+    file_path = tmp_path / 'flight_code_sequences.json'
+    first_run = [FlightCodeAllocator(COMPANY_CODES, FileSequenceStore(file_path), block_size=10).next_code(1) for _ in range(5)]
+    second_run = [FlightCodeAllocator(COMPANY_CODES, FileSequenceStore(file_path), block_size=10).next_code(1) for _ in range(5)]
+    assert len(set(first_run + second_run)) == 10
+
+def test_flightID_codes_are_unique_and_never_sequence_codes():
+    allocator = FlightIDCodeAllocator(COMPANY_CODES)
+    codes = {allocator.next_code(1, flightID) for flightID in range(1, 20001)}
+    assert len(codes) == 20000
+    sequence_allocator = FlightCodeAllocator(COMPANY_CODES, MemorySequenceStore(), block_size=1000)
+    assert not codes & {sequence_allocator.next_code(1) for _ in range(20000)}
+
+def test_flightID_codes_wrap_around_the_upper_half():
+    # A salt close to the end of the range: the flight numbers wrap to the start of the upper half
+    allocator = FlightIDCodeAllocator(COMPANY_CODES, salt=FLIGHTID_CODE_RANGE - 5)
+    codes = [allocator.next_code(2, flightID) for flightID in range(1, 11)]
+    assert len(set(codes)) == 10
+    assert codes[4:] == [FlightIDCodeAllocator(COMPANY_CODES).next_code(2, flightID) for flightID in range(0, 6)]
+
+def test_flightID_codes_depend_on_the_seed_only():
+    def run_codes(seed):
+        allocator = FlightIDCodeAllocator(COMPANY_CODES, FlightIDCodeAllocator.run_salt(RunRandom(seed)))
+        return [allocator.next_code(1, flightID) for flightID in range(1, 1001)]
+
+    assert run_codes(42) == run_codes(42)
+    assert set(run_codes(42)).isdisjoint(run_codes(43))
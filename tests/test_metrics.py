@@ -0,0 +1,59 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of the Histogram of the stage timers (logarithmic buckets)
+"""
+
+import threading
+import numpy as np
+import pytest
+
+from metrics import Histogram, BUCKET_RATIO
+
+
+def make_histogram(values):
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+    return histogram
+
+
+def test_empty_histogram():
+    assert Histogram().quantile(0.5) == 0.0
+    assert Histogram().mean() == 0.0
+
+def test_quantiles_are_clamped_to_min_and_max():
+    histogram = make_histogram([0.25])
+    assert histogram.quantile(0.0) == 0.25
+    assert histogram.quantile(0.5) == 0.25
+    assert histogram.quantile(1.0) == 0.25
+
+@pytest.mark.parametrize('q', [0.01, 0.5, 0.95, 0.99])
+def test_quantiles_within_one_bucket(q):
+    values = np.random.default_rng(0).lognormal(mean=-6, sigma=1.5, size=20000)
+    histogram = make_histogram(values)
+    expected = np.quantile(values, q)
+    # The middle of a bucket is within a factor sqrt(BUCKET_RATIO) of the values of the bucket
+    assert expected / BUCKET_RATIO <= histogram.quantile(q) <= expected * BUCKET_RATIO
+
+def test_quantiles_are_monotonic():
+    histogram = make_histogram(np.random.default_rng(1).exponential(0.01, size=5000))
+    quantiles = [histogram.quantile(q) for q in np.linspace(0, 1, 101)]
+    assert quantiles == sorted(quantiles)
+    assert quantiles[0] >= histogram.min
+    assert quantiles[-1] <= histogram.max
+
+def test_observe_from_several_threads():
+    histogram = Histogram()
+
+    def observe():
+        for _ in range(10000):
+            histogram.observe(0.001)
+
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.count == 40000
+    assert sum(histogram.buckets.values()) == 40000
+    assert histogram.mean() == pytest.approx(0.001)
@@ -0,0 +1,59 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of the seeded runs: the shards of a run give the same flights as the serial run
+"""
+
+import pytest
+
+from functions import RunRandom, AirportSampler, FixedOilPriceProvider, FlightIDCodeAllocator, load_json_data, iter_generated_flights
+from simulator_flight_data import run_batch_mode, run_pipeline_mode
+
+NB_FLIGHTS = 600
+BATCH_SIZE = 100
+SEED = 42
+
+
+class ListSink:
+    """
+    Sink keeping the written rows in memory, by FlightID.
+    """
+
+    def __init__(self):
+        self.flights = {}
+
+    def write(self, flight_rows, passenger_columns, consumption_rows):
+        for flight_row, passengers, consumption_row in zip(flight_rows, passenger_columns, consumption_rows):
+            self.flights[flight_row['FlightID']] = (flight_row, {column: values.tolist() for column, values in passengers.items()},
+                                                   consumption_row)
+
+
+def run_shard(run_mode, shard=0, nb_shards=1):
+    """
+    Rows of the flights of a --db no --seed SEED run departing from the airports of shard, like the --shard option.
+    """
+    run_random = RunRandom(SEED)
+    airports, company_codes, fleet_index = load_json_data(rng=run_random.stream('fleet'))
+    code_allocator = FlightIDCodeAllocator(company_codes, FlightIDCodeAllocator.run_salt(run_random))
+    flight_chunks = iter_generated_flights(AirportSampler(airports), NB_FLIGHTS, BATCH_SIZE, run_random.stream('flights'))
+    flight_chunks = ([flight_ for flight_ in flights if flight_.AirportDeparture % nb_shards == shard] for flights in flight_chunks)
+    sink = ListSink()
+    if run_mode == 'batch':
+        run_batch_mode(flight_chunks, fleet_index, code_allocator, FixedOilPriceProvider(80), sink, run_random=run_random)
+    else:
+        run_pipeline_mode(flight_chunks, fleet_index, code_allocator, FixedOilPriceProvider(80), sink, BATCH_SIZE, run_random=run_random)
+    return sink.flights
+
+
+@pytest.mark.parametrize('run_mode', ['batch', 'pipeline'])
+def test_shards_give_the_flights_of_the_serial_run(run_mode):
+    serial = run_shard(run_mode)
+    assert serial
+    shards = [run_shard(run_mode, shard, 3) for shard in range(3)]
+    merged = {}
+    for flights in shards:
+        assert not merged.keys() & flights.keys()
+        merged.update(flights)
+    assert merged == serial
+
+def test_same_seed_same_flights_in_batch_and_pipeline_modes():
+    assert run_shard('batch') == run_shard('pipeline')
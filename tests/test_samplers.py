@@ -0,0 +1,42 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of AliasSampler and AirportSampler (weighted airport sampling in memory)
+"""
+
+import numpy as np
+import pytest
+
+from functions import Airport, AliasSampler, AirportSampler
+
+NB_SAMPLES = 200000
+
+
+def test_alias_sampler_frequencies_follow_the_weights():
+    weights = np.array([1, 2, 3, 0, 4, 10])
+    samples = AliasSampler(weights).sample(np.random.default_rng(0), NB_SAMPLES)
+    frequencies = np.bincount(samples, minlength=len(weights)) / NB_SAMPLES
+    # 5 standard deviations of a frequency estimated on NB_SAMPLES draws
+    np.testing.assert_allclose(frequencies, weights / weights.sum(), atol=5 * np.sqrt(0.25 / NB_SAMPLES))
+    assert frequencies[3] == 0
+
+def test_alias_sampler_single_draw():
+    index = AliasSampler([1, 1, 1]).sample(np.random.default_rng(0))
+    assert 0 <= int(index) < 3
+
+@pytest.mark.parametrize('weights', [[], [0, 0], [1, -1], [[1, 2]]])
+def test_alias_sampler_rejects_invalid_weights(weights):
+    with pytest.raises(ValueError):
+        AliasSampler(weights)
+
+def test_airport_sampler_never_draws_the_same_airport_twice():
+    airports = [Airport(airportID, f'A{airportID}', 0.0, 0.0, 100.0, 'FR') for airportID in range(1, 4)]
+    # Airport 1 has most of the weight, so most arrivals have to be drawn again
+    departures, arrivals = AirportSampler(airports, [100, 1, 1]).sample_positions(np.random.default_rng(0), 10000)
+    assert not (departures == arrivals).any()
+    departure, arrival = AirportSampler(airports).sample_pair(np.random.default_rng(1))
+    assert departure.AirportID != arrival.AirportID
+
+def test_airport_sampler_needs_two_weighted_airports():
+    airports = [Airport(airportID, f'A{airportID}', 0.0, 0.0, 100.0, 'FR') for airportID in range(1, 4)]
+    with pytest.raises(ValueError):
+        AirportSampler(airports, [1, 0, 0])
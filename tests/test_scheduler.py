@@ -0,0 +1,60 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of FleetScheduler (time-ordered departures and arrivals of the planes)
+"""
+
+from datetime import datetime
+
+from functions import Plane, Flight, FleetIndex, RunRandom
+from scheduler import FleetScheduler
+
+# 840 km/h: a flight of 840 km lasts 60 minutes
+CRUISING_SPEED_KPH = 840
+
+
+def make_scheduler(nb_planes=1):
+    """
+    Scheduler of nb_planes planes of 10000 km range, parked at airport 1.
+    """
+    planes = [Plane(planeID, 'A320', 'Airbus', 10000, 180, CRUISING_SPEED_KPH, 42000, 6400, 1) for planeID in range(1, nb_planes + 1)]
+    return FleetScheduler(FleetIndex.from_planes(planes, [1] * nb_planes), RunRandom(0))
+
+def departures(scheduler, until=None):
+    return [(time, flight.FlightID, plane.PlaneID) for time, flight, plane, _ in scheduler.run(until)]
+
+
+def test_events_are_processed_in_time_order():
+    scheduler = make_scheduler()
+    scheduler.schedule_departure(Flight(1, AirportDeparture=1, AirportArrival=2, Distance=840), datetime(2024, 1, 1, 8))
+    scheduler.schedule_departure(Flight(2, AirportDeparture=1, AirportArrival=2, Distance=840), datetime(2024, 1, 1, 8, 30))
+    # Same time as the landing of the plane at airport 2: the arrival is processed first
+    scheduler.schedule_departure(Flight(3, AirportDeparture=2, AirportArrival=1, Distance=840), datetime(2024, 1, 1, 9))
+    # Too far for the plane: waits at airport 1 forever, without blocking the flights behind it in line
+    scheduler.schedule_departure(Flight(4, AirportDeparture=1, AirportArrival=2, Distance=20000), datetime(2024, 1, 1, 7))
+
+    assert departures(scheduler) == [
+        (datetime(2024, 1, 1, 8), 1, 1),
+        (datetime(2024, 1, 1, 9), 3, 1),
+        # Flight 2 waited at airport 1 for the plane, back at 10:00
+        (datetime(2024, 1, 1, 10), 2, 1),
+    ]
+    assert [flight.FlightID for flight in scheduler.waiting] == [4]
+    assert len(scheduler) == 0
+    # The last arrival put the plane back on the ground at airport 2
+    assert scheduler.fleet_index.take(2, 840, RunRandom(0).flight(5)).PlaneID == 1
+
+def test_planes_landing_at_night_leave_at_6am():
+    scheduler = make_scheduler()
+    # 6 hours of flight: lands at 2AM
+    scheduler.schedule_departure(Flight(1, AirportDeparture=1, AirportArrival=2, Distance=6 * 840), datetime(2024, 1, 1, 20))
+    scheduler.schedule_departure(Flight(2, AirportDeparture=2, AirportArrival=1, Distance=840), datetime(2024, 1, 1, 21))
+    assert departures(scheduler) == [(datetime(2024, 1, 1, 20), 1, 1), (datetime(2024, 1, 2, 6), 2, 1)]
+
+def test_run_stops_before_until():
+    scheduler = make_scheduler(nb_planes=2)
+    for flightID, hour in ((1, 8), (2, 12)):
+        scheduler.schedule_departure(Flight(flightID, AirportDeparture=1, AirportArrival=2, Distance=840), datetime(2024, 1, 1, hour))
+    assert [(time, flightID) for time, flightID, _ in departures(scheduler, until=datetime(2024, 1, 1, 12))] == [(datetime(2024, 1, 1, 8), 1)]
+    # The arrival of flight 1 (9:00) is processed, the departure of flight 2 is left for the next run
+    assert len(scheduler) == 1
+    assert [(time, flightID) for time, flightID, _ in departures(scheduler)] == [(datetime(2024, 1, 1, 12), 2)]
@@ -0,0 +1,70 @@
+"""
+Author : Laurent Cesaro
+Topic : Tests of compute_ticket_price_vectorized against compute_ticket_price (iterrows)
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import compute_ticket_price, compute_ticket_price_vectorized, compute_ticket_prices, compute_discount_price
+
+DEPARTURE_TIME = "2024/06/15 14:30:00"
+
+
+def make_manifest(surnames):
+    return pd.DataFrame({'Name': [f'name{i}' for i in range(len(surnames))], 'Surname': surnames})
+
+def price_both(num_passengers, distance_km, surnames, seed=1):
+    """
+    (legacy prices, legacy purchase dates, vectorized prices, vectorized purchase dates) with the same seed.
+    """
+    legacy = compute_ticket_price(num_passengers, distance_km, DEPARTURE_TIME, make_manifest(surnames), np.random.default_rng(seed))
+    vectorized = compute_ticket_price_vectorized(num_passengers, distance_km, DEPARTURE_TIME, make_manifest(surnames),
+                                                 np.random.default_rng(seed))
+    return (legacy['TicketPriceDollar'].astype(float).to_numpy(), pd.to_datetime(legacy['PurchaseDate']).to_numpy(),
+            vectorized['TicketPriceDollar'].to_numpy(), vectorized['PurchaseDate'].to_numpy())
+
+
+@pytest.mark.parametrize('num_passengers, distance_km', [(8, 2000), (19, 300), (50, 700), (99, 5000)])
+def test_same_prices_as_iterrows_up_to_99_passengers(num_passengers, distance_km):
+    # Without families, both versions draw one purchase date per passenger, in the same order
+    legacy_prices, legacy_dates, prices, dates = price_both(num_passengers, distance_km, [f's{i}' for i in range(num_passengers)])
+    np.testing.assert_allclose(prices, legacy_prices)
+    np.testing.assert_array_equal(dates, legacy_dates)
+
+@pytest.mark.parametrize('num_passengers, distance_km', [(150, 2000), (300, 500)])
+def test_classes_above_99_passengers(num_passengers, distance_km):
+    legacy_prices, legacy_dates, prices, dates = price_both(num_passengers, distance_km, [f's{i}' for i in range(num_passengers)])
+    np.testing.assert_array_equal(dates, legacy_dates)
+    # compute_ticket_price never increments count_sold, so all its passengers are in first class (10x):
+    # the vectorized version splits them in 5% first (10x), 15% second (5x) and third class (2x)
+    first_class_passengers = round(num_passengers * 0.05)
+    second_class_passengers = round(num_passengers * 0.15)
+    multipliers = np.full(num_passengers, 2.0)
+    multipliers[:first_class_passengers] = 10.0
+    multipliers[first_class_passengers:first_class_passengers + second_class_passengers] = 5.0
+    np.testing.assert_allclose(prices, legacy_prices * multipliers / 10)
+
+def test_families_share_price_and_purchase_date():
+    surnames = ['X', 'X', 'Y', 'Z', 'Z', 'Z', 'W', 'X']
+    vectorized = compute_ticket_price_vectorized(len(surnames), 2000, DEPARTURE_TIME, make_manifest(surnames), np.random.default_rng(3))
+    prices = vectorized['TicketPriceDollar'].to_numpy()
+    dates = vectorized['PurchaseDate'].to_numpy()
+    for family in ([0, 1], [3, 4, 5]):
+        assert len(set(prices[family])) == 1
+        assert len(set(dates[family])) == 1
+
+    # Every price is the base price of the flight with the discount of its purchase date
+    departure = pd.Timestamp(DEPARTURE_TIME)
+    base_price = float(np.random.default_rng(3).integers(10000, 50001))
+    for price, date in zip(prices, dates):
+        assert 1 <= (departure - pd.Timestamp(date)).days <= 90
+        assert price == pytest.approx(compute_discount_price(base_price, pd.Timestamp(date), departure))
+
+def test_columns_version_matches_the_dataframe_version():
+    surnames = np.array(['X', 'X', 'Y', 'Z', 'Z', 'Z', 'W', 'X'] * 20)
+    vectorized = compute_ticket_price_vectorized(len(surnames), 3000, DEPARTURE_TIME, make_manifest(surnames), np.random.default_rng(5))
+    prices, dates = compute_ticket_prices(len(surnames), 3000, np.datetime64('2024-06-15T14:30:00', 's'), surnames, np.random.default_rng(5))
+    np.testing.assert_array_equal(prices, vectorized['TicketPriceDollar'].to_numpy())
+    np.testing.assert_array_equal(dates, vectorized['PurchaseDate'].to_numpy())